@@ -10,6 +10,8 @@ from fastapi import Request
 from chromadb import AsyncHttpClient
 from chromadb.api.models.Collection import Collection
 from typing import Optional
+from app.core.telemetry import span
+from app.core.admission import ENDPOINT_CLASSES, Ticket, admission
 
 security = HTTPBearer(auto_error=False)
 
@@ -46,16 +48,17 @@ async def get_current_user(
     if not token:
         raise credentials_exception
 
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    async with span("auth"):
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    result = await db.execute(select(User).filter(User.username == username))
-    user = result.scalar_one_or_none()
+        
+        result = await db.execute(select(User).filter(User.username == username))
+        user = result.scalar_one_or_none()
 
     if user is None:
         raise credentials_exception
@@ -64,11 +67,46 @@ async def get_current_user(
 
 
 
+async def get_optional_user(
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+        token_query: Optional[str] = Query(None, alias="token"),
+        db: AsyncSession = Depends(get_db)
+) -> Optional[User]:
+    """Like get_current_user, but anonymous requests get None instead of a 401."""
+    if not credentials and not token_query:
+        return None
+    try:
+        return await get_current_user(credentials, token_query, db)
+    except HTTPException:
+        return None
+
+
+def admit(endpoint_class: str):
+    """
+    Dependency admitting the current user to an expensive endpoint (see app/core/admission.py).
+
+    The ticket is released when the request finishes, unless the endpoint hands
+    it to its streaming body with `ticket.stream(...)` (and `ticket.release_task()`
+    as the response's background); then the stream or the response releases it.
+    """
+    cls = ENDPOINT_CLASSES[endpoint_class]
+
+    async def dependency(current_user: User = Depends(get_current_user)):
+        ticket = await admission.admit(current_user.id, cls)
+        try:
+            yield ticket
+        finally:
+            if not ticket.handed_off:
+                ticket.release()
+
+    return dependency
+
+
 async def get_chroma_client(request: Request) -> AsyncHttpClient:
-    client = getattr(request.app.state, "chroma_client", None)
-    if client is None:
-        raise RuntimeError("ChromaDB client is not initialized in App State.")
-    return client
+    store = getattr(request.app.state, "vector_store", None)
+    if store is None:
+        raise RuntimeError("Vector store is not initialized in App State.")
+    return await store.client()
 
 def get_chroma_collection(request: Request) -> Collection:
     collection = getattr(request.app.state, "chroma_collection", None)
@@ -5,25 +5,36 @@ from fastapi import APIRouter, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from app.config import settings
-from vapi import Vapi
 from dotenv import load_dotenv
-from app.api.deps import get_db, get_current_user, get_chroma_collection
+from app.api.deps import get_db, get_current_user, get_optional_user, get_chroma_collection
+from app.models.tables import InterviewTranscriptEvent, InterviewEvaluation, InterviewSession
+from app.schema.models import TranscriptResponse, TranscriptInfo, InterviewEvaluationResponse
+from app.services.vapi_service import vapi_service
+from app.services.vapi_webhook import vapi_ingestor
+from .prompts import build_interviewer_prompt
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import asyncio
+import hmac
+import secrets
+import logging
 
 load_dotenv()
 
 router = APIRouter()
 
+logger = logging.getLogger("uvicorn.error")
+
 # --- CONFIGURATION ---
 VAPI_PRIVATE_KEY = os.getenv("VAPI_PRIVATE_KEY")
 VAPI_ASSISTANT_ID = os.getenv("VAPI_ASSISTANT_ID")
-SERVER_URL = os.getenv("SERVER_URL", "http://localhost:8000") 
+# Webhook target: the assistant's Server URL (public URL of /api/webhook) and its
+# secret (VAPI_WEBHOOK_SECRET) are set on the assistant in the Vapi dashboard.
+# They are not overridden per call, since the overrides are returned to the browser.
 
-# Initialize Vapi Server SDK
-try:
-    vapi_server = Vapi(token=VAPI_PRIVATE_KEY)
-except Exception as e:
-    print(f"Vapi SDK Initialization Error: {e}")
-    print("Ensure VAPI_PRIVATE_KEY is set in .env")
+# The Vapi server SDK client is built lazily by app.services.vapi_service
+# the first time an endpoint needs it, not at import.
 
 # --- SCHEMAS ---
 class ConfigRequest(BaseModel):
@@ -39,7 +50,11 @@ class ConfigRequest(BaseModel):
 # --- ENDPOINTS ---
 
 @router.post("/api/get-vapi-config")
-async def get_vapi_config(data: ConfigRequest):
+async def get_vapi_config(
+    data: ConfigRequest,
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Endpoint called by the Frontend to get the dynamically generated Assistant configuration.
     """
@@ -50,52 +65,9 @@ async def get_vapi_config(data: ConfigRequest):
         )
 
     try:
-        print(f"\n--- New Interview Request ---")
-        print(f"👤 User: {data.name}, Role: {data.job_role}, Exp: {data.experience}, Level: {data.level}")
-
-        system_prompt = (
-            f"You are the hiring manager at a tech company. You are conducting a strict 5-minute screening interview "
-            f"with {data.name} for a {data.job_role} role. The candidate has {data.experience} years of experience. "
-            f"The difficulty level is {data.level}. Your style is clear, concise, and professional. Do not lecture. "
-            "All questions must be relevant to the provided job role.\n\n"
-
-            "You MUST strictly follow this interview flow:\n\n"
-
-            "1. **Introduction**: You have already welcomed them. Wait for their confirmation to begin.\n\n"
-
-            "2. **Background Snapshot**: Ask: "
-            "'Give me a brief 30–40 second overview of your background and the type of work you've done related to this role.'\n\n"
+        logger.info("👤 New interview request: role=%s, exp=%s, level=%s", data.job_role, data.experience, data.level)
 
-            "3. **Technical Depth**: Ask the candidate to choose one project relevant to the job role. "
-            "Ask: 'Pick one project you're proud of that aligns with this role. In under a minute, explain the problem, your approach, "
-            "tools or techniques used, and the business impact.'\n\n"
-
-            "4. **Core Skills Check**: Inform them you will ask 3 rapid questions tailored to the job. "
-            "Generate **three crisp, role-specific skill checks** following this logic:\n"
-            "   - Question 1: A foundational concept essential to the role.\n"
-            "   - Question 2: A practical troubleshooting or decision-making question.\n"
-            "   - Question 3: A tool, framework, or technology familiarity question.\n"
-            "Questions must be specific to the given job role.\n\n"
-
-            "5. **Practical Scenario**: Generate **one short applied scenario** relevant to the role. "
-            "Ask the candidate to describe their high-level approach to solve it.\n\n"
-
-            "6. **Role & Communication Fit**: Ask a communication-focused question, such as: "
-            "'This role requires cross-team collaboration. Can you give an example where you explained something complex "
-            "to a non-technical or differently-skilled stakeholder?'\n\n"
-
-            "7. **Wrap-Up**: Say: 'Thank you. Any questions for me?' Then conclude: 'We’ll get back to you with next steps.'\n\n"
-
-            "**CRITICAL RULES:**\n"
-            "- Do NOT exceed the boundaries of each segment.\n"
-            "- If their answers run long, politely interrupt and move forward.\n"
-            "- Keep your phrasing tight and professional.\n"
-            "- All generated questions MUST be directly relevant to the specified job role."
-        )
-
-
-
-        webhook_url = f"{SERVER_URL}/api/webhook"
+        system_prompt = build_interviewer_prompt(data.name, data.job_role, data.experience, data.level)
 
         assistant_overrides = {
 
@@ -130,16 +102,23 @@ async def get_vapi_config(data: ConfigRequest):
                 "Thank you for your time"
             ],
 
-            # --- SERVER ---
-            "server": {
-                "url": webhook_url
-            },
             "metadata": {
                 "user_name": data.name,
                 "job_role": data.job_role,
+                # Read back by the post-call evaluation
+                "experience": data.experience,
+                "level": data.level,
                 "environment": "production_screening"
             }
         }
+        if current_user:
+            # Echoed back on webhook events; the webhook maps it to the user
+            # server-side (app.services.vapi_webhook.resolve_owner)
+            session = InterviewSession(token=secrets.token_urlsafe(32), user_id=current_user.id)
+            db.add(session)
+            # Committed before the client can start the call and Vapi sends events for it
+            await db.commit()
+            assistant_overrides["metadata"]["session_token"] = session.token
 
         return {
             "assistantId": VAPI_ASSISTANT_ID,
@@ -147,7 +126,7 @@ async def get_vapi_config(data: ConfigRequest):
         }
 
     except Exception as e:
-        print(f"❌ Vapi Configuration Error: {e}")
+        logger.error("❌ Vapi Configuration Error: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to configure agent: {str(e)}")
 
 
@@ -155,39 +134,104 @@ async def get_vapi_config(data: ConfigRequest):
 async def vapi_webhook_receiver(request: Request):
     """
     Endpoint that receives asynchronous events from Vapi's servers.
-    Saves transcripts to a local file.
+    Acks right away: the raw body is queued (or spilled to disk under load)
+    and parsed, deduplicated and stored by app.services.vapi_webhook.
     """
-    payload = await request.json()
-    message = payload.get("message", {})
-    call_id = payload.get("call", {}).get("id", "unknown_call")
-    
-    os.makedirs("transcripts", exist_ok=True)
-
-    if message.get("type") == "transcript" and message.get("transcriptType") == "final":
-        transcript_text = message.get('transcript')
-        role = message.get('role', 'unknown')
-
-        try:
-            with open(f"transcripts/{call_id}.txt", "a", encoding="utf-8") as f:
-                f.write(f"{role.upper()}: {transcript_text}\n")
-            print(f"🗣️ [Saved] {role.upper()}: {transcript_text}")
-        except Exception as e:
-            print(f"❌ Error saving transcript: {e}")
-
-    elif message.get("type") == "end-of-call-report":
-        metadata = payload.get("assistant", {}).get("metadata", {})
-        summary = message.get('summary', 'N/A')
-        
-        # Save summary to the same file
-        try:
-            with open(f"transcripts/{call_id}.txt", "a", encoding="utf-8") as f:
-                f.write(f"\n--- SUMMARY ---\n{summary}\n")
-        except Exception as e:
-            print(f"❌ Error saving summary: {e}")
-
-        print(f"\n--- 🏁 Call Ended Report ---")
-        print(f"  User: {metadata.get('user_name')}")
-        print(f"  Summary: {summary}")
-        print(f"---------------------------\n")
-
-    return {"status": "ok"}
\ No newline at end of file
+    if not settings.VAPI_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="VAPI_WEBHOOK_SECRET not configured in .env.")
+    presented = request.headers.get("x-vapi-secret", "")
+    if not hmac.compare_digest(presented.encode("utf-8"), settings.VAPI_WEBHOOK_SECRET.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+    await vapi_ingestor.submit(await request.body())
+    return {"status": "ok"}
+
+
+@router.get("/transcripts", response_model=List[TranscriptInfo])
+async def list_transcripts(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The current user's interview calls, most recent first."""
+    result = await db.execute(
+        select(
+            InterviewTranscriptEvent.call_id,
+            func.count(InterviewTranscriptEvent.id).label("events"),
+            func.min(InterviewTranscriptEvent.created_at).label("started_at"),
+            func.max(InterviewTranscriptEvent.created_at).label("last_event_at"),
+        )
+        .where(InterviewTranscriptEvent.user_id == current_user.id)
+        .group_by(InterviewTranscriptEvent.call_id)
+        .order_by(func.max(InterviewTranscriptEvent.created_at).desc())
+    )
+    return result.all()
+
+
+@router.get("/transcripts/{call_id}", response_model=TranscriptResponse)
+async def get_transcript(
+    call_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(
+        select(InterviewTranscriptEvent)
+        .where(InterviewTranscriptEvent.call_id == call_id, InterviewTranscriptEvent.user_id == current_user.id)
+        .order_by(InterviewTranscriptEvent.id)
+    )
+    events = result.scalars().all()
+    if not events:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+    return {"call_id": call_id, "events": events}
+
+
+@router.get("/evaluations", response_model=List[InterviewEvaluationResponse])
+async def list_evaluations(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(
+        select(InterviewEvaluation)
+        .where(InterviewEvaluation.user_id == current_user.id)
+        .order_by(InterviewEvaluation.created_at.desc())
+    )
+    return result.scalars().all()
+
+
+@router.get("/evaluations/{call_id}", response_model=InterviewEvaluationResponse)
+async def get_evaluation(
+    call_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(
+        select(InterviewEvaluation)
+        .where(InterviewEvaluation.call_id == call_id, InterviewEvaluation.user_id == current_user.id)
+    )
+    evaluation = result.scalar_one_or_none()
+    if not evaluation:
+        raise HTTPException(status_code=404, detail="Evaluation not found")
+    return evaluation
+
+
+@router.get("/recordings/{call_id}")
+async def get_recording(
+    call_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Recording URL, transcript and summary of one of the user's calls, from Vapi."""
+    owned = await db.execute(
+        select(InterviewTranscriptEvent.id)
+        .where(InterviewTranscriptEvent.call_id == call_id, InterviewTranscriptEvent.user_id == current_user.id)
+        .limit(1)
+    )
+    if owned.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Call not found")
+
+    try:
+        recording = await asyncio.to_thread(vapi_service.get_call_recording, call_id)
+    except Exception as e:
+        logger.error("❌ Failed to fetch recording for %s: %s", call_id, e)
+        raise HTTPException(status_code=502, detail="Could not fetch the recording from Vapi")
+    if recording is None:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    return recording
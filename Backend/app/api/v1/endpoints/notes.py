@@ -1,49 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Response, Body
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Response, Body, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User
 from app.models.tables import PDFData
-from app.api.deps import get_db, get_current_user, get_chroma_collection
+from app.api.deps import get_db, get_current_user, get_chroma_collection, admit
 from app.schema import AI_chat_input
 from app.llm import stream_chat
 import uuid
 from fastapi.responses import StreamingResponse
 from chromadb.api.models.Collection import Collection 
 from pathlib import Path
-from llama_index.readers.file.pymu_pdf import PyMuPDFReader
-from llama_index.core.node_parser import SentenceSplitter
 from typing import Annotated
 import shutil
 import tempfile
 import os
-from sentence_transformers import SentenceTransformer
-from .quiz import search_logic
-from sqlalchemy import select, desc, asc
+from .quiz import search_logic, search_user_notes
+from sqlalchemy import select, desc, asc, update, delete
 from app.models.tables import ChatSession, ChatMessage
-from app.schema.models import SessionCreate, SessionResponse, MessageResponse , NoteInfo
+from app.schema.models import SessionCreate, SessionResponse, MessageResponse , NoteInfo, NoteSearchResult
 from app.database import async_session_maker
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+from app.services.pdf_ingest import (
+    IngestProgress, ingest_progress, get_progress, read_first_pages,
+    chunk_pages, upsert_first_pages, start_background_ingest, chunk_id, count_pages,
+    save_progress, document_embedding
+)
+from app.services.chunking import get_chunker
+from app.services.query_planner import chat_queries
+from app.services.retrieval_router import plan_retrieval
+from app.services.embeddings import aencode
+from app.services.note_index import load_note_matrix, rank_notes, note_vector
+from app.services.vector_store import DEGRADED_HEADERS, VectorStoreUnavailable
+from app.services.page_render import PageOutOfRange, content_hash, page_renderer, snap_dpi
+from app.config import settings
+import asyncio
+import logging
+from app.core.telemetry import span
+from app.core.lifecycle import track_stream
+from app.core.admission import Ticket
 
 router = APIRouter()
 
+logger = logging.getLogger("uvicorn.error")
+
 UPLOAD_DIRECTORY = "uploaded_pdfs"
 os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-
 @router.post("/stream_chat", response_class=StreamingResponse)
 async def ai_chat(
     Input_model: AI_chat_input, 
     collection: Collection = Depends(get_chroma_collection), 
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    ticket: Ticket = Depends(admit("chat"))
 ):
     messages_dict = [msg.model_dump() for msg in Input_model.messages]
-    query = f"{Input_model.context};{Input_model.messages[-1].content}"
-    retrieved_docs: str | None = await search_logic(query, collection)
+    # Search on the question, alone and anchored to a short hint of the note
+    question = Input_model.messages[-1].content
+    queries = chat_queries(Input_model.context, question)
+    headers = None
+    try:
+        plan = await plan_retrieval(question, has_history=len(Input_model.messages) > 1, queries=queries)
+        retrieved_docs: str | None = None
+        if plan.retrieve:
+            retrieved_docs = await search_user_notes(queries, collection, db, current_user.id,
+                                                     query_embedding=plan.query_embedding, n_results=plan.top_k)
+    except VectorStoreUnavailable as e:
+        # Degraded: answer from the pinned note context alone
+        logger.warning("⚠️ Answering without retrieved notes: %s", e)
+        retrieved_docs, headers = None, DEGRADED_HEADERS
 
     return StreamingResponse(
-        stream_chat(messages_dict, Input_model.context, retrieved_docs),
-        media_type="text/plain"
+        track_stream(ticket.stream(stream_chat(messages_dict, Input_model.context, retrieved_docs))),
+        media_type="text/plain",
+        headers=headers,
+        background=ticket.release_task()
     )
 
 # Backend/app/api/v1/endpoints/notes.py
@@ -53,28 +84,37 @@ async def upload_notes(
     file: Annotated[UploadFile, File(description="A PDF file to upload")],
     collection: Collection = Depends(get_chroma_collection), 
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    ticket: Ticket = Depends(admit("upload"))
 ):
 
     safe_filename = f"{uuid.uuid4()}_{file.filename}"
     file_path = Path(UPLOAD_DIRECTORY) / safe_filename
+    handed_off = False
+    doc_id = None
     
     try:
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        chunks = await pdf_process(str(file_path))
+        # Only the leading pages are parsed inline; the rest stream in afterwards
+        pages_total, first_pages = await read_first_pages(str(file_path))
+        chunker = get_chunker()
+        chunks = await asyncio.to_thread(chunk_pages, first_pages, chunker)
         
-        if not chunks:
+        if not chunks and pages_total <= len(first_pages):
             raise ValueError("No text chunks could be extracted from this PDF.")
 
-        full_text_preview = " ".join(chunks)[:2000]
-        doc_embedding = embedding_model.encode(full_text_preview).tolist()
+        doc_embedding = await document_embedding(chunks)
 
         file.file.seek(0) 
+        pdf_blob = file.file.read()
         
         new_doc = PDFData(
-            pdf_blob=file.file.read(),     
+            pdf_blob=pdf_blob,
+            content_hash=content_hash(pdf_blob),
+            ingest_status="processing",
+            pages_total=pages_total,
             pdf_embedding=doc_embedding,        
             user_id=current_user.id,
             filename=file.filename 
@@ -83,63 +123,84 @@ async def upload_notes(
         db.add(new_doc)
         await db.commit()
         await db.refresh(new_doc)
+        doc_id = new_doc.id
 
-        ids = [str(uuid.uuid4()) for _ in chunks]
+        progress = IngestProgress(pdf_id=doc_id, pages_total=pages_total)
+        ingest_progress[doc_id] = progress
 
-        metadatas = [{
-            "source_file": file.filename,
-            "pdf_id": new_doc.id, 
-            "chunk_index": i
-        } for i in range(len(chunks))]
+        # First pages become searchable before we answer
+        await upsert_first_pages(chunks, len(first_pages), doc_id, file.filename, collection, progress, chunker.name)
 
-        await collection.add(
-            ids=ids,
-            documents=chunks,
-            metadatas=metadatas
-        )
+        start_background_ingest(str(file_path), new_doc.id, file.filename, collection, progress, chunker)
+        handed_off = True
 
         return {
             "status": "success", 
             "filename": file.filename, 
             "doc_id": new_doc.id,
-            "chunks_ingested": len(chunks)
+            "chunks_ingested": progress.chunks_indexed,
+            "pages_total": progress.pages_total,
+            "pages_indexed": progress.pages_indexed,
+            "ingest_status": progress.status
         }
 
+    except VectorStoreUnavailable:
+        raise
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error("Error processing PDF upload: %s", e)
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
         
     finally:
-        # Cleanup temp file
-        if file_path.exists():
+        # Cleanup temp file (the background ingest owns it once handed off)
+        if not handed_off and file_path.exists():
             os.remove(file_path)
+        if not handed_off and doc_id is not None:
+            await discard_upload(doc_id)
 
-# #--------Helper Functions--------#
 
-async def pdf_process(pdf_path: str):
+async def discard_upload(pdf_id: int):
+    """Remove the row of an upload that failed after it was committed, since the
+    client was told it failed. Chunks it already wrote are orphans for the reconciler."""
+    ingest_progress.pop(pdf_id, None)
     try:
-        loader = PyMuPDFReader()
-        
-        # Load data (this reads the file we just saved)
-        documents = loader.load_data(file_path=pdf_path)
-        
-        text_splitter = SentenceSplitter(
-            chunk_size=1000,
-            chunk_overlap=20
-        )
-        
-        text_chunks = []
-        
-        # Process all pages/documents found in the PDF
-        for doc in documents:
-            cur_text_chunks = text_splitter.split_text(doc.text)
-            text_chunks.extend(cur_text_chunks)
-
-        return text_chunks
+        async with async_session_maker() as cleanup_db:
+            await cleanup_db.execute(delete(PDFData).where(PDFData.id == pdf_id))
+            await cleanup_db.commit()
     except Exception as e:
-        print(f"PDF Processing Error: {e}")
-        raise e
-    
+        logger.error("❌ Could not remove failed upload %s: %s", pdf_id, e)
+
+
+@router.get("/{pdf_id}/progress")
+async def get_ingest_progress(
+    pdf_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Indexing progress of a PDF that is still being streamed into Chroma."""
+    result = await db.execute(
+        select(PDFData.ingest_status, PDFData.pages_total, PDFData.pages_indexed, PDFData.chunks_indexed,
+               PDFData.ingest_updated_at)
+        .where(PDFData.id == pdf_id, PDFData.user_id == current_user.id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    progress = get_progress(pdf_id)
+    if progress is not None:
+        return progress.as_dict()
+    # Ingested by another worker (or earlier): the state persisted on the row
+    status = row.ingest_status or "ready"  # NULL: indexed before the state was stored
+    if status == "processing" and _ingest_stale(row.ingest_updated_at):
+        status = "failed"
+    return {"pdf_id": pdf_id, "status": status, "pages_total": row.pages_total,
+            "pages_indexed": row.pages_indexed, "chunks_indexed": row.chunks_indexed}
+
+
+def _ingest_stale(updated_at) -> bool:
+    """A "processing" state nobody has updated in a while: its worker died mid-ingest."""
+    return updated_at is None or (datetime.utcnow() - updated_at).total_seconds() > settings.INGEST_STALE_SECONDS
+
 # -------------------------
 # 1. Session Management
 # -------------------------
@@ -204,34 +265,62 @@ async def chat_session(
     user_prompt: str,
     db: AsyncSession = Depends(get_db),
     collection: Collection = Depends(get_chroma_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    ticket: Ticket = Depends(admit("chat"))
 ):
-    # 1. Verify Session
-    session_res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
+    # The steps form a small DAG; independent I/O runs concurrently, each
+    # branch on its own DB session (an AsyncSession allows one operation at a time).
+    #   session lookup ─┬─> route -> chroma probe -> search ─┬─> LLM stream
+    #   history fetch  ─┘   user-message insert ─────────────┘
+    async def load_history():
+        async with async_session_maker() as history_db:
+            history_res = await history_db.execute(
+                select(ChatMessage)
+                .where(ChatMessage.session_id == session_id)
+                .order_by(asc(ChatMessage.created_at))
+            )
+            return history_res.scalars().all()
+
+    # 1. Verify Session, fetching the history alongside
+    session_res, history_msgs = await asyncio.gather(
+        db.execute(select(ChatSession).where(ChatSession.id == session_id)),
+        load_history(),
+    )
     session = session_res.scalar_one_or_none()
-    if not session:
+    if not session or session.user_id != current_user.id:
         raise HTTPException(404, "Session not found")
 
-    await ensure_pdf_in_chroma(session.pdf_id, db, collection)
-    # ---------------------------------------------------------
-
-    # 3. Save User Message
-    user_msg = ChatMessage(session_id=session_id, role="user", content=user_prompt)
-    db.add(user_msg)
-    await db.commit()
-
-    # 4. Filter & Search
-    filter_dict = {"pdf_id": session.pdf_id}
-    retrieved_context = await search_logic(user_prompt, collection, filter_dict)
-
-    # 5. Fetch History & Stream (Rest of your code remains the same)
-    history_res = await db.execute(
-        select(ChatMessage)
-        .where(ChatMessage.session_id == session_id)
-        .order_by(asc(ChatMessage.created_at))
-    )
-    history_msgs = history_res.scalars().all()
+    # 2. Retrieval, unless the turn only refers back to the conversation
+    #    (restoring the PDF into Chroma first if needed) ...
+    degraded = False
+
+    async def retrieve():
+        nonlocal degraded
+        plan = await plan_retrieval(user_prompt, has_history=bool(history_msgs))
+        if not plan.retrieve:
+            return ""
+        try:
+            await ensure_pdf_in_chroma(session.pdf_id, db, collection)
+            filter_dict = {"pdf_id": session.pdf_id}
+            return await search_logic(user_prompt, collection, filter_dict,
+                                      query_embedding=plan.query_embedding, n_results=plan.top_k)
+        except VectorStoreUnavailable as e:
+            # Degraded: answer from the conversation alone
+            logger.warning("⚠️ Session %s answering without retrieved notes: %s", session_id, e)
+            degraded = True
+            return ""
+
+    # 3. ... while the user message is saved
+    async def save_user_message():
+        async with async_session_maker() as write_db:
+            write_db.add(ChatMessage(session_id=session_id, role="user", content=user_prompt))
+            await write_db.commit()
+
+    retrieved_context, _ = await asyncio.gather(retrieve(), save_user_message())
+
+    # History was read before the insert, so the new message is appended here
     messages_payload = [{"role": m.role, "content": m.content} for m in history_msgs]
+    messages_payload.append({"role": "user", "content": user_prompt})
 
     async def response_generator():
         full_response = ""
@@ -239,32 +328,60 @@ async def chat_session(
             full_response += chunk
             yield chunk
             
-        async with async_session_maker() as new_db_session:
+        async with span("db_writeback"), async_session_maker() as new_db_session:
             ai_msg = ChatMessage(session_id=session_id, role="assistant", content=full_response)
             new_db_session.add(ai_msg)
             await new_db_session.commit()
 
-    return StreamingResponse(response_generator(), media_type="text/plain")
+    return StreamingResponse(track_stream(ticket.stream(response_generator())), media_type="text/plain",
+                             headers=DEGRADED_HEADERS if degraded else None,
+                             background=ticket.release_task())
 
 
 
 async def ensure_pdf_in_chroma(pdf_id: int, db: AsyncSession, collection: Collection):
     """
-    Checks if embeddings exist for the given PDF ID.
-    If not, it fetches the blob from SQL, chunks it, and re-uploads to Chroma.
+    Checks that the embeddings of the given PDF ID are complete.
+    If not, it fetches the blob from SQL and streams it back into Chroma:
+    the first pages are restored inline, the rest in the background. An
+    ingest that stopped halfway resumes from its last indexed page.
     """
-    # 1. Check Chroma first (Fast check)
-    # We query for just 1 ID to see if any exist with this metadata
-    existing = await collection.get(
-        where={"pdf_id": pdf_id},
-        limit=1
-    )
-    
-    if existing and len(existing['ids']) > 0:
-        print(f"✅ Embeddings found for PDF {pdf_id}. No action needed.")
+    progress = get_progress(pdf_id)
+    if progress and progress.status == "processing":
+        logger.info("⏳ PDF %s is already being indexed.", pdf_id)
+        return
+
+    state = (await db.execute(
+        select(PDFData.ingest_status, PDFData.pages_indexed, PDFData.chunks_indexed, PDFData.ingest_updated_at)
+        .where(PDFData.id == pdf_id)
+    )).one_or_none()
+    if state is None:
+        raise HTTPException(404, "PDF Data not found in database")
+
+    resume = None
+    if state.ingest_status == "processing" and not _ingest_stale(state.ingest_updated_at):
+        logger.info("⏳ PDF %s is being indexed by another worker.", pdf_id)
         return
+    if state.ingest_status == "ready":
+        if not state.chunks_indexed:
+            return  # no text to index
+        # 1. Chunk ids are sequential: the first and last one stand for the whole set
+        expected = [chunk_id(pdf_id, 0), chunk_id(pdf_id, state.chunks_indexed - 1)]
+        existing = await collection.get(ids=expected, include=[])
+        if len(existing['ids']) == len(set(expected)):
+            logger.debug("✅ Embeddings found for PDF %s. No action needed.", pdf_id)
+            return
+    elif state.ingest_status in ("processing", "failed") and state.pages_indexed:
+        # Stopped halfway (failed, or its worker died): pick up after the last saved batch
+        resume = (state.pages_indexed, state.chunks_indexed or 0)
+    elif state.ingest_status is None:
+        # Indexed before the state was stored: any chunk counts
+        existing = await collection.get(where={"pdf_id": pdf_id}, limit=1)
+        if existing and len(existing['ids']) > 0:
+            logger.debug("✅ Embeddings found for PDF %s. No action needed.", pdf_id)
+            return
 
-    print(f"⚠️ Embeddings missing for PDF {pdf_id}. Restoring from SQL...")
+    logger.warning("⚠️ Embeddings missing for PDF %s. Restoring from SQL...", pdf_id)
 
     # 2. Fetch Blob from SQL
     result = await db.execute(select(PDFData).where(PDFData.id == pdf_id))
@@ -273,46 +390,56 @@ async def ensure_pdf_in_chroma(pdf_id: int, db: AsyncSession, collection: Collec
     if not pdf_record:
         raise HTTPException(404, "PDF Data not found in database")
 
-    # 3. Write Blob to Temp File (Required because pdf_process expects a path)
+    # 3. Write Blob to Temp File (the page streamer reads from a path)
     # We use valid suffixes so PyMuPDF knows it's a PDF
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
         tmp_file.write(pdf_record.pdf_blob)
         tmp_path = tmp_file.name
 
+    handed_off = False
     try:
-        # 4. Re-Process (Reuse your existing chunking logic)
-        chunks = await pdf_process(tmp_path)
-        
-        if not chunks:
-            print("Warning: Restored PDF has no text.")
+        if resume is not None:
+            # 4. Continue the interrupted ingest in the background from where it stopped
+            pages_total = await asyncio.to_thread(count_pages, tmp_path)
+            progress = IngestProgress(pdf_id=pdf_id, pages_total=pages_total,
+                                      pages_indexed=resume[0], chunks_indexed=resume[1])
+            ingest_progress[pdf_id] = progress
+            await save_progress(progress)
+            start_background_ingest(tmp_path, pdf_id, pdf_record.filename, collection, progress, get_chunker())
+            handed_off = True
+            logger.info("♻️ Resuming PDF %s from page %s/%s", pdf_id, resume[0], pages_total)
             return
 
-        # 5. Re-Embed and Upload to Chroma
-        # Generate new UUIDs for the chunks
-        ids = [str(uuid.uuid4()) for _ in chunks]
+        # 4. Re-Process the leading pages inline, same pipeline as upload_notes
+        pages_total, first_pages = await read_first_pages(tmp_path)
+        chunker = get_chunker()
+        chunks = await asyncio.to_thread(chunk_pages, first_pages, chunker)
         
-        # EXACT SAME metadata structure as upload_notes
-        metadatas = [{
-            "source_file": pdf_record.filename, 
-            "pdf_id": pdf_id, 
-            "chunk_index": i
-        } for i in range(len(chunks))]
-
-        # Re-add to Chroma
-        await collection.add(
-            ids=ids,
-            documents=chunks,
-            metadatas=metadatas
-        )
-        print(f"♻️ Successfully restored {len(chunks)} chunks for PDF {pdf_id}")
+        if not chunks and pages_total <= len(first_pages):
+            logger.warning("Restored PDF %s has no text.", pdf_id)
+            return
 
+        # 5. Re-Embed and Upload to Chroma
+        # Chunk ids are deterministic, so a restore overwrites instead of duplicating
+        progress = IngestProgress(pdf_id=pdf_id, pages_total=pages_total)
+        ingest_progress[pdf_id] = progress
+        await save_progress(progress)
+        await upsert_first_pages(chunks, len(first_pages), pdf_id, pdf_record.filename, collection, progress,
+                                 chunker.name)
+
+        start_background_ingest(tmp_path, pdf_id, pdf_record.filename, collection, progress, chunker)
+        handed_off = True
+        logger.info("♻️ Restored first %s/%s pages for PDF %s", progress.pages_indexed, pages_total, pdf_id)
+
+    except VectorStoreUnavailable:
+        raise
     except Exception as e:
-        print(f"❌ Error restoring PDF: {e}")
+        logger.error("❌ Error restoring PDF %s: %s", pdf_id, e)
         raise HTTPException(500, f"Failed to restore PDF embeddings: {str(e)}")
         
     finally:
         # Cleanup temp file
-        if os.path.exists(tmp_path):
+        if not handed_off and os.path.exists(tmp_path):
             os.remove(tmp_path)
 
 @router.get("/", response_model=List[NoteInfo])
@@ -329,27 +456,141 @@ async def get_all_notes(
     return result.all()
 
 
-@router.get("/{pdf_id}/content")
-async def get_pdf_content(
+@router.get("/search", response_model=List[NoteSearchResult])
+async def search_notes(
+    q: str,
+    top_k: int = 10,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rank the user's notes by similarity of their document vector to the query."""
+    async with span("embedding"):
+        query = await aencode(q)
+    notes = await load_note_matrix(db, current_user.id)
+    return rank_notes(notes, query, top_k)
+
+
+@router.get("/{pdf_id}/similar", response_model=List[NoteSearchResult])
+async def similar_notes(
     pdf_id: int,
+    top_k: int = 5,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    """Other notes of this user closest to the given one."""
+    notes = await load_note_matrix(db, current_user.id)
+    vector = note_vector(notes, pdf_id)
+    if vector is None:
+        if pdf_id not in notes.ids:
+            raise HTTPException(status_code=404, detail="Note not found")
+        return []
+    return rank_notes(notes, vector, top_k, exclude_id=pdf_id)
+
+
+# A note's content never changes under its id, so renders can be cached for good
+IMMUTABLE = "private, max-age=31536000, immutable"
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+
+async def _load_blob(pdf_id: int) -> bytes:
+    # Own session: a render shared by several requests can outlive the one that started it
+    async with async_session_maker() as db:
+        return (await db.execute(select(PDFData.pdf_blob).where(PDFData.id == pdf_id))).scalar_one()
+
+
+async def _note_hash(pdf_id: int, db: AsyncSession, current_user: User):
+    """(filename, content hash) of the user's note, without loading the PDF itself."""
     result = await db.execute(
-        select(PDFData).where(PDFData.id == pdf_id, PDFData.user_id == current_user.id)
+        select(PDFData.filename, PDFData.content_hash).where(PDFData.id == pdf_id, PDFData.user_id == current_user.id)
     )
-    pdf = result.scalar_one_or_none()
-    
-    if not pdf:
+    row = result.one_or_none()
+    if row is None:
         raise HTTPException(status_code=404, detail="Note not found")
+    if row.content_hash is not None:
+        return row.filename, row.content_hash
+
+    # Uploaded before hashes were stored: hash it once now
+    digest = content_hash(await _load_blob(pdf_id))
+    await db.execute(update(PDFData).where(PDFData.id == pdf_id).values(content_hash=digest))
+    await db.commit()
+    return row.filename, digest
+
+
+@router.get("/{pdf_id}/pages")
+async def get_page_info(
+    pdf_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    _, digest = await _note_hash(pdf_id, db, current_user)
+    pages = await page_renderer.page_count(digest, lambda: _load_blob(pdf_id))
+    return {"pdf_id": pdf_id, "content_hash": digest, "pages": pages, "dpi": settings.PAGE_RENDER_DPI}
+
+
+async def _page_image(request: Request, pdf_id: int, page: int, dpi: int, kind: str, db, current_user) -> Response:
+    _, digest = await _note_hash(pdf_id, db, current_user)
+    etag = f'"{digest[:32]}-{kind}-{page}-{dpi}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if _not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    try:
+        image, media_type = await page_renderer.render(digest, page, dpi, lambda: _load_blob(pdf_id), kind=kind)
+    except PageOutOfRange as e:
+        raise HTTPException(status_code=404, detail=f"Page not found ({e})")
+    return Response(content=image, media_type=media_type, headers=headers)
+
+
+@router.get("/{pdf_id}/pages/{page}")
+async def get_page_image(
+    request: Request,
+    pdf_id: int,
+    page: int,
+    dpi: Optional[int] = Query(default=None, ge=1, le=600),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Page `page` (1-based) as an image; `dpi` is snapped to the nearest supported resolution."""
+    if page < 1:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return await _page_image(request, pdf_id, page, snap_dpi(dpi or settings.PAGE_RENDER_DPI), "page", db, current_user)
+
+
+@router.get("/{pdf_id}/pages/{page}/thumbnail")
+async def get_page_thumbnail(
+    request: Request,
+    pdf_id: int,
+    page: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if page < 1:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return await _page_image(request, pdf_id, page, settings.THUMBNAIL_DPI, "thumbnail", db, current_user)
+
+
+@router.get("/{pdf_id}/content")
+async def get_pdf_content(
+    request: Request,
+    pdf_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    filename, digest = await _note_hash(pdf_id, db, current_user)
 
     # FIX: Add 'Content-Disposition: inline' to tell browser to render it
     headers = {
-        "Content-Disposition": f"inline; filename={pdf.filename}"
+        "Content-Disposition": f"inline; filename={filename}",
+        "ETag": f'"{digest}"',
+        "Cache-Control": "private, no-cache"
     }
+    if _not_modified(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     
     return Response(
-        content=pdf.pdf_blob, 
+        content=await _load_blob(pdf_id), 
         media_type="application/pdf",
         headers=headers
     )
@@ -379,8 +620,8 @@ async def delete_note(
         # This deletes all chunks where metadata field 'pdf_id' matches
         await collection.delete(where={"pdf_id": note_id})
     except Exception as e:
-        print(f"Error deleting from Chroma: {e}")
-        # Proceed to delete from DB even if Chroma fails to avoid sync issues
+        logger.error("Error deleting PDF %s from Chroma: %s", note_id, e)
+        # Proceed to delete from DB even if Chroma fails; the reconciler removes the orphaned chunks
 
     # 3. Delete from Database (Cascades to Sessions/Messages)
     await db.delete(note)
@@ -1,14 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from chromadb import AsyncHttpClient
 from app.models import User
 from app.api.deps import get_db, get_current_user, get_chroma_client
 from app.schema import Quiz_input, QuizOutput, IngestRequest
-from .prompts import SYSTEM_PROMPT
+from .prompts import SYSTEM_PROMPT, QUIZ_INPUT_PROMPT
 from fastapi import APIRouter, Depends, HTTPException
 from chromadb.api.models.Collection import Collection 
-from app.api.deps import get_chroma_collection
+from app.api.deps import get_chroma_collection, admit
+from app.core.admission import Ticket
 from app.llm import call_llm
-import uuid
+from app.config import settings
+from app.services.context_builder import (
+    RetrievedChunk, ContextReport, build_retrieved_context, prompt_budget,
+    RETRIEVED_SHARE, PARSED_DOC_SHARE
+)
+from app.services.tokenizer import count_tokens, truncate_to_tokens
+from app.services.embeddings import aencode
+from app.services.note_index import route_to_notes
+from app.services.query_planner import resume_queries
+from app.services.vector_store import DEGRADED_HEADERS, VectorStoreUnavailable
+from app.services.quiz_notes import QuizNotesDoc, ingest_quiz_notes
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.telemetry import span, log_sampled
+from typing import Dict, List, Union
 import logging
 
 
@@ -16,66 +30,143 @@ router = APIRouter()
 
 logger = logging.getLogger("uvicorn.error") 
 
-async def search_logic(query: str, collection: Collection, filter_dict: dict = None):
-    logger.info(f"🔍 [Search Logic] Starting search for query: '{query}'")
-
-    try:
+async def search_chunks(query: Union[str, List[str]], collection: Collection, filter_dict: dict = None,
+                        n_results: int = None, query_embedding=None) -> List[RetrievedChunk]:
+    """Search one query or several sub-queries in a single batched vector query.
+    Hits are merged by chunk id (best distance wins) and ordered by distance."""
+    queries = [query] if isinstance(query, str) else list(query)
+    if query_embedding is None:
+        # Same model (and backend) as the stored chunks, see pdf_ingest.upsert_chunks
+        async with span("embedding"):
+            query_embedding = await aencode(queries)
+    async with span("retrieval"):
         results = await collection.query(
-        query_texts=[query],
-        n_results=5,
-        where=filter_dict
+            query_embeddings=query_embedding.tolist(),
+            n_results=n_results or settings.RETRIEVAL_TOP_K,
+            where=filter_dict,
+            include=["documents", "metadatas", "distances"]
+        )
+
+    if not results or not results.get('documents') or len(results['documents']) == 0:
+        return []
+
+    merged: Dict[str, RetrievedChunk] = {}
+    hits = skipped = 0
+    for i, raw_docs in enumerate(results['documents']):
+        ids = results['ids'][i]
+        metadatas = (results.get('metadatas') or [None] * (i + 1))[i] or [None] * len(raw_docs)
+        distances = (results.get('distances') or [None] * (i + 1))[i] or [None] * len(raw_docs)
+        hits += len(raw_docs)
+        for doc_id, doc, meta, dist in zip(ids, raw_docs, metadatas, distances):
+            if doc is None:
+                skipped += 1
+                continue
+            best = merged.get(doc_id)
+            if best is None or (dist is not None and (best.distance is None or dist < best.distance)):
+                merged[doc_id] = RetrievedChunk(id=doc_id, text=str(doc), metadata=meta or {}, distance=dist)
+
+    chunks = sorted(merged.values(), key=lambda c: c.distance if c.distance is not None else float("inf"))
+
+    log_sampled(
+        logger, "search.results",
+        queries=len(queries), hits=hits, unique=len(chunks),
+        top_distance=chunks[0].distance if chunks else None,
+        pdf_ids=sorted({c.metadata.get("pdf_id") for c in chunks if c.metadata.get("pdf_id") is not None}),
     )
-        
-        logger.info(f"📄 [Search Logic] Raw results from DB: {results}")
 
-        if results and results.get('documents') and len(results['documents']) > 0:
-            raw_docs = results['documents'][0]
+    if skipped:
+        logger.warning("⚠️ [Search Logic] Warning: Some documents contained NoneType and were skipped.")
 
-            valid_docs = [str(doc) for doc in raw_docs if doc is not None]
-            
-            logger.info(f"✅ [Search Logic] Processing: Found {len(raw_docs)} items. Valid text items: {len(valid_docs)}")
-            
-            if len(raw_docs) != len(valid_docs):
-                logger.warning("⚠️ [Search Logic] Warning: Some documents contained NoneType and were skipped.")
+    return chunks
+
+
+async def search_logic(query: Union[str, List[str]], collection: Collection, filter_dict: dict = None,
+                       token_budget: int = None, query_embedding=None, n_results: int = None):
 
-            final_context = " ".join(valid_docs)
+    try:
+        chunks = await search_chunks(query, collection, filter_dict, n_results, query_embedding=query_embedding)
+
+        if chunks:
+            # Dedupe overlapping chunks and pack the most relevant ones into the budget
+            report = ContextReport(budget=token_budget or int(prompt_budget() * RETRIEVED_SHARE))
+            final_context = build_retrieved_context(chunks, report.budget, report)
+            log_sampled(logger, "search.context", query_chars=len(query) if isinstance(query, str) else sum(map(len, query)),
+                        **report.as_dict())
             return final_context
             
         else:
             logger.warning("⚠️ [Search Logic] No documents found for this query.")
             return ""
 
+    except VectorStoreUnavailable:
+        # An outage is not "no results": callers decide whether to degrade or fail
+        raise
     except Exception as e:
-        logger.error(f"❌ [Search Logic] CRITICAL ERROR: {str(e)}")
+        logger.error("❌ [Search Logic] CRITICAL ERROR: %s", e)
         return ""
 
+async def search_user_notes(query: Union[str, List[str]], collection: Collection, db: AsyncSession, user_id: int,
+                            token_budget: int = None, query_embedding=None, n_results: int = None):
+    """Two-stage retrieval: rank the user's notes by document vector, then
+    search chunks of the closest ones only (never other users' documents).
+    With several sub-queries a note ranks by its best-matching one."""
+    queries = [query] if isinstance(query, str) else list(query)
+    try:
+        if query_embedding is None:
+            async with span("embedding"):
+                query_embedding = await aencode(queries)
+        async with span("note_routing"):
+            pdf_ids = await route_to_notes(db, user_id, query_embedding, settings.NOTE_ROUTING_TOP_K)
+    except Exception as e:
+        logger.error("❌ [Search Logic] Note routing failed: %s", e)
+        return ""
+    log_sampled(logger, "search.routing", user_id=user_id, pdf_ids=pdf_ids)
+
+    if not pdf_ids:
+        return ""
+    return await search_logic(queries, collection, {"pdf_id": {"$in": pdf_ids}}, token_budget,
+                              query_embedding=query_embedding, n_results=n_results)
+
+
 @router.get("/search_docs")
 async def search_documents(
     query: str,
-    collection: Collection = Depends(get_chroma_collection)
+    collection: Collection = Depends(get_chroma_collection),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
 ):
     try:
-        return await search_logic(query, collection)
+        return await search_user_notes(query, collection, db, current_user.id)
+    except VectorStoreUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(500, f"ChromaDB Query Error: {e}")
 
 
 @router.post("/resume", response_model=QuizOutput, status_code=status.HTTP_201_CREATED)
 async def generate_quiz_resume(
+    request: Request,
+    response: Response,
     Input_model: Quiz_input, 
     collection: Collection = Depends(get_chroma_collection), 
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    ticket: Ticket = Depends(admit("quiz"))
 ):
     try:
-        query = Input_model.parsed_doc + Input_model.user_prompt
-        retrieved_context = await search_logic(query, collection)
-        
+        # One sub-query per resume section instead of the whole resume as one string
+        queries = resume_queries(Input_model.parsed_doc, Input_model.user_prompt)
+        # The resume itself is the main context; the user's notes only add to it
+        try:
+            retrieved_context = await search_user_notes(queries, collection, db, current_user.id)
+        except VectorStoreUnavailable as e:
+            logger.warning("⚠️ Generating resume quiz without notes: %s", e)
+            retrieved_context = ""
+            response.headers.update(DEGRADED_HEADERS)
 
-        if not retrieved_context:
-            raise ValueError("No context available to generate quiz.")
         prompt = await prompt_builder(Input_model.parsed_doc, Input_model.user_prompt, retrieved_context)
         
-        quiz_data_obj = await call_llm(prompt)
+        quiz_data_obj = await call_llm(prompt, SYSTEM_PROMPT, is_disconnected=request.is_disconnected)
 
         return quiz_data_obj
 
@@ -86,20 +177,9 @@ async def generate_quiz_resume(
         )
 
 
-async def ingest_logic(input_data:IngestRequest , collection: Collection):
-    doc_id = input_data.id if input_data.id else str(uuid.uuid4())
-
-    await collection.add(
-        ids = [doc_id],
-        documents=[input_data.parsed_doc],
-        metadatas=[{"user_prompt": input_data.user_prompt}]
-    )
-
-    return {
-        "status": "success",
-        "id": doc_id,
-        "stored_prompt": input_data.user_prompt
-    }
+async def ingest_logic(input_data:IngestRequest , collection: Collection, user_id: int) -> QuizNotesDoc:
+    # Keyed by owner and content hash: the same notes are embedded once and then reused
+    return await ingest_quiz_notes(input_data.parsed_doc, user_id, collection)
 
 @router.post("/ingest", status_code=status.HTTP_201_CREATED)
 async def ingest_data(
@@ -108,7 +188,16 @@ async def ingest_data(
     current_user: User = Depends(get_current_user)
 ):
     try: 
-        return await ingest_logic(input_data, collection)
+        doc = await ingest_logic(input_data, collection, current_user.id)
+        return {
+            "status": "success",
+            "id": doc.doc_id,
+            "chunks": doc.chunks,
+            "reused": doc.reused,
+            "stored_prompt": input_data.user_prompt
+        }
+    except VectorStoreUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -119,26 +208,30 @@ async def ingest_data(
 
 @router.post("/notes", response_model=QuizOutput, status_code=status.HTTP_201_CREATED)
 async def generate_quiz_notes(
+    request: Request,
     Input_model: IngestRequest, 
     collection: Collection = Depends(get_chroma_collection), 
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    ticket: Ticket = Depends(admit("quiz"))
 ):
     try:
-        notes = Input_model
-        await ingest_logic(notes, collection)
+        doc = await ingest_logic(Input_model, collection, current_user.id)
 
-        query = Input_model.user_prompt
-        retrieved_context = await search_logic(query, collection)
+        # Search only these notes, never other users' documents
+        query = Input_model.user_prompt or Input_model.parsed_doc[:500]
+        retrieved_context = await search_logic(query, collection, doc.where())
         
 
         if not retrieved_context:
             raise ValueError("No context available to generate quiz.")
         prompt = await prompt_builder(Input_model.parsed_doc, Input_model.user_prompt, retrieved_context)
         
-        quiz_data_obj = await call_llm(prompt)
+        quiz_data_obj = await call_llm(prompt, SYSTEM_PROMPT, is_disconnected=request.is_disconnected)
 
         return quiz_data_obj
 
+    except VectorStoreUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -150,9 +243,20 @@ async def generate_quiz_notes(
 
 
 async def prompt_builder(parsed_doc:str, user_prompt:str, docs:str=None):
-    prompt = SYSTEM_PROMPT.format(
+    # Large resumes/notes are cut to their share of the model's prompt budget
+    budget = prompt_budget()
+    parsed_doc = truncate_to_tokens(parsed_doc, int(budget * PARSED_DOC_SHARE))
+
+    prompt = QUIZ_INPUT_PROMPT.format(
         user_prompt=user_prompt,
         parsed_info=parsed_doc,
         retrieved_docs=docs
     )
-    return prompt
\ No newline at end of file
+    report = ContextReport(budget=budget, parts={
+        "instructions": count_tokens(SYSTEM_PROMPT),
+        "user_prompt": count_tokens(user_prompt),
+        "parsed_doc": count_tokens(parsed_doc),
+        "retrieved": count_tokens(docs or ""),
+    })
+    logger.info("📦 [Prompt Builder] Prompt tokens: %s", report.parts)
+    return prompt
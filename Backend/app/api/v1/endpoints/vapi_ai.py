@@ -5,8 +5,12 @@ from app.config import settings
 from app.api.deps import get_current_user
 from app.models import User
 
+import logging
+
 router = APIRouter()
 
+logger = logging.getLogger("uvicorn.error")
+
 class InterviewConfigRequest(BaseModel):
     name: str = Field(..., min_length=2, max_length=100)
     job_role: str = Field(..., min_length=2, max_length=100)
@@ -54,7 +58,7 @@ async def get_vapi_config(
         )
         
     except Exception as e:
-        print(f"Vapi Config Error: {e}")
+        logger.error("Vapi Config Error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to create interview configuration: {str(e)}"
@@ -77,5 +81,5 @@ async def get_call_recording(
         return recording_data
         
     except Exception as e:
-        print(f"Error fetching recording: {e}")
+        logger.error("Error fetching recording %s: %s", call_id, e)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -12,16 +14,158 @@ class Settings(BaseSettings):
 
     CORS_ORIGINS: list = ["*"]
 
+    # Logging: records go through a bounded queue drained off the event loop
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_RATE_LIMIT_PER_SEC: float = 50
+    LOG_RATE_LIMIT_BURST: int = 200
+    # Fraction of requests whose structured trace/payload logs are emitted
+    LOG_SAMPLE_RATE: float = 0.05
+    DB_ECHO: bool = False
+
     chroma_host: str
     chroma_port: int
     chroma_collection: str
+    # Vector store client (app/services/vector_store.py): per-call timeouts and circuit breaker
+    CHROMA_TIMEOUT: float = 5.0
+    # add/upsert/update/delete (indexing); their timeouts do not trip the breaker
+    CHROMA_WRITE_TIMEOUT: float = 30.0
+    CHROMA_CONNECT_TIMEOUT: float = 3.0
+    CHROMA_BREAKER_THRESHOLD: int = 5
+    CHROMA_BREAKER_RESET: float = 15.0
 
     GROQ_API_KEY: str
-    
+    LLM_MODEL: str = "openai/gpt-oss-120b"
+    LLM_BASE_URL: str = "https://api.groq.com/openai/v1"
+    # Upstream requests in flight per worker; LLM_INTERACTIVE_RESERVED of them are kept for chat.
+    # Queued requests past their class deadline (seconds) are served first (app/services/llm_scheduler.py)
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_INTERACTIVE_RESERVED: int = 4
+    LLM_INTERACTIVE_DEADLINE: float = 2.0
+    LLM_STANDARD_DEADLINE: float = 30.0
+    LLM_BACKGROUND_DEADLINE: float = 120.0
+
+    # Token budgets for prompt assembly (see app/services/context_builder.py)
+    PROMPT_TOKEN_BUDGET: int = 8000
+    RETRIEVAL_TOP_K: int = 8
+    # Two-stage retrieval: chunk search is limited to the user's N closest notes
+    NOTE_ROUTING_TOP_K: int = 5
+    # Multi-query retrieval: sub-queries per request and tokens of context in each
+    MAX_SUB_QUERIES: int = 6
+    SUB_QUERY_TOKENS: int = 64
+    # Chat turns that only refer back to the conversation skip retrieval
+    # (app/services/retrieval_router.py); the classifier only sees turns of up to ROUTER_MAX_WORDS
+    ROUTER_ENABLED: bool = True
+    ROUTER_MIN_SIMILARITY: float = 0.6
+    ROUTER_MARGIN: float = 0.08
+    ROUTER_MAX_WORDS: int = 12
+    ROUTER_FOLLOWUP_TOP_K: int = 4
+    ROUTER_BROAD_TOP_K: int = 16
 
     VAPI_ASSISTANT_ID: str = "your-vapi-assistant-id"
     VAPI_PRIVATE_KEY: str
     VAPI_PUBLIC_KEY: str
+    # Server URL secret set on the assistant in the Vapi dashboard; Vapi sends it as
+    # X-Vapi-Secret and /api/webhook rejects events without it (empty: webhook disabled)
+    VAPI_WEBHOOK_SECRET: str = ""
+
+    # Embedding model: loaded on first use, warmed up in the background after
+    # startup, or eagerly before the server starts when PRELOAD_MODELS is set
+    # (unset: preloaded by run.py --prod, so gunicorn workers share one copy).
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_WARMUP: bool = True
+    PRELOAD_MODELS: Optional[bool] = None
+    # "torch", "onnx" or "onnx-int8" (ONNX Runtime exports of the same model,
+    # so vectors stay in the same space; check with benchmarks/embedding_parity.py)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_INT8_FILE: str = "onnx/model_quint8_avx2.onnx"
+    # Measured per machine type with benchmarks/embedding_throughput.py; 0 times the
+    # candidates when the model loads instead (in every worker, delaying readiness)
+    EMBEDDING_BATCH_SIZE: int = 32
+    # Storage type of the per-note document vector: "float32", "float16" or "int8"
+    DOC_EMBEDDING_DTYPE: str = "float32"
+
+    # Production server (python run.py --prod); 0 workers means one per CPU
+    WEB_CONCURRENCY: int = 0
+    # On SIGTERM a worker fails readiness for SHUTDOWN_READY_DELAY seconds before it stops
+    # accepting connections, then waits for open streams; both within SHUTDOWN_GRACE_SECONDS
+    SHUTDOWN_GRACE_SECONDS: int = 30
+    SHUTDOWN_READY_DELAY: float = 5.0
+
+    # Interview transcripts: webhook events are queued and written in batches
+    TRANSCRIPT_QUEUE_SIZE: int = 10000
+    TRANSCRIPT_BATCH_SIZE: int = 200
+    TRANSCRIPT_FLUSH_INTERVAL: float = 0.5
+    # Retries (with backoff) of a flush that failed on a lost database connection
+    TRANSCRIPT_FLUSH_RETRIES: int = 3
+    # Vapi webhook ingestion: events beyond the queue spill to disk in WEBHOOK_SPILL_DIR
+    WEBHOOK_QUEUE_SIZE: int = 5000
+    WEBHOOK_CONSUMERS: int = 4
+    WEBHOOK_DEDUPE_WINDOW: int = 50000
+    WEBHOOK_SPILL_DIR: str = "transcripts"
+    # Post-interview evaluation worker: batches of finished calls are scored by the
+    # LLM with at most EVALUATION_CONCURRENCY calls in flight and EVALUATION_RPM per minute.
+    # Both are totals for the deployment: every worker process runs its own evaluator
+    # and takes a 1/WEB_CONCURRENCY share (run.py --prod sets WEB_CONCURRENCY to the
+    # worker count; set it yourself when starting gunicorn/uvicorn workers another way)
+    EVALUATION_ENABLED: bool = True
+    EVALUATION_BATCH_SIZE: int = 8
+    EVALUATION_BATCH_WAIT: float = 5.0
+    EVALUATION_CONCURRENCY: int = 4
+    EVALUATION_RPM: int = 30
+    EVALUATION_MAX_ATTEMPTS: int = 3
+    EVALUATION_SWEEP_INTERVAL: float = 60.0
+    EVALUATION_TRANSCRIPT_TOKENS: int = 6000
+
+    # Admission control for chat, quiz and upload (per user, per worker; see app/core/admission.py)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_CHAT_RPM: float = 30
+    ADMISSION_CHAT_BURST: int = 10
+    ADMISSION_QUIZ_RPM: float = 10
+    ADMISSION_QUIZ_BURST: int = 3
+    ADMISSION_UPLOAD_RPM: float = 6
+    ADMISSION_UPLOAD_BURST: int = 3
+    ADMISSION_MAX_STREAMS_PER_USER: int = 3
+    # Requests doing embedding/LLM work at once; the rest wait up to ADMISSION_QUEUE_TIMEOUT
+    ADMISSION_MAX_ACTIVE: int = 32
+    ADMISSION_MAX_QUEUED: int = 256
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0
+
+    # Reconciler: periodic pass removing vector store chunks of deleted PDFs and duplicates
+    RECONCILE_ENABLED: bool = True
+    RECONCILE_INTERVAL: float = 3600.0
+    RECONCILE_PAGE_SIZE: int = 500
+    # Also delete chunks with no owner at all (documents added by the old /quiz/notes and /quiz/ingest)
+    RECONCILE_DROP_UNOWNED: bool = False
+    # Notes pasted into /quiz/notes stay searchable this long after their last use
+    QUIZ_NOTES_TTL_HOURS: float = 72
+
+    # PDF ingestion: the first pages are indexed before upload_notes returns,
+    # the rest are streamed in the background in page batches.
+    INGEST_FIRST_PAGES: int = 10
+    INGEST_PAGE_BATCH: int = 25
+    # Finished ingests stay in the worker's progress map this long (seconds); a "processing"
+    # state not updated for INGEST_STALE_SECONDS belongs to a dead worker and is repaired
+    INGEST_PROGRESS_TTL: float = 600.0
+    INGEST_STALE_SECONDS: float = 300.0
+    # Documents with at least PDF_PARSE_MIN_PAGES pages left are parsed by a pool of
+    # worker processes, one page batch each; 0 workers means half the CPUs (at most 4)
+    PDF_PARSE_WORKERS: int = 0
+    PDF_PARSE_MIN_PAGES: int = 100
+
+    # Page images for the notes viewer, rendered in the PDF worker pool and kept
+    # in an on-disk LRU cache; PAGE_RENDER_FORMAT is "png" or "jpeg"
+    PAGE_CACHE_DIR: str = "page_cache"
+    PAGE_CACHE_MAX_MB: int = 512
+    PAGE_RENDER_DPI: int = 96
+    PAGE_RENDER_FORMAT: str = "png"
+    PAGE_RENDER_JPEG_QUALITY: int = 80
+    THUMBNAIL_DPI: int = 24
+
+    # Chunking: "token" (sentence-aware), "section" (heading-aware) or "page"
+    CHUNK_STRATEGY: str = "token"
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 20
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,242 @@
+"""
+Per-user admission control for the expensive endpoints (chat, quiz, upload).
+
+A request passes three gates, cheapest first:
+
+1. concurrent streams: at most ADMISSION_MAX_STREAMS_PER_USER open chat streams per user
+2. rate: a token bucket per (user, endpoint class)
+3. capacity: at most ADMISSION_MAX_ACTIVE requests do embedding/LLM work at
+   once; the rest wait in a weighted fair queue, so interactive chat is served
+   ahead of bulk uploads and one user's backlog cannot starve everyone else.
+
+Failing a gate is an immediate 429 with Retry-After. State is per worker
+process, so with N workers a user's effective limits are N times higher.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from starlette.background import BackgroundTask
+
+from app.config import settings
+from app.core.rate_limit import TokenBucket
+from app.core.telemetry import Counter, Gauge, record_stage, registry
+
+ADMISSIONS = registry.register(Counter(
+    "prepai_admission_total", "Admission decisions by endpoint class and outcome.", ("endpoint_class", "outcome")))
+ADMISSION_ACTIVE = registry.register(Gauge(
+    "prepai_admission_active", "Admitted requests currently doing work in this worker."))
+ADMISSION_QUEUED = registry.register(Gauge(
+    "prepai_admission_queued", "Requests waiting for capacity in this worker."))
+
+# Retry-After for a user at their stream cap: roughly the length of one answer
+STREAM_RETRY_AFTER = 5
+# Bound on per-user rate state; the least recently seen users are forgotten first
+MAX_TRACKED_BUCKETS = 10000
+
+
+@dataclass(frozen=True)
+class EndpointClass:
+    name: str
+    per_minute: float
+    burst: float
+    # Share of capacity under contention, relative to the other classes
+    weight: float
+    streaming: bool = False
+
+
+ENDPOINT_CLASSES: Dict[str, EndpointClass] = {
+    "chat": EndpointClass("chat", settings.ADMISSION_CHAT_RPM, settings.ADMISSION_CHAT_BURST, weight=4, streaming=True),
+    "quiz": EndpointClass("quiz", settings.ADMISSION_QUIZ_RPM, settings.ADMISSION_QUIZ_BURST, weight=2),
+    "upload": EndpointClass("upload", settings.ADMISSION_UPLOAD_RPM, settings.ADMISSION_UPLOAD_BURST, weight=1),
+}
+
+
+def too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class FairQueue:
+    """
+    Start-time fair queuing over `capacity` slots.
+
+    Each flow (here: user and endpoint class) gets a virtual finish tag that
+    advances by 1/weight per request. A freed slot goes to the waiter with the
+    smallest tag, so under contention flows are served in proportion to their
+    weights and a flow with many queued requests waits behind everyone else's.
+    """
+
+    def __init__(self, capacity: int, max_queued: int):
+        self.capacity = max(1, capacity)
+        self.max_queued = max_queued
+        self.active = 0
+        self._heap: List[Tuple[float, int, float, asyncio.Future]] = []
+        self._finish: Dict[Hashable, float] = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for *_, fut in self._heap if not fut.done())
+
+    def _tag(self, flow: Hashable, weight: float) -> Tuple[float, float]:
+        start = max(self._vtime, self._finish.get(flow, 0.0))
+        finish = start + 1.0 / weight
+        self._finish[flow] = finish
+        return start, finish
+
+    async def acquire(self, flow: Hashable, weight: float, timeout: float):
+        """Wait for a slot; raises asyncio.QueueFull or asyncio.TimeoutError."""
+        if self.active < self.capacity and not self._heap:
+            self._vtime, _ = self._tag(flow, weight)
+            self.active += 1
+            return
+        if self.queued >= self.max_queued:
+            raise asyncio.QueueFull
+        start, finish = self._tag(flow, weight)
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), start, fut))
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if fut.done() and not fut.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self.release()
+            else:
+                fut.cancel()
+            raise
+
+    def release(self):
+        while self._heap:
+            _, _, start, fut = heapq.heappop(self._heap)
+            if fut.done():
+                continue  # the waiter timed out or went away
+            # The slot passes straight to the next waiter
+            self._vtime = start
+            fut.set_result(None)
+            return
+        self.active -= 1
+        if self.active == 0:
+            # Idle: old tags no longer matter, and the map would only grow
+            self._finish.clear()
+            self._vtime = 0.0
+
+
+class Ticket:
+    """An admitted request. Released exactly once, by the endpoint or by its stream."""
+
+    def __init__(self, controller: Optional["AdmissionController"], user_id: int, endpoint_class: EndpointClass):
+        self.controller = controller
+        self.user_id = user_id
+        self.endpoint_class = endpoint_class
+        self.handed_off = False
+        self._released = controller is None
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.controller._release(self)
+
+    def stream(self, body: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Keep the ticket until `body` is exhausted or the client disconnects.
+
+        Pass `release_task()` as the response's background too: a body that is
+        never iterated (the client went away before the response started) never
+        reaches the release in its finally.
+        """
+        self.handed_off = True
+        return self._guarded(body)
+
+    def release_task(self) -> BackgroundTask:
+        """Releases the ticket once the response is over, whether or not its body ran."""
+        return BackgroundTask(self.release)
+
+    async def _guarded(self, body: AsyncIterator[str]) -> AsyncIterator[str]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            self.release()
+
+
+class AdmissionController:
+    def __init__(self):
+        self.queue = FairQueue(settings.ADMISSION_MAX_ACTIVE, settings.ADMISSION_MAX_QUEUED)
+        self._buckets: "OrderedDict[Tuple[int, str], TokenBucket]" = OrderedDict()
+        self._streams: Dict[int, int] = {}
+
+    def _bucket(self, user_id: int, cls: EndpointClass) -> TokenBucket:
+        key = (user_id, cls.name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(cls.per_minute / 60.0, max(1.0, cls.burst))
+            if len(self._buckets) > MAX_TRACKED_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    async def admit(self, user_id: int, cls: EndpointClass) -> Ticket:
+        if not settings.ADMISSION_ENABLED:
+            return Ticket(None, user_id, cls)
+
+        if cls.streaming and self._streams.get(user_id, 0) >= settings.ADMISSION_MAX_STREAMS_PER_USER:
+            ADMISSIONS.inc(endpoint_class=cls.name, outcome="stream_cap")
+            raise too_many_requests("Too many responses streaming at once; wait for one to finish.",
+                                    STREAM_RETRY_AFTER)
+
+        wait = self._bucket(user_id, cls).try_acquire()
+        if wait > 0:
+            ADMISSIONS.inc(endpoint_class=cls.name, outcome="rate_limited")
+            raise too_many_requests(f"Rate limit for {cls.name} requests exceeded.", wait)
+
+        if cls.streaming:
+            self._streams[user_id] = self._streams.get(user_id, 0) + 1
+        start = time.perf_counter()
+        try:
+            await self.queue.acquire((user_id, cls.name), cls.weight, settings.ADMISSION_QUEUE_TIMEOUT)
+        except (asyncio.QueueFull, asyncio.TimeoutError) as e:
+            self._end_stream(user_id, cls)
+            outcome = "queue_full" if isinstance(e, asyncio.QueueFull) else "queue_timeout"
+            ADMISSIONS.inc(endpoint_class=cls.name, outcome=outcome)
+            raise too_many_requests("Server is busy, try again shortly.", settings.ADMISSION_QUEUE_TIMEOUT)
+        except asyncio.CancelledError:
+            self._end_stream(user_id, cls)
+            raise
+        finally:
+            self._update_gauges()
+        record_stage("admission_wait", time.perf_counter() - start)
+        ADMISSIONS.inc(endpoint_class=cls.name, outcome="admitted")
+        return Ticket(self, user_id, cls)
+
+    def _end_stream(self, user_id: int, cls: EndpointClass):
+        if not cls.streaming:
+            return
+        left = self._streams.get(user_id, 0) - 1
+        if left > 0:
+            self._streams[user_id] = left
+        else:
+            self._streams.pop(user_id, None)
+
+    def _release(self, ticket: Ticket):
+        self._end_stream(ticket.user_id, ticket.endpoint_class)
+        self.queue.release()
+        self._update_gauges()
+
+    def _update_gauges(self):
+        ADMISSION_ACTIVE.set(self.queue.active)
+        ADMISSION_QUEUED.set(self.queue.queued)
+
+
+admission = AdmissionController()
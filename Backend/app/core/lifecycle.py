@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import signal
+import threading
+from typing import AsyncIterator, Optional
+
+from app.core.telemetry import Gauge, registry
+
+logger = logging.getLogger("uvicorn.error")
+
+ACTIVE_STREAMS = registry.register(Gauge(
+    "prepai_active_streams", "Chat responses currently streaming in this worker."))
+
+_active = 0
+_idle = asyncio.Event()
+_idle.set()
+_draining = False
+_drain_task: Optional[asyncio.Task] = None
+
+
+def active_streams() -> int:
+    return _active
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+async def track_stream(stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Wrap a streaming body so shutdown can wait for it to finish."""
+    global _active
+    _active += 1
+    _idle.clear()
+    ACTIVE_STREAMS.set(_active)
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        _active -= 1
+        ACTIVE_STREAMS.set(_active)
+        if _active == 0:
+            _idle.set()
+
+
+async def drain_streams(timeout: float):
+    """Mark the worker as draining and wait (bounded) for in-flight streams."""
+    global _draining
+    _draining = True
+    if _active == 0:
+        return
+    logger.info("⏳ Draining %s active stream(s) for up to %ss", _active, timeout)
+    try:
+        await asyncio.wait_for(_idle.wait(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Shutdown grace period over with %s stream(s) still open", _active)
+
+
+def install_drain_on_sigterm(ready_delay: float, grace: float):
+    """Start draining as soon as SIGTERM arrives, before the server closes its listener.
+
+    uvicorn (also inside gunicorn's UvicornWorker) stops accepting connections
+    on SIGTERM and only runs the lifespan shutdown once they are closed, which
+    is too late to fail readiness or wait for streams. This handler marks the
+    worker as draining, keeps serving for `ready_delay` seconds so the load
+    balancer sees /health/ready fail, waits up to `grace` for open streams,
+    and only then passes the signal on to the server's own handler. A second
+    SIGTERM is passed on at once.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    server_handler = signal.getsignal(signal.SIGTERM)
+    if not callable(server_handler):
+        return
+
+    async def drain_then_exit(signum, frame):
+        logger.info("🛑 SIGTERM: draining for %ss before closing the listener", ready_delay)
+        await asyncio.sleep(ready_delay)
+        await drain_streams(max(0.0, grace - ready_delay))
+        server_handler(signum, frame)
+
+    def on_sigterm(signum, frame):
+        global _draining
+        if _draining:
+            server_handler(signum, frame)
+            return
+        _draining = True
+
+        def start():
+            global _drain_task
+            _drain_task = loop.create_task(drain_then_exit(signum, frame))
+
+        loop.call_soon_threadsafe(start)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
@@ -0,0 +1,130 @@
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from app.config import settings
+from app.core.telemetry import Counter, registry
+
+# Loggers whose handlers are moved behind the queue ("uvicorn.error" propagates to "uvicorn")
+APP_LOGGERS = ("uvicorn", "uvicorn.access", "app")
+
+LOG_DROPPED = registry.register(Counter(
+    "prepai_log_records_dropped_total", "Log records dropped instead of blocking the event loop.", ("reason",)))
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger: at most `rate` records/second with bursts of `burst`.
+    Warnings and errors are never limited."""
+
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(record.name, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now)
+                self._suppressed[record.name] = self._suppressed.get(record.name, 0) + 1
+                LOG_DROPPED.inc(reason="rate_limited")
+                return False
+            self._buckets[record.name] = (tokens - 1, now)
+            suppressed = self._suppressed.pop(record.name, 0)
+        if suppressed:
+            record.msg = f"[{suppressed} earlier messages suppressed] {record.msg}"
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and never formats on the calling thread.
+
+    The stock handler formats every record in prepare(), i.e. on the event loop.
+    Here the record is enqueued as-is and message interpolation happens in the
+    listener thread; when the queue is full the record is dropped and counted.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(reason="queue_full")
+
+
+class _DispatchHandler(logging.Handler):
+    """Runs on the listener thread and hands each record to the handlers its
+    logger had before setup_logging(), so per-logger formatters keep working."""
+
+    def __init__(self, routes: Dict[str, List[logging.Handler]], default: List[logging.Handler]):
+        super().__init__()
+        self.routes = routes
+        self.default = default
+
+    def _handlers_for(self, name: str) -> List[logging.Handler]:
+        while name:
+            if name in self.routes:
+                return self.routes[name]
+            name = name.rpartition(".")[0]
+        return self.default
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        for handler in self._handlers_for(record.name):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging():
+    """Route app and uvicorn logs through a bounded queue drained by a background thread."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT_PER_SEC, settings.LOG_RATE_LIMIT_BURST))
+
+    default = logging.StreamHandler()
+    default.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    routes: Dict[str, List[logging.Handler]] = {}
+    for name in APP_LOGGERS:
+        log = logging.getLogger(name)
+        routes[name] = list(log.handlers) or [default]
+        log.handlers = [queue_handler]
+        log.propagate = False
+    logging.getLogger("uvicorn.error").setLevel(settings.LOG_LEVEL)
+    logging.getLogger("app").setLevel(settings.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, _DispatchHandler(routes, [default]))
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush what is queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_payload(log: logging.Logger, message: str, payload: Union[Any, Callable[[], Any]]):
+    """Log a (potentially large) payload at DEBUG only; callables are only evaluated when it is enabled."""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("%s: %s", message, payload() if callable(payload) else payload)
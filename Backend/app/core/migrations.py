@@ -0,0 +1,68 @@
+"""
+In-place upgrades of tables that already exist.
+
+`Base.metadata.create_all` only creates missing tables; it never adds a column
+to an existing one. The statements below bring a database created by an older
+version up to the current models. They run at startup right after create_all,
+in the order the columns were introduced, and each one is a no-op once
+applied, so every worker can run them on every start. A transaction-scoped
+advisory lock makes workers starting together take turns.
+
+Postgres only: other databases (SQLite in the benchmarks) are always created
+fresh by create_all. Data backfills that need the embedding model are not run
+here; see RUN.md.
+"""
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger("uvicorn.error")
+
+# Arbitrary key for pg_advisory_xact_lock (the reconciler uses 4_620_461)
+ADVISORY_LOCK_KEY = 4_620_462
+
+UPGRADES = (
+    # Ingest state on pdf_data (pdf_ingest.save_progress)
+    "ALTER TABLE pdf_data ADD COLUMN IF NOT EXISTS ingest_status VARCHAR(20)",
+    "ALTER TABLE pdf_data ADD COLUMN IF NOT EXISTS pages_total INTEGER",
+    "ALTER TABLE pdf_data ADD COLUMN IF NOT EXISTS pages_indexed INTEGER",
+    "ALTER TABLE pdf_data ADD COLUMN IF NOT EXISTS chunks_indexed INTEGER",
+    "ALTER TABLE pdf_data ADD COLUMN IF NOT EXISTS ingest_updated_at TIMESTAMP",
+    # Document vector as vector_codec bytes instead of a JSON list. The JSON column
+    # is kept (and made optional) for app.services.note_backfill to convert
+    """
+    DO $$ BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = current_schema() AND table_name = 'pdf_data'
+                     AND column_name = 'pdf_embedding' AND data_type = 'json') THEN
+            ALTER TABLE pdf_data RENAME COLUMN pdf_embedding TO pdf_embedding_json;
+            ALTER TABLE pdf_data ALTER COLUMN pdf_embedding_json DROP NOT NULL;
+        END IF;
+    END $$
+    """,
+    "ALTER TABLE pdf_data ADD COLUMN IF NOT EXISTS pdf_embedding BYTEA",
+    "ALTER TABLE pdf_data ALTER COLUMN pdf_embedding DROP NOT NULL",
+    # Idempotency key of Vapi webhook deliveries
+    "ALTER TABLE interview_transcript_events ADD COLUMN IF NOT EXISTS event_key VARCHAR(40) UNIQUE",
+    # Content hash keying the page render cache
+    "ALTER TABLE pdf_data ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_pdf_data_content_hash ON pdf_data (content_hash)",
+    # Heartbeat of pending evaluation claims (interview_evaluation.STALE_CLAIM)
+    "ALTER TABLE interview_evaluations ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP",
+)
+
+
+async def upgrade_schema(conn):
+    """Apply UPGRADES on `conn` (inside the caller's transaction)."""
+    if conn.dialect.name != "postgresql":
+        return
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    for statement in UPGRADES:
+        await conn.execute(text(statement))
+    legacy = await conn.scalar(text(
+        "SELECT count(*) FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'pdf_data' AND column_name = 'pdf_embedding_json'"
+    ))
+    if legacy:
+        logger.warning("⚠️ pdf_data.pdf_embedding_json still exists: run `python -m app.services.note_backfill` "
+                       "to convert the old note vectors (see RUN.md)")
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available and return 0, else return seconds until they will be."""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (tokens - self.tokens) / self.rate
+
+
+class AsyncRateLimiter:
+    """Shared limit for background jobs: `await limiter.acquire()` waits for a slot."""
+
+    def __init__(self, per_minute: float, burst: float = 1.0):
+        self.bucket = TokenBucket(per_minute / 60.0, max(1.0, burst))
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # The lock makes waiters take turns instead of all waking for the same token
+        async with self._lock:
+            while True:
+                wait = self.bucket.try_acquire()
+                if wait == 0:
+                    return
+                await asyncio.sleep(wait)
@@ -0,0 +1,268 @@
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# -------------------------
+# Metrics (Prometheus text format)
+# -------------------------
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{k}="{v}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Callbacks run right before rendering, e.g. to refresh gauges."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "prepai_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+HTTP_DURATION = registry.register(Histogram(
+    "prepai_http_request_duration_seconds", "Full request duration including streamed bodies.", ("method", "route")))
+STAGE_DURATION = registry.register(Histogram(
+    "prepai_stage_duration_seconds", "Duration of hot-path stages (auth, db, retrieval, embedding, llm...).", ("stage",)))
+STAGE_ERRORS = registry.register(Counter(
+    "prepai_stage_errors_total", "Stages that raised.", ("stage",)))
+
+
+# -------------------------
+# Request traces and spans
+# -------------------------
+
+@dataclass
+class RequestTrace:
+    request_id: str
+    method: str
+    path: str
+    spans: List[Tuple[str, float]] = field(default_factory=list)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("prepai_trace", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def record_stage(stage: str, duration: float):
+    """Record a stage measured by hand (e.g. time-to-first-token)."""
+    STAGE_DURATION.observe(duration, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append((stage, duration))
+
+
+class span:
+    """Time a block as a named stage; works with both `with` and `async with`."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_stage(self.stage, time.perf_counter() - self.start)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.stage)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+# -------------------------
+# Sampled structured logs
+# -------------------------
+
+def log_sampled(log: logging.Logger, event: str, sample_rate: Optional[float] = None, **fields):
+    """Emit one JSON log line for a fraction of calls, tagged with the request id."""
+    rate = settings.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate) or not log.isEnabledFor(logging.INFO):
+        return
+    payload = {"event": event, "request_id": current_request_id(), **fields}
+    log.info("%s", _JsonLine(payload))
+
+
+class _JsonLine:
+    """Serialized only when the record is formatted (on the log listener thread)."""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return json.dumps(self.payload, default=str)
+
+
+# -------------------------
+# ASGI middleware
+# -------------------------
+
+class TelemetryMiddleware:
+    """Opens a trace per HTTP request and records its duration once the body is fully sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = uuid.uuid4().hex[:16]
+        trace = RequestTrace(request_id, scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", []).append((b"x-request-id", request_id.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status["code"])
+            HTTP_DURATION.observe(duration, method=scope["method"], route=route)
+            log_sampled(
+                logger, "request",
+                method=scope["method"], route=route, status=status["code"],
+                duration_ms=round(duration * 1000, 1),
+                spans=[(name, round(d * 1000, 1)) for name, d in trace.spans],
+            )
+            _current_trace.reset(token)
@@ -1,12 +1,47 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from datetime import datetime
+from sqlalchemy import event
 from app.config import settings
+from app.core.telemetry import record_stage
+import time
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(settings.DATABASE_URL, echo=settings.DB_ECHO)
+
+
+# Every SQL statement is timed as the "db" stage
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    record_stage("db", time.perf_counter() - conn.info["query_start"].pop())
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _drop_query_timer(context):
+    # A failed statement never reaches after_cursor_execute: drop its start time
+    # so the pooled connection's stack stays matched to the statements it runs
+    conn = context.connection
+    if conn is not None and context.cursor is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
 
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+
+def insert_ignore(model, index_elements):
+    """INSERT that silently skips rows conflicting on index_elements (Postgres / SQLite)."""
+    from sqlalchemy import insert
+    from sqlalchemy.dialects import postgresql, sqlite
+
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(engine.dialect.name)
+    if dialect is None:
+        return insert(model)
+    return dialect.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -1,30 +1,42 @@
 import os
 from openai import OpenAI
 from pydantic import BaseModel, Field
-from typing import List, Optional, Any
+from typing import Awaitable, Callable, List, Optional, Any
 from app.schema.models import QuizOutput, QuizQuestion
 from app.config import settings
 from openai import AsyncOpenAI
 from typing import List
+from app.services.prompt_assembly import assemble_chat_messages, prompt_cache_stats
+from app.core.telemetry import span, record_stage
+from app.services.llm_scheduler import Priority, llm_scheduler
+import logging
+import time
+
+logger = logging.getLogger("uvicorn.error")
 
 client = AsyncOpenAI(
-    base_url="https://api.groq.com/openai/v1",
+    base_url=settings.LLM_BASE_URL,
     api_key=settings.GROQ_API_KEY
 )
 
-async def call_llm(prompt:str):
+async def call_llm(prompt:str, system_prompt: Optional[str] = None,
+                   is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+    # The static instructions go first as their own message so they form a cacheable prefix
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    messages.append({"role": "user", "content": prompt})
     try:
-        response = await client.chat.completions.create(
-            # CRUCIAL: Use the LiteLLM format: 'gemini/gemini-2.5-pro'
-            model="openai/gpt-oss-120b", 
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            # Use the OpenAI parameter to request JSON output
-            response_format={"type": "json_object"}, 
-            temperature=0.4,
-        )
+        # Quiz generation queues behind interactive chat for an upstream slot
+        async with llm_scheduler.slot(Priority.STANDARD, is_disconnected), span("llm_total"):
+            response = await client.chat.completions.create(
+                # CRUCIAL: Use the LiteLLM format: 'gemini/gemini-2.5-pro'
+                model=settings.LLM_MODEL, 
+                messages=messages,
+                # Use the OpenAI parameter to request JSON output
+                response_format={"type": "json_object"}, 
+                temperature=0.4,
+            )
 
+        _record_cache_usage(response.usage)
         json_string = response.choices[0].message.content
 
         import json
@@ -33,74 +45,66 @@ async def call_llm(prompt:str):
         return QuizOutput.model_validate(wrapped_data)
 
     except Exception as e:
-        print(f"Error calling LiteLLM/Gemini: {e}")
+        logger.error("Error calling LiteLLM/Gemini: %s", e)
         raise e
 
 
-async def stream_chat(messages: List[dict], context: str, retrieved_docs: str | None):
-    system_instruction = {
-        "role": "system", 
-        "content": "You are a helpful AI assistant. Answer the user's question based on the provided context and retrieved documents."
-    }
-    
-    conversation_history = [msg.copy() for msg in messages]
-
-    if conversation_history and conversation_history[-1]['role'] == 'user':
-        last_user_msg = conversation_history[-1]
-        original_question = last_user_msg['content']
-        
-        # Start constructing the augmented prompt
-        augmented_content = ""
-
-        # 1. Add Manual Context
-        if context:
-            augmented_content += (
-                f"Here is the context/notes you must use:\n"
-                f"---------------------\n"
-                f"{context}\n"
-                f"---------------------\n\n"
-            )
+async def call_llm_json(prompt: str, system_prompt: str, temperature: float = 0.2) -> dict:
+    """JSON-mode completion returning the parsed object (background jobs, e.g. interview evaluation)."""
+    import json
+    async with llm_scheduler.slot(Priority.BACKGROUND), span("llm_total"):
+        response = await client.chat.completions.create(
+            model=settings.LLM_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            response_format={"type": "json_object"},
+            temperature=temperature,
+        )
+    _record_cache_usage(response.usage)
+    return json.loads(response.choices[0].message.content)
 
-        # 2. Add Retrieved Documents (New Logic)
-        if retrieved_docs:
-            augmented_content += (
-                f"Here is background information/retrieved documents:\n"
-                f"---------------------\n"
-                f"{retrieved_docs}\n"
-                f"---------------------\n\n"
-            )
 
-        # 3. Add the User Question
-        augmented_content += f"User Question: {original_question}"
+async def stream_chat(messages: List[dict], context: str, retrieved_docs: str | None):
+    # Stable prefix first (system, pinned notes, earlier turns), variable parts last
+    full_history, report = assemble_chat_messages(messages, context, retrieved_docs)
+    logger.info("📦 [Chat] Prompt tokens: %s", report.parts)
 
-        # Update the message content
-        last_user_msg['content'] = augmented_content
+    start = time.perf_counter()
+    first_token = True
+    try:
+        # The slot is held until the stream ends or the client disconnects
+        async with llm_scheduler.slot(Priority.INTERACTIVE):
+            stream = await client.chat.completions.create(
+                model=settings.LLM_MODEL,
+                messages=full_history,
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
 
-    else:
-        # Fallback: If for some reason there is no user message, add one.
-        # We combine context and docs here too just in case.
-        combined_context = f"{context}\n\n{retrieved_docs or ''}"
-        conversation_history.append({
-            "role": "user", 
-            "content": f"Context:\n{combined_context}\n\nPlease analyze this."
-        })
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    _record_cache_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        # Includes any wait for a slot: that is what the user sees
+                        record_stage("llm_ttft", time.perf_counter() - start)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
 
-    # 4. Combine System + Modified User History
-    full_history = [system_instruction] + conversation_history
+    except Exception as e:
+        logger.error("Error in chat stream: %s", e)
+        yield f"Error: {str(e)}"
 
-    try:
-        # Ensure 'client' is initialized before this function in your code
-        stream = await client.chat.completions.create(
-            model="openai/gpt-oss-120b",
-            messages=full_history,
-            temperature=0.7,
-            stream=True 
-        )
+    finally:
+        record_stage("llm_total", time.perf_counter() - start)
 
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
 
-    except Exception as e:
-        print(f"Error in chat stream: {e}")
-        yield f"Error: {str(e)}"
\ No newline at end of file
+def _record_cache_usage(usage):
+    prompt_tokens, cached_tokens = prompt_cache_stats.record(usage)
+    logger.info(
+        "🗄️ [LLM] Prompt cache: %s/%s tokens cached (running ratio %.2f%%)",
+        cached_tokens, prompt_tokens, prompt_cache_stats.cached_ratio * 100
+    )
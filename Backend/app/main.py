@@ -1,43 +1,80 @@
 from fastapi import FastAPI
+from fastapi import Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from datetime import datetime
 from app.config import settings
 from app.database import engine, Base
+from app.core.migrations import upgrade_schema
 from app.api.v1.api import api_router
-import chromadb
-from chromadb.api.models.Collection import Collection
+from app.core.telemetry import TelemetryMiddleware, Gauge, registry
+from app.services.prompt_assembly import prompt_cache_stats
+from app.core.logs import setup_logging, shutdown_logging
+from app.services.embeddings import is_model_loaded, start_background_warmup
+from app.core.lifecycle import drain_streams, install_drain_on_sigterm, is_draining
+from app.services.transcript_store import transcript_writer
+from app.services.vapi_webhook import vapi_ingestor
+from app.services.interview_evaluation import evaluation_worker
+from app.services.vector_store import VectorStoreUnavailable, vector_store
+from app.services.reconciler import reconciler
+from app.services.pdf_parse import shutdown_parse_pool
+import asyncio
+import logging
+import math
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger("uvicorn.error")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    print("🏗️ Server starting:", datetime.now())
-    print("🔧 Creating tables if they don't exist...")
+    setup_logging()
+    logger.info("🏗️ Server starting: %s", datetime.now())
+    logger.info("🔧 Creating tables if they don't exist...")
     
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all never alters existing tables: add the columns newer models expect
+        await upgrade_schema(conn)
     
-    client = await chromadb.AsyncHttpClient(
-        host=settings.chroma_host,
-        port=settings.chroma_port
-    )
-    app.state.chroma_client = client
+    # Always installed; if Chroma is down now, calls reconnect once it is back
+    app.state.vector_store = vector_store
+    app.state.chroma_collection = vector_store.collection
+    await vector_store.connect()
 
-    try:
-        collection: Collection = await client.get_or_create_collection(settings.chroma_collection)
-        app.state.chroma_collection = collection
+    logger.info("✅ Tables ready!")
 
-        count = await collection.count()
-        print(f"Successfully loaded collection '{settings.chroma_collection}' with {count} documents.")
-    except Exception as e:
-        print(f"Failed to load ChromaDB collection: {e}")
+    transcript_writer.start()
+    vapi_ingestor.start()
+    if not settings.VAPI_WEBHOOK_SECRET:
+        logger.error("❌ VAPI_WEBHOOK_SECRET is not set: the Vapi webhook rejects every event (503) "
+                     "and no interview transcripts are recorded (see RUN.md)")
+    if settings.EVALUATION_ENABLED:
+        evaluation_worker.start()
+    if settings.RECONCILE_ENABLED:
+        reconciler.start(vector_store.collection)
+
+    # Serve requests right away; the embedding model loads on a side thread
+    if settings.EMBEDDING_WARMUP:
+        start_background_warmup()
+
+    # Drain before the server stops accepting connections; the drain below only
+    # covers shutdowns that did not start with SIGTERM (e.g. Ctrl-C)
+    install_drain_on_sigterm(settings.SHUTDOWN_READY_DELAY, settings.SHUTDOWN_GRACE_SECONDS)
 
-    print("✅ Tables ready!")
     yield
-    print("🧹 Server shutting down:", datetime.now())
+    logger.info("🧹 Server shutting down: %s", datetime.now())
+    await drain_streams(settings.SHUTDOWN_GRACE_SECONDS)
+    await vapi_ingestor.stop()
+    await transcript_writer.stop()
+    await evaluation_worker.stop()
+    await reconciler.stop()
+    shutdown_parse_pool()
+    shutdown_logging()
 
 
 # Create FastAPI application
@@ -57,16 +94,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(TelemetryMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
 
+@app.exception_handler(VectorStoreUnavailable)
+async def vector_store_unavailable(request, exc: VectorStoreUnavailable):
+    # Fail fast instead of letting requests hang on a Chroma outage
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Vector store is unavailable, try again shortly."},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
 # Health check endpoint
 @app.get("/", tags=["Health"])
+@app.get("/health/live", tags=["Health"])
 async def root():
-    """Health check endpoint"""
+    """Liveness: the process is up and serving (no dependency checks)"""
     return {
         "status": "healthy",
         "message": f"{settings.APP_NAME} is running",
         "version": settings.APP_VERSION
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness(response: Response):
+    """Readiness: database reachable and embedding model in memory.
+
+    A probe that finds the model missing starts loading it, so a worker without
+    warm-up (EMBEDDING_WARMUP=false) becomes ready without waiting for a request
+    the orchestrator would never route to it.
+
+    The vector store is reported but does not gate readiness: while it is down
+    chat still answers (without notes), so the worker stays in rotation as "degraded".
+    """
+    checks = {
+        "database": False,
+        "embedding_model": is_model_loaded(),
+    }
+    if not checks["embedding_model"]:
+        start_background_warmup()
+    try:
+        async with engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=2)
+        checks["database"] = True
+    except Exception as e:
+        logger.warning("Readiness DB check failed: %s", e)
+
+    ready = all(checks.values()) and not is_draining()
+    store = vector_store.health()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        state = "starting"
+    else:
+        state = "ready" if store["state"] == "closed" else "degraded"
+    return {"status": state, "checks": checks, "vector_store": store}
+
+
+PROMPT_CACHE_TOKENS = registry.register(Gauge(
+    "prepai_llm_prompt_tokens", "Prompt tokens sent upstream, total and served from the provider cache.", ("kind",)))
+PROMPT_CACHE_RATIO = registry.register(Gauge(
+    "prepai_llm_prompt_cache_ratio", "Share of prompt tokens served from the provider cache."))
+
+
+def _collect_prompt_cache():
+    PROMPT_CACHE_TOKENS.set(prompt_cache_stats.prompt_tokens, kind="total")
+    PROMPT_CACHE_TOKENS.set(prompt_cache_stats.cached_tokens, kind="cached")
+    PROMPT_CACHE_RATIO.set(prompt_cache_stats.cached_ratio)
+
+
+registry.add_collector(_collect_prompt_cache)
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -1,8 +1,8 @@
-from sqlalchemy import String, LargeBinary, JSON, ForeignKey, Text, DateTime
+from sqlalchemy import String, LargeBinary, JSON, ForeignKey, Text, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from app.database import Base
-from typing import List
+from typing import List, Optional
 
 class User(Base):
     __tablename__ = "users"
@@ -24,9 +24,19 @@ class PDFData(Base):
     # 👆
     
     pdf_blob: Mapped[bytes] = mapped_column(LargeBinary)
-    pdf_embedding: Mapped[list[float]] = mapped_column(JSON)
+    # sha256 of pdf_blob; keys the page render cache and the content ETag (NULL for older rows until first viewed)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    # Document vector in app.services.vector_codec's binary layout
+    pdf_embedding: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
 
+    # Ingest state (app.services.pdf_ingest.save_progress); NULL for notes indexed before it was stored
+    ingest_status: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)  # processing | ready | failed
+    pages_total: Mapped[Optional[int]] = mapped_column(nullable=True)
+    pages_indexed: Mapped[Optional[int]] = mapped_column(nullable=True)
+    chunks_indexed: Mapped[Optional[int]] = mapped_column(nullable=True)
+    ingest_updated_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
     user: Mapped["User"] = relationship(back_populates="pdf_data")
     chat_sessions: Mapped[List["ChatSession"]] = relationship(back_populates="pdf_data", cascade="all, delete-orphan")
 
@@ -53,4 +63,63 @@ class ChatMessage(Base):
     
     role: Mapped[str] = mapped_column(String(20)) 
     content: Mapped[str] = mapped_column(Text)
-    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
\ No newline at end of file
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+
+class InterviewSession(Base):
+    """Server-side record of an interview configured by a logged-in user.
+
+    Its token is the only owner hint sent to the client (in the assistant
+    metadata); webhook events are attributed to user_id looked up here, never
+    to ids taken from the payload.
+    """
+    __tablename__ = "interview_sessions"
+
+    token: Mapped[str] = mapped_column(String(64), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), index=True)
+    # Bound to the first call that presents the token
+    call_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+
+class InterviewTranscriptEvent(Base):
+    """One final transcript line (or the end-of-call summary) of a Vapi call."""
+    __tablename__ = "interview_transcript_events"
+    __table_args__ = (
+        Index("ix_transcript_events_call_id_id", "call_id", "id"),
+        Index("ix_transcript_events_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    call_id: Mapped[str] = mapped_column(String(100))
+    # Only known when the interview was configured by a logged-in user
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=True)
+
+    # Idempotency key of the webhook delivery; NULL when it cannot be derived
+    event_key: Mapped[Optional[str]] = mapped_column(String(40), unique=True, nullable=True)
+    kind: Mapped[str] = mapped_column(String(20))  # transcript | summary
+    role: Mapped[str] = mapped_column(String(20))
+    content: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+
+class InterviewEvaluation(Base):
+    """Rubric-based scoring of a finished interview call (app.services.interview_evaluation)."""
+    __tablename__ = "interview_evaluations"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    call_id: Mapped[str] = mapped_column(String(100), unique=True)
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=True, index=True)
+    job_role: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending | done | failed
+    overall_score: Mapped[Optional[float]] = mapped_column(nullable=True)
+    # InterviewEvaluationResult as JSON (criteria, strengths, improvements, recommendation)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+    # Heartbeat of the process holding a pending claim; the sweep retakes claims it stopped refreshing
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(default=datetime.utcnow, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
@@ -47,6 +47,7 @@ class QuizOutput(BaseModel):
 class IngestRequest(BaseModel):
     parsed_doc: str = Field(..., description="The main document content to embed")
     user_prompt: Optional[str] = None
+    # Ignored: stored notes are keyed by their owner and content hash
     id: Optional[str] = None
 
 
@@ -88,6 +89,57 @@ class NoteInfo(BaseModel):
     created_at: datetime
 
 
+class NoteSearchResult(NoteInfo):
+    score: float
+
+
+#--------Interview models--------#
+
+class TranscriptEventResponse(BaseModel):
+    kind: str
+    role: str
+    content: str
+    created_at: datetime
+
+
+class TranscriptResponse(BaseModel):
+    call_id: str
+    events: List[TranscriptEventResponse]
+
+
+class TranscriptInfo(BaseModel):
+    call_id: str
+    events: int
+    started_at: datetime
+    last_event_at: datetime
+
+
+class CriterionScore(BaseModel):
+    name: str
+    score: float = Field(..., ge=0, le=10)
+    evidence: str = ""
+
+
+class InterviewEvaluationResult(BaseModel):
+    """Shape the evaluation LLM must return (see prompts.EVALUATION_SYSTEM_PROMPT)."""
+    overall_score: float = Field(..., ge=0, le=10)
+    criteria: List[CriterionScore]
+    strengths: List[str] = []
+    improvements: List[str] = []
+    recommendation: Literal["strong_hire", "hire", "lean_hire", "lean_no_hire", "no_hire"]
+
+
+class InterviewEvaluationResponse(BaseModel):
+    call_id: str
+    job_role: Optional[str] = None
+    status: str
+    overall_score: Optional[float] = None
+    result: Optional[InterviewEvaluationResult] = None
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+
 class VapiConfigRequest(BaseModel):
     name: str
     job_role: str
@@ -0,0 +1,192 @@
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from app.config import settings
+from app.services.tokenizer import count_tokens, token_spans
+
+Span = Tuple[int, int]
+
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_NUMBERED_HEADING_RE = re.compile(r"^((\d+\.)*\d+\.?|[IVXLC]+\.|chapter\b|section\b|part\b)\s*", re.IGNORECASE)
+
+
+@dataclass
+class Chunk:
+    text: str
+    page: int
+    char_start: int  # offsets into the page text
+    char_end: int
+    token_count: int
+    section: str = ""
+
+    def metadata(self) -> dict:
+        # Chroma metadata only takes scalars, so no None values here
+        return {
+            "page": self.page,
+            "char_start": self.char_start,
+            "char_end": self.char_end,
+            "token_count": self.token_count,
+            "section": self.section,
+        }
+
+
+def is_heading(line: str) -> bool:
+    """Short, unpunctuated, title-cased / upper-cased or numbered line."""
+    line = line.strip()
+    if not 3 <= len(line) <= 80 or line[-1] in ".,;!?":
+        return False
+    if len(line.split()) > 10 or not any(c.isalpha() for c in line):
+        return False
+    return line.isupper() or line.istitle() or bool(_NUMBERED_HEADING_RE.match(line))
+
+
+def _trim(text: str, start: int, end: int) -> Optional[Span]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if start < end else None
+
+
+def _sentence_spans(text: str, start: int = 0, end: Optional[int] = None) -> List[Span]:
+    end = len(text) if end is None else end
+    spans, pos = [], start
+    for match in _SENTENCE_BREAK_RE.finditer(text, start, end):
+        span = _trim(text, pos, match.start())
+        if span:
+            spans.append(span)
+        pos = match.end()
+    span = _trim(text, pos, end)
+    if span:
+        spans.append(span)
+    return spans
+
+
+class Chunker(ABC):
+    """Base class: turns the text of one page into Chunks.
+
+    A chunker instance is created per document so strategies can carry state
+    (e.g. the current section heading) from one page to the next.
+    """
+
+    name = "base"
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    @abstractmethod
+    def split_page(self, page_no: int, text: str) -> List[Chunk]:
+        ...
+
+    def _chunk(self, text: str, page_no: int, start: int, end: int, tokens: int, section: str) -> Chunk:
+        return Chunk(text[start:end], page_no, start, end, tokens, section)
+
+    def _split_long(self, text: str, span: Span, page_no: int, section: str) -> List[Chunk]:
+        """Window a single span that is longer than chunk_size on token boundaries."""
+        s, e = span
+        tokens = [(a + s, b + s) for a, b in token_spans(text[s:e])]
+        step = self.chunk_size - self.chunk_overlap
+        chunks = []
+        for i in range(0, len(tokens), step):
+            window = tokens[i:i + self.chunk_size]
+            chunks.append(self._chunk(text, page_no, window[0][0], window[-1][1], len(window), section))
+            if i + self.chunk_size >= len(tokens):
+                break
+        return chunks
+
+    def _pack(self, text: str, spans: List[Span], page_no: int, section: str = "") -> List[Chunk]:
+        """Greedily pack sentence spans into chunks of at most chunk_size tokens,
+        carrying trailing sentences worth up to chunk_overlap tokens forward."""
+        chunks: List[Chunk] = []
+        current: List[Tuple[int, int, int]] = []
+        current_tokens = 0
+
+        def flush():
+            if current:
+                chunks.append(self._chunk(text, page_no, current[0][0], current[-1][1], current_tokens, section))
+
+        for s, e in spans:
+            n = count_tokens(text[s:e])
+            if n == 0:
+                continue
+            if n > self.chunk_size:
+                flush()
+                current, current_tokens = [], 0
+                chunks.extend(self._split_long(text, (s, e), page_no, section))
+                continue
+            if current and current_tokens + n > self.chunk_size:
+                flush()
+                keep, kept_tokens = [], 0
+                for item in reversed(current):
+                    if kept_tokens + item[2] > self.chunk_overlap:
+                        break
+                    keep.insert(0, item)
+                    kept_tokens += item[2]
+                if kept_tokens + n > self.chunk_size:
+                    keep, kept_tokens = [], 0
+                current, current_tokens = keep, kept_tokens
+            current.append((s, e, n))
+            current_tokens += n
+
+        flush()
+        return chunks
+
+
+class TokenChunker(Chunker):
+    """Sentence-aware chunks bounded by token count (the default)."""
+
+    name = "token"
+
+    def split_page(self, page_no: int, text: str) -> List[Chunk]:
+        return self._pack(text, _sentence_spans(text), page_no)
+
+
+class SectionChunker(Chunker):
+    """Starts a new chunk at every heading and tags chunks with their section."""
+
+    name = "section"
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        super().__init__(chunk_size, chunk_overlap)
+        self.section = ""
+
+    _is_heading = staticmethod(is_heading)
+
+    def split_page(self, page_no: int, text: str) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        segment_start = 0
+        pos = 0
+        for line in text.splitlines(keepends=True):
+            if self._is_heading(line):
+                if pos > segment_start:
+                    chunks.extend(self._pack(text, _sentence_spans(text, segment_start, pos), page_no, self.section))
+                self.section = line.strip()
+                segment_start = pos
+            pos += len(line)
+        chunks.extend(self._pack(text, _sentence_spans(text, segment_start, len(text)), page_no, self.section))
+        return chunks
+
+
+class PageChunker(Chunker):
+    """One chunk per page; pages longer than chunk_size are windowed."""
+
+    name = "page"
+
+    def split_page(self, page_no: int, text: str) -> List[Chunk]:
+        span = _trim(text, 0, len(text))
+        return self._pack(text, [span], page_no) if span else []
+
+
+CHUNKERS = {cls.name: cls for cls in (TokenChunker, SectionChunker, PageChunker)}
+
+
+def get_chunker(strategy: Optional[str] = None) -> Chunker:
+    strategy = strategy or settings.CHUNK_STRATEGY
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunk strategy '{strategy}'. Choose one of: {', '.join(CHUNKERS)}")
+    return CHUNKERS[strategy](settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
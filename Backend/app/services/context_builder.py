@@ -0,0 +1,150 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.services.tokenizer import count_tokens, truncate_to_tokens
+
+# Prompt token budgets per upstream model. Anything not listed falls back to
+# settings.PROMPT_TOKEN_BUDGET. These sit well below the context windows so
+# there is room left for the completion.
+MODEL_PROMPT_BUDGETS: Dict[str, int] = {
+    "openai/gpt-oss-120b": 16000,
+    "openai/gpt-oss-20b": 16000,
+    "llama-3.1-8b-instant": 6000,
+}
+
+# Share of the prompt budget each variable part may take
+RETRIEVED_SHARE = 0.4
+CONTEXT_SHARE = 0.3
+PARSED_DOC_SHARE = 0.4
+
+# Chunks that would only fit with fewer tokens than this are dropped, not cut
+MIN_TRUNCATED_TOKENS = 64
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def prompt_budget(model: Optional[str] = None) -> int:
+    return MODEL_PROMPT_BUDGETS.get(model or settings.LLM_MODEL, settings.PROMPT_TOKEN_BUDGET)
+
+
+@dataclass
+class RetrievedChunk:
+    id: str
+    text: str
+    metadata: dict = field(default_factory=dict)
+    distance: Optional[float] = None
+    tokens: int = 0
+
+    def __post_init__(self):
+        if not self.tokens:
+            self.tokens = count_tokens(self.text)
+
+
+@dataclass
+class ContextReport:
+    budget: int
+    parts: Dict[str, int] = field(default_factory=dict)
+    chunks_used: int = 0
+    chunks_deduped: int = 0
+    chunks_dropped: int = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.parts.values())
+
+    def as_dict(self) -> dict:
+        return {
+            "budget": self.budget,
+            "total": self.total,
+            "parts": self.parts,
+            "chunks_used": self.chunks_used,
+            "chunks_deduped": self.chunks_deduped,
+            "chunks_dropped": self.chunks_dropped,
+        }
+
+
+def _fingerprint(text: str) -> str:
+    normalized = _WHITESPACE_RE.sub(" ", text).strip().lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def _trim_overlap(chunk: RetrievedChunk, kept: List[RetrievedChunk]) -> Optional[RetrievedChunk]:
+    """Use the char offsets stored by the chunker to cut text another kept chunk
+    of the same page already covers. Returns None if nothing new remains."""
+    meta = chunk.metadata or {}
+    if "char_start" not in meta or "page" not in meta:
+        return chunk
+    start, end = meta["char_start"], meta["char_end"]
+    for other in kept:
+        o = other.metadata or {}
+        if o.get("pdf_id") != meta.get("pdf_id") or o.get("page") != meta["page"] or "char_start" not in o:
+            continue
+        if o["char_start"] <= start and end <= o["char_end"]:
+            return None
+        if o["char_start"] <= start < o["char_end"]:
+            start = o["char_end"]
+        elif o["char_start"] < end <= o["char_end"]:
+            end = o["char_start"]
+    if (start, end) == (meta["char_start"], meta["char_end"]):
+        return chunk
+    offset = meta["char_start"]
+    text = chunk.text[start - offset:end - offset].strip()
+    if not text:
+        return None
+    return RetrievedChunk(chunk.id, text, {**meta, "char_start": start, "char_end": end}, chunk.distance)
+
+
+def dedupe_chunks(chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+    """Drop repeated ids and identical text, and cut overlap between neighbouring chunks.
+    Input is expected in relevance order; the first occurrence wins."""
+    kept: List[RetrievedChunk] = []
+    seen_ids, seen_text = set(), set()
+    for chunk in chunks:
+        fingerprint = _fingerprint(chunk.text)
+        if chunk.id in seen_ids or fingerprint in seen_text:
+            continue
+        seen_ids.add(chunk.id)
+        seen_text.add(fingerprint)
+        trimmed = _trim_overlap(chunk, kept)
+        if trimmed is not None:
+            kept.append(trimmed)
+    return kept
+
+
+def pack_chunks(chunks: List[RetrievedChunk], budget: int) -> List[RetrievedChunk]:
+    """Fill the budget with the most relevant chunks first."""
+    ordered = sorted(chunks, key=lambda c: c.distance if c.distance is not None else float("inf"))
+    packed, used = [], 0
+    for chunk in ordered:
+        remaining = budget - used
+        if chunk.tokens <= remaining:
+            packed.append(chunk)
+            used += chunk.tokens
+        elif remaining >= MIN_TRUNCATED_TOKENS:
+            text = truncate_to_tokens(chunk.text, remaining)
+            packed.append(RetrievedChunk(chunk.id, text, chunk.metadata, chunk.distance))
+            break
+        else:
+            break
+    return packed
+
+
+def build_retrieved_context(
+    chunks: List[RetrievedChunk],
+    budget: Optional[int] = None,
+    report: Optional[ContextReport] = None,
+) -> str:
+    budget = budget if budget is not None else int(prompt_budget() * RETRIEVED_SHARE)
+    unique = dedupe_chunks(chunks)
+    packed = pack_chunks(unique, budget)
+    text = "\n\n".join(c.text for c in packed)
+    if report is not None:
+        report.parts["retrieved"] = count_tokens(text)
+        report.chunks_used = len(packed)
+        report.chunks_deduped = len(chunks) - len(unique)
+        report.chunks_dropped = len(unique) - len(packed)
+    return text
+
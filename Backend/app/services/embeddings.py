@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+from app.config import settings
+from app.core.telemetry import record_stage
+
+logger = logging.getLogger("uvicorn.error")
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+BATCH_CANDIDATES = (8, 16, 32, 64, 128)
+DEFAULT_BATCH_SIZE = 32
+
+# sentence-transformers pulls in torch, so nothing here is imported until the
+# model is first needed (or preloaded / warmed up explicitly).
+_model = None
+_batch_size = DEFAULT_BATCH_SIZE
+_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+
+def load_model(backend: str):
+    """Load EMBEDDING_MODEL on the given backend.
+
+    The ONNX variants are exports of the same checkpoint shipped on the model
+    hub, so their vectors are interchangeable with the torch ones (within
+    quantization error for int8).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+    if backend == "torch":
+        return SentenceTransformer(settings.EMBEDDING_MODEL)
+    kwargs = {}
+    if backend == "onnx-int8":
+        kwargs["model_kwargs"] = {"file_name": settings.EMBEDDING_ONNX_INT8_FILE}
+    return SentenceTransformer(settings.EMBEDDING_MODEL, backend="onnx", **kwargs)
+
+
+def autotune_batch_size(model, sample: str = None, candidates=BATCH_CANDIDATES, repeats: int = 3) -> int:
+    """Time each candidate batch size (warmed up, best of `repeats`) and keep the best chunks/sec.
+
+    Only runs at model load when EMBEDDING_BATCH_SIZE=0; otherwise use
+    benchmarks/embedding_throughput.py once per machine type and set the result.
+    """
+    sample = sample or ("The quick brown fox jumps over the lazy dog. " * 40)[:settings.CHUNK_SIZE]
+    model.encode([sample], batch_size=1)  # first call pays for graph/kernel setup
+    best, best_rate = DEFAULT_BATCH_SIZE, 0.0
+    for size in candidates:
+        batch = [sample] * size
+        model.encode(batch, batch_size=size)  # warm up this shape
+        elapsed = min(_timed(model, batch, size) for _ in range(repeats))
+        rate = size / elapsed
+        # Larger batches only win if clearly faster; they also cost latency and memory
+        if rate > best_rate * 1.05:
+            best, best_rate = size, rate
+    return best
+
+
+def _timed(model, batch, batch_size: int) -> float:
+    start = time.perf_counter()
+    model.encode(batch, batch_size=batch_size)
+    return time.perf_counter() - start
+
+
+def get_embedding_model():
+    global _model, _batch_size
+    if _model is None:
+        with _lock:
+            if _model is None:
+                start = time.perf_counter()
+                backend = settings.EMBEDDING_BACKEND
+                try:
+                    model = load_model(backend)
+                except ImportError as e:
+                    # onnxruntime / optimum not installed: same vectors, just slower
+                    logger.warning("Embedding backend %s unavailable (%s), falling back to torch", backend, e)
+                    backend = "torch"
+                    model = load_model(backend)
+                _batch_size = settings.EMBEDDING_BATCH_SIZE or autotune_batch_size(model)
+                _model = model
+                duration = time.perf_counter() - start
+                record_stage("model_load", duration)
+                logger.info("🧠 Loaded embedding model %s (%s, batch %s) in %.2fs",
+                            settings.EMBEDDING_MODEL, backend, _batch_size, duration)
+    return _model
+
+
+def is_model_loaded() -> bool:
+    return _model is not None
+
+
+def encode(texts):
+    model = get_embedding_model()
+    return model.encode(texts, batch_size=_batch_size)
+
+
+async def aencode(texts):
+    """Encode off the event loop (the first call may also load the model)."""
+    return await asyncio.to_thread(encode, texts)
+
+
+def preload_models():
+    """Load heavy models eagerly, e.g. in a server master process before it forks
+    workers so they share the weights copy-on-write."""
+    get_embedding_model()
+
+
+def start_background_warmup():
+    """Load the model on a daemon thread so startup does not wait for it.
+    Does nothing while a warm-up is already running."""
+    global _warmup_thread
+    if is_model_loaded() or (_warmup_thread is not None and _warmup_thread.is_alive()):
+        return
+
+    def _warmup():
+        try:
+            get_embedding_model()
+        except Exception as e:
+            logger.error("❌ Embedding model warm-up failed: %s", e)
+
+    _warmup_thread = threading.Thread(target=_warmup, name="embedding-warmup", daemon=True)
+    _warmup_thread.start()
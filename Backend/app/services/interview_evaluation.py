@@ -0,0 +1,327 @@
+"""
+Post-interview evaluation worker.
+
+Finished calls (an end-of-call-report from the webhook, or a stored summary
+found by the periodic sweep) are collected into batches. Each call is claimed
+by inserting its `pending` InterviewEvaluation row, so only one worker process
+scores it. The transcript is then scored against the screening rubric by the
+LLM. Batches run concurrently, with at most EVALUATION_CONCURRENCY requests in
+flight and EVALUATION_RPM per minute shared by all of them; each worker process
+enforces its 1/WEB_CONCURRENCY share of both.
+
+While a claim is pending, the process holding it refreshes its `claimed_at`
+on every sweep and again when the LLM call starts, however long the job waits
+in the queue or for the rate limiter; a claim whose heartbeat is older than
+STALE_CLAIM belongs to a worker that died and is taken over.
+
+The LLM call is injectable (`EvaluationWorker(llm=...)`), and it respects
+LLM_BASE_URL, so the worker runs against benchmarks/mock_llm.py as well.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import func, select, update
+
+from app.config import settings
+from app.core.rate_limit import AsyncRateLimiter
+from app.core.telemetry import Counter, Gauge, record_stage, registry
+from app.database import async_session_maker, insert_ignore
+from app.models.tables import InterviewEvaluation, InterviewTranscriptEvent
+from app.schema.models import InterviewEvaluationResult
+from app.services.tokenizer import truncate_to_tokens
+
+logger = logging.getLogger("uvicorn.error")
+
+EVALUATIONS = registry.register(Counter(
+    "prepai_interview_evaluations_total", "Interview evaluations by outcome.", ("outcome",)))
+EVALUATION_QUEUE_DEPTH = registry.register(Gauge(
+    "prepai_interview_evaluation_queue_depth", "Finished calls waiting to be evaluated."))
+
+# A pending claim not refreshed for this long belongs to a worker that died mid-evaluation
+# (its owner refreshes it every EVALUATION_SWEEP_INTERVAL)
+STALE_CLAIM = timedelta(minutes=10)
+
+
+@dataclass
+class EvaluationJob:
+    call_id: str
+    user_id: Optional[int] = None
+    job_role: Optional[str] = None
+    experience: Optional[str] = None
+    level: Optional[str] = None
+    attempt: int = 0  # earlier attempts; the row's `attempts` counts this one once it has started
+    # The InterviewEvaluation row is this process's (inserted by it, or a stale claim it took over)
+    claimed: bool = False
+
+
+LLMCall = Callable[[str, str], Awaitable[dict]]
+
+
+class EvaluationWorker:
+    def __init__(self, llm: Optional[LLMCall] = None):
+        self._llm = llm
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._limiter: Optional[AsyncRateLimiter] = None
+        # Pending claims of this process, kept alive by _heartbeat until they are done or failed
+        self._held: Set[str] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        if self.running:
+            return
+        if self._llm is None:
+            from app.llm import call_llm_json
+            self._llm = call_llm_json
+        self._queue = asyncio.Queue(maxsize=1000)
+        # The limits are for the whole deployment; this process gets its share
+        workers = max(1, settings.WEB_CONCURRENCY)
+        concurrency = max(1, settings.EVALUATION_CONCURRENCY // workers)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiter = AsyncRateLimiter(settings.EVALUATION_RPM / workers, burst=concurrency)
+        self._tasks = [
+            asyncio.create_task(self._run(), name="evaluation-worker"),
+            asyncio.create_task(self._sweep_forever(), name="evaluation-sweep"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Unfinished claims stay pending and are picked up again as stale claims
+        self._tasks = []
+        self._queue = None
+        self._held.clear()
+
+    def enqueue(self, job: EvaluationJob) -> bool:
+        """Never blocks. A job that does not fit is not lost: the sweep finds it later."""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            EVALUATIONS.inc(outcome="deferred")
+            # Stop refreshing a claim that is no longer queued, so the sweep can retake it
+            self._held.discard(job.call_id)
+            return False
+        EVALUATION_QUEUE_DEPTH.set(self._queue.qsize())
+        return True
+
+    def _retry_later(self, job: EvaluationJob):
+        delay = min(300.0, settings.EVALUATION_BATCH_WAIT * 2 ** job.attempt)
+        job.attempt += 1
+        asyncio.get_running_loop().call_later(delay, self.enqueue, job)
+
+    # --- batching ---------------------------------------------------------
+
+    async def _next_batch(self) -> List[EvaluationJob]:
+        # Waiting a little also lets the transcript writer flush the call's last lines
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + settings.EVALUATION_BATCH_WAIT
+        while len(batch) < settings.EVALUATION_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        EVALUATION_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.process_batch(batch)
+            except Exception as e:
+                logger.error("❌ Evaluation batch of %s failed: %s", len(batch), e)
+
+    async def process_batch(self, jobs: List[EvaluationJob]):
+        unique: Dict[str, EvaluationJob] = {}
+        for job in jobs:
+            unique.setdefault(job.call_id, job)
+        jobs = await self._claim(list(unique.values()))
+        if not jobs:
+            return
+        self._held.update(job.call_id for job in jobs)
+        transcripts = await self._load_transcripts([job.call_id for job in jobs])
+        start = time.perf_counter()
+        await asyncio.gather(*(self._evaluate(job, transcripts.get(job.call_id)) for job in jobs))
+        record_stage("evaluation_batch", time.perf_counter() - start)
+
+    # --- persistence ------------------------------------------------------
+
+    async def _claim(self, jobs: List[EvaluationJob]) -> List[EvaluationJob]:
+        """Jobs this process now owns: new rows it inserted, plus its own retries and takeovers."""
+        owned = [job for job in jobs if job.claimed]
+        fresh = [job for job in jobs if not job.claimed]
+        if not fresh:
+            return owned
+        async with async_session_maker() as db:
+            result = await db.execute(
+                insert_ignore(InterviewEvaluation, ["call_id"]).returning(InterviewEvaluation.call_id),
+                [{"call_id": j.call_id, "user_id": j.user_id, "job_role": j.job_role, "status": "pending"}
+                 for j in fresh],
+            )
+            claimed = set(result.scalars().all())
+            await db.commit()
+        for job in fresh:
+            job.claimed = job.call_id in claimed
+        return owned + [job for job in fresh if job.claimed]
+
+    async def _load_transcripts(self, call_ids: List[str]) -> Dict[str, str]:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(InterviewTranscriptEvent.call_id, InterviewTranscriptEvent.role, InterviewTranscriptEvent.content)
+                .where(InterviewTranscriptEvent.call_id.in_(call_ids), InterviewTranscriptEvent.kind == "transcript")
+                .order_by(InterviewTranscriptEvent.call_id, InterviewTranscriptEvent.id)
+            )
+            lines: Dict[str, List[str]] = {}
+            for call_id, role, content in result.all():
+                lines.setdefault(call_id, []).append(f"{role.upper()}: {content}")
+        return {call_id: "\n".join(l) for call_id, l in lines.items()}
+
+    async def _fetch_from_vapi(self, call_id: str) -> Optional[str]:
+        """Fallback when no transcript events were stored (webhooks lost or disabled)."""
+        if not settings.VAPI_PRIVATE_KEY:
+            return None
+        from app.services.vapi_service import vapi_service
+        try:
+            call = await asyncio.to_thread(vapi_service.get_call_recording, call_id)
+        except Exception as e:
+            logger.warning("Could not fetch call %s from Vapi: %s", call_id, e)
+            return None
+        return (call or {}).get("transcript")
+
+    async def _save(self, call_id: str, **values):
+        async with async_session_maker() as db:
+            await db.execute(update(InterviewEvaluation).where(InterviewEvaluation.call_id == call_id).values(**values))
+            await db.commit()
+
+    async def _heartbeat(self):
+        """Refresh `claimed_at` of the pending claims this process holds."""
+        if not self._held:
+            return
+        async with async_session_maker() as db:
+            await db.execute(
+                update(InterviewEvaluation)
+                .where(InterviewEvaluation.call_id.in_(list(self._held)), InterviewEvaluation.status == "pending")
+                .values(claimed_at=datetime.utcnow())
+            )
+            await db.commit()
+
+    # --- scoring ----------------------------------------------------------
+
+    async def _evaluate(self, job: EvaluationJob, transcript: Optional[str]):
+        from app.api.v1.endpoints.prompts import EVALUATION_INPUT_PROMPT, EVALUATION_SYSTEM_PROMPT, format_rubric
+
+        try:
+            transcript = transcript or await self._fetch_from_vapi(job.call_id)
+            if not transcript:
+                raise ValueError("no transcript stored for this call yet")
+
+            prompt = EVALUATION_INPUT_PROMPT.format(
+                job_role=job.job_role or "unspecified (infer it from the transcript)",
+                experience=job.experience or "unknown",
+                level=job.level or "Medium",
+                rubric=format_rubric(),
+                transcript=truncate_to_tokens(transcript, settings.EVALUATION_TRANSCRIPT_TOKENS),
+            )
+            async with self._semaphore:
+                await self._limiter.acquire()
+                # The whole STALE_CLAIM window is left for the call itself
+                await self._save(job.call_id, claimed_at=datetime.utcnow())
+                start = time.perf_counter()
+                raw = await self._llm(prompt, EVALUATION_SYSTEM_PROMPT)
+                record_stage("llm_evaluation", time.perf_counter() - start)
+            result = InterviewEvaluationResult.model_validate(raw)
+
+        except Exception as e:
+            if job.attempt + 1 < settings.EVALUATION_MAX_ATTEMPTS:
+                EVALUATIONS.inc(outcome="retried")
+                logger.warning("⚠️ Evaluation of call %s failed (attempt %s), retrying: %s", job.call_id, job.attempt + 1, e)
+                await self._save(job.call_id, attempts=job.attempt + 1, error=str(e))
+                self._retry_later(job)
+            else:
+                EVALUATIONS.inc(outcome="failed")
+                logger.error("❌ Evaluation of call %s failed: %s", job.call_id, e)
+                await self._save(job.call_id, status="failed", attempts=job.attempt + 1, error=str(e),
+                                 completed_at=datetime.utcnow())
+                self._held.discard(job.call_id)
+            return
+
+        await self._save(
+            job.call_id, status="done", overall_score=result.overall_score, result=result.model_dump(),
+            attempts=job.attempt + 1, error=None, completed_at=datetime.utcnow(),
+        )
+        self._held.discard(job.call_id)
+        EVALUATIONS.inc(outcome="done")
+        logger.info("📝 Evaluated call %s: %.1f/10 (%s)", job.call_id, result.overall_score, result.recommendation)
+
+    # --- recovery ---------------------------------------------------------
+
+    async def sweep(self) -> int:
+        """Queue finished calls that have no evaluation yet, and retake stale claims."""
+        async with async_session_maker() as db:
+            missing = await db.execute(
+                select(InterviewTranscriptEvent.call_id, InterviewTranscriptEvent.user_id)
+                .outerjoin(InterviewEvaluation, InterviewEvaluation.call_id == InterviewTranscriptEvent.call_id)
+                .where(InterviewTranscriptEvent.kind == "summary", InterviewEvaluation.id.is_(None))
+                .limit(settings.EVALUATION_BATCH_SIZE * 10)
+            )
+            jobs = [EvaluationJob(call_id=c, user_id=u) for c, u in missing.all()]
+
+            stale = await db.execute(
+                select(InterviewEvaluation.call_id, InterviewEvaluation.user_id,
+                       InterviewEvaluation.job_role, InterviewEvaluation.attempts)
+                .where(InterviewEvaluation.status == "pending",
+                       # Rows claimed before claimed_at existed fall back to their creation time
+                       func.coalesce(InterviewEvaluation.claimed_at, InterviewEvaluation.created_at)
+                       < datetime.utcnow() - STALE_CLAIM,
+                       InterviewEvaluation.attempts < settings.EVALUATION_MAX_ATTEMPTS)
+                .limit(settings.EVALUATION_BATCH_SIZE * 10)
+            )
+            for call_id, user_id, job_role, attempts in stale.all():
+                # Compare-and-set on attempts so only one process takes over the claim; the
+                # increment counts the attempt about to start, which then saves the same value
+                taken = await db.execute(
+                    update(InterviewEvaluation)
+                    .where(InterviewEvaluation.call_id == call_id, InterviewEvaluation.attempts == attempts,
+                           InterviewEvaluation.status == "pending")
+                    .values(attempts=attempts + 1, claimed_at=datetime.utcnow())
+                )
+                if taken.rowcount == 1:
+                    self._held.add(call_id)
+                    jobs.append(EvaluationJob(call_id=call_id, user_id=user_id, job_role=job_role,
+                                              attempt=attempts, claimed=True))
+            await db.commit()
+
+        for job in jobs:
+            self.enqueue(job)
+        return len(jobs)
+
+    async def _sweep_forever(self):
+        while True:
+            try:
+                await self._heartbeat()
+            except Exception as e:
+                logger.error("❌ Evaluation heartbeat failed: %s", e)
+            try:
+                found = await self.sweep()
+                if found:
+                    logger.info("🔎 Evaluation sweep queued %s call(s)", found)
+            except Exception as e:
+                logger.error("❌ Evaluation sweep failed: %s", e)
+            await asyncio.sleep(settings.EVALUATION_SWEEP_INTERVAL)
+
+
+evaluation_worker = EvaluationWorker()
@@ -0,0 +1,163 @@
+"""
+Priority scheduler in front of the upstream LLM.
+
+Every completion takes a slot first; at most LLM_MAX_CONCURRENCY run at once
+in this worker. Waiters are kept per priority class in deadline order:
+
+- INTERACTIVE  chat streams; may use every slot
+- STANDARD     quiz generation
+- BACKGROUND   interview evaluation and other jobs
+
+LLM_INTERACTIVE_RESERVED slots are only ever given to interactive requests,
+so chat does not wait behind a wall of long quiz generations. A freed slot
+goes to the highest class with an eligible waiter, except that waiters past
+their class deadline are served first (earliest deadline first), which keeps
+quiz and background work from starving under sustained chat load.
+
+Waiters whose client has gone away are dropped from the queue before they
+reach the upstream.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.core.telemetry import Counter, Gauge, Histogram, registry
+
+LLM_QUEUE_DEPTH = registry.register(Gauge(
+    "prepai_llm_queue_depth", "LLM requests waiting for an upstream slot.", ("priority",)))
+LLM_ACTIVE = registry.register(Gauge(
+    "prepai_llm_active", "LLM requests holding an upstream slot.", ("priority",)))
+LLM_QUEUE_WAIT = registry.register(Histogram(
+    "prepai_llm_queue_wait_seconds", "Time LLM requests spent waiting for an upstream slot.", ("priority",)))
+LLM_SCHEDULED = registry.register(Counter(
+    "prepai_llm_scheduled_total", "LLM requests by priority and scheduling outcome.", ("priority", "outcome")))
+
+# How often a queued request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    STANDARD = 1
+    BACKGROUND = 2
+
+
+DEADLINES: Dict[Priority, float] = {
+    Priority.INTERACTIVE: settings.LLM_INTERACTIVE_DEADLINE,
+    Priority.STANDARD: settings.LLM_STANDARD_DEADLINE,
+    Priority.BACKGROUND: settings.LLM_BACKGROUND_DEADLINE,
+}
+
+
+class RequestCancelled(Exception):
+    """The client disconnected while its LLM request was still queued."""
+
+
+@dataclass(order=True)
+class _Waiter:
+    deadline: float
+    seq: int
+    priority: Priority = field(compare=False)
+    enqueued: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class LLMScheduler:
+    def __init__(self, capacity: int, reserved: int):
+        self.capacity = max(1, capacity)
+        # Leave at least one slot to the other classes
+        self.reserved = min(max(0, reserved), self.capacity - 1)
+        self._queues: Dict[Priority, List[_Waiter]] = {p: [] for p in Priority}
+        self._active: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._seq = itertools.count()
+
+    def queued(self, priority: Priority) -> int:
+        return sum(1 for w in self._queues[priority] if not w.future.done())
+
+    def _eligible(self, priority: Priority) -> bool:
+        total = sum(self._active.values())
+        if total >= self.capacity:
+            return False
+        if priority is Priority.INTERACTIVE:
+            return True
+        return total - self._active[Priority.INTERACTIVE] < self.capacity - self.reserved
+
+    def _pick(self) -> Optional[_Waiter]:
+        heads = []
+        for priority, queue in self._queues.items():
+            while queue and queue[0].future.done():
+                heapq.heappop(queue)  # cancelled while waiting
+            if queue and self._eligible(priority):
+                heads.append(queue[0])
+        if not heads:
+            return None
+        now = time.monotonic()
+        overdue = [w for w in heads if w.deadline <= now]
+        chosen = min(overdue) if overdue else min(heads, key=lambda w: w.priority)
+        heapq.heappop(self._queues[chosen.priority])
+        return chosen
+
+    def _dispatch(self):
+        while (waiter := self._pick()) is not None:
+            self._active[waiter.priority] += 1
+            waiter.future.set_result(None)
+            label = waiter.priority.name.lower()
+            LLM_QUEUE_WAIT.observe(time.monotonic() - waiter.enqueued, priority=label)
+            LLM_SCHEDULED.inc(priority=label, outcome="started")
+        self._update_gauges()
+
+    def _update_gauges(self):
+        for priority in Priority:
+            LLM_QUEUE_DEPTH.set(self.queued(priority), priority=priority.name.lower())
+            LLM_ACTIVE.set(self._active[priority], priority=priority.name.lower())
+
+    async def acquire(self, priority: Priority,
+                      is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        """Wait for a slot. Raises RequestCancelled if `is_disconnected()` turns true first."""
+        now = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[priority],
+                       _Waiter(now + DEADLINES[priority], next(self._seq), priority, now, future))
+        self._dispatch()
+        try:
+            while not future.done():
+                if is_disconnected is None:
+                    await future
+                    break
+                await asyncio.wait({future}, timeout=DISCONNECT_POLL_SECONDS)
+                if not future.done() and await is_disconnected():
+                    future.cancel()
+                    LLM_SCHEDULED.inc(priority=priority.name.lower(), outcome="cancelled")
+                    raise RequestCancelled()
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller went away
+                self.release(priority)
+            else:
+                future.cancel()
+                LLM_SCHEDULED.inc(priority=priority.name.lower(), outcome="cancelled")
+            raise
+        finally:
+            self._update_gauges()
+
+    def release(self, priority: Priority):
+        self._active[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority,
+                   is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        await self.acquire(priority, is_disconnected)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+
+llm_scheduler = LLMScheduler(settings.LLM_MAX_CONCURRENCY, settings.LLM_INTERACTIVE_RESERVED)
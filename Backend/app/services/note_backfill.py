@@ -0,0 +1,114 @@
+"""
+Backfills PDFData.pdf_embedding for notes without a document vector.
+
+Notes uploaded before the vector_codec layout stored their vector as a JSON
+list. On startup app.core.migrations keeps that column as pdf_embedding_json
+and adds the new pdf_embedding; then run
+
+    python -m app.services.note_backfill
+    ALTER TABLE pdf_data DROP COLUMN pdf_embedding_json;   -- once it reports no failures
+
+The backfill converts every JSON vector it finds in pdf_embedding_json, then
+re-embeds the notes that still have none (e.g. a database already migrated
+with `USING NULL`) from their stored PDF, the way upload_notes does. Running
+workers pick the new vectors up on their next note lookup.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import inspect, select, text, update
+
+from app.config import settings
+from app.database import async_session_maker, engine
+from app.models.tables import PDFData
+from app.services.chunking import get_chunker
+from app.services.pdf_ingest import chunk_pages, document_embedding, read_first_pages
+from app.services.vector_codec import encode_vector
+
+logger = logging.getLogger("uvicorn.error")
+
+LEGACY_COLUMN = "pdf_embedding_json"
+
+
+@dataclass
+class BackfillReport:
+    converted: int = 0
+    reembedded: int = 0
+    failed: int = 0
+
+
+async def _has_legacy_column() -> bool:
+    async with engine.connect() as conn:
+        columns = await conn.run_sync(lambda sync: inspect(sync).get_columns(PDFData.__tablename__))
+    return any(column["name"] == LEGACY_COLUMN for column in columns)
+
+
+async def convert_json_vectors(report: BackfillReport):
+    async with async_session_maker() as db:
+        rows = (await db.execute(text(
+            f"SELECT id, {LEGACY_COLUMN} FROM pdf_data WHERE pdf_embedding IS NULL AND {LEGACY_COLUMN} IS NOT NULL"
+        ))).all()
+        for pdf_id, raw in rows:
+            try:
+                vector = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+                blob = encode_vector(vector, settings.DOC_EMBEDDING_DTYPE)
+            except (TypeError, ValueError) as e:
+                logger.warning("⚠️ PDF %s: unreadable JSON vector, re-embedding instead: %s", pdf_id, e)
+                continue
+            await db.execute(update(PDFData).where(PDFData.id == pdf_id).values(pdf_embedding=blob))
+            report.converted += 1
+        await db.commit()
+
+
+async def reembed_missing(report: BackfillReport):
+    async with async_session_maker() as db:
+        ids = (await db.execute(select(PDFData.id).where(PDFData.pdf_embedding.is_(None)))).scalars().all()
+    for pdf_id in ids:
+        # One note (and its blob) in memory at a time
+        async with async_session_maker() as db:
+            blob = (await db.execute(select(PDFData.pdf_blob).where(PDFData.id == pdf_id))).scalar_one_or_none()
+            if not blob:
+                continue
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+                tmp_file.write(blob)
+                tmp_path = tmp_file.name
+            try:
+                _, first_pages = await read_first_pages(tmp_path)
+                chunks = await asyncio.to_thread(chunk_pages, first_pages, get_chunker())
+                if not chunks:
+                    continue
+                vector = await document_embedding(chunks)
+                await db.execute(update(PDFData).where(PDFData.id == pdf_id).values(pdf_embedding=vector))
+                await db.commit()
+                report.reembedded += 1
+            except Exception as e:
+                report.failed += 1
+                logger.error("❌ PDF %s: could not re-embed: %s", pdf_id, e)
+            finally:
+                os.remove(tmp_path)
+
+
+async def backfill(reembed: bool = True) -> BackfillReport:
+    report = BackfillReport()
+    if await _has_legacy_column():
+        await convert_json_vectors(report)
+    if reembed:
+        await reembed_missing(report)
+    logger.info("🧮 Note vector backfill: %s", asdict(report))
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fill in missing note document vectors.")
+    parser.add_argument("--convert-only", action="store_true",
+                        help=f"only convert {LEGACY_COLUMN}, do not re-embed notes from their PDF")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(asdict(asyncio.run(backfill(reembed=not args.convert_only))), indent=2))
@@ -0,0 +1,131 @@
+"""
+Note-level vector search over a user's library.
+
+Each PDFData row carries one document vector (see vector_codec). A user's
+vectors are stacked into a single matrix, so ranking thousands of notes is
+one matrix-vector product plus an argpartition.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.tables import PDFData
+from app.services.vector_codec import decode_matrix
+
+logger = logging.getLogger("uvicorn.error")
+
+MAX_CACHED_USERS = 256
+
+
+@dataclass
+class NoteMatrix:
+    ids: np.ndarray
+    filenames: List[str]
+    created_at: List[datetime]
+    vectors: np.ndarray  # (n, dim) float32, rows L2-normalized (zero rows for notes without a vector)
+    version: Tuple[int, Optional[int], int]
+
+
+@dataclass
+class NoteMatch:
+    id: int
+    filename: str
+    created_at: datetime
+    score: float
+
+
+# user_id -> NoteMatrix. Ids only grow, so (row count, max id) changes whenever
+# a note is added or deleted and is a cheap staleness check; the count of stored
+# vectors also catches a backfill (app/services/note_backfill.py).
+_cache: "OrderedDict[int, NoteMatrix]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+async def load_note_matrix(db: AsyncSession, user_id: int) -> NoteMatrix:
+    version_res = await db.execute(
+        select(func.count(PDFData.id), func.max(PDFData.id), func.count(PDFData.pdf_embedding))
+        .where(PDFData.user_id == user_id)
+    )
+    version = tuple(version_res.one())
+
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached is not None and cached.version == version:
+            _cache.move_to_end(user_id)
+            return cached
+
+    # Only the small columns; never pull pdf_blob for a ranking query
+    result = await db.execute(
+        select(PDFData.id, PDFData.filename, PDFData.created_at, PDFData.pdf_embedding)
+        .where(PDFData.user_id == user_id)
+        .order_by(PDFData.id)
+    )
+    rows = result.all()
+    notes = NoteMatrix(
+        ids=np.array([r.id for r in rows], dtype=np.int64),
+        filenames=[r.filename for r in rows],
+        created_at=[r.created_at for r in rows],
+        vectors=_normalize(decode_matrix(r.pdf_embedding for r in rows)),
+        version=version,
+    )
+
+    with _cache_lock:
+        _cache[user_id] = notes
+        _cache.move_to_end(user_id)
+        while len(_cache) > MAX_CACHED_USERS:
+            _cache.popitem(last=False)
+    return notes
+
+
+def rank_notes(notes: NoteMatrix, query: np.ndarray, top_k: int, exclude_id: Optional[int] = None) -> List[NoteMatch]:
+    """query is one vector or an (m, dim) batch; a note scores its best match in the batch."""
+    query = np.atleast_2d(np.asarray(query, dtype=np.float32))
+    if notes.ids.size == 0 or notes.vectors.shape[1] != query.shape[1]:
+        return []
+    scores = (notes.vectors @ _normalize(query).T).max(axis=1)
+    if exclude_id is not None:
+        scores[notes.ids == exclude_id] = -np.inf
+    # Notes without a stored vector are left out
+    scores[~notes.vectors.any(axis=1)] = -np.inf
+
+    k = min(top_k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [
+        NoteMatch(id=int(notes.ids[i]), filename=notes.filenames[i],
+                  created_at=notes.created_at[i], score=float(scores[i]))
+        for i in top
+    ]
+
+
+def note_vector(notes: NoteMatrix, pdf_id: int) -> Optional[np.ndarray]:
+    rows = np.flatnonzero(notes.ids == pdf_id)
+    if rows.size == 0 or not notes.vectors[rows[0]].any():
+        return None
+    return notes.vectors[rows[0]]
+
+
+async def route_to_notes(db: AsyncSession, user_id: int, query: np.ndarray, top_k: int) -> List[int]:
+    """First retrieval stage: ids of the user's notes closest to the query.
+
+    Notes without a document vector (not backfilled yet, see note_backfill)
+    cannot be ranked, so they are always searched rather than never.
+    """
+    notes = await load_note_matrix(db, user_id)
+    unranked = [int(i) for i in notes.ids[~notes.vectors.any(axis=1)]] if notes.ids.size else []
+    return [match.id for match in rank_notes(notes, query, top_k)] + unranked
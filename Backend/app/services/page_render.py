@@ -0,0 +1,276 @@
+"""
+Server-side page rendering for the notes viewer.
+
+Pages and thumbnails are rasterized with PyMuPDF in the PDF worker pool
+(app/services/pdf_parse.py) and kept in a size-bounded on-disk LRU cache
+under PAGE_CACHE_DIR. Keys are (content hash, page, dpi), so a rendered
+image never goes stale and can be served with an immutable Cache-Control.
+The source PDF is written to the same cache once, so workers read it from
+disk instead of receiving the blob with every render; it is pinned while a
+render reads it, so this process never evicts it mid-render.
+
+The cache index is per process. With several workers on one cache
+directory, each evicts by its own view, so the directory can grow to a
+few times PAGE_CACHE_MAX_MB; a file deleted by another worker is just a miss
+(a source PDF deleted during a render is written again and the render retried once).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.core.telemetry import Counter, Gauge, record_stage, registry
+
+logger = logging.getLogger("uvicorn.error")
+
+PAGE_CACHE = registry.register(Counter(
+    "prepai_page_cache_total", "Page render cache lookups by kind and outcome.", ("kind", "outcome")))
+PAGE_CACHE_BYTES = registry.register(Gauge(
+    "prepai_page_cache_bytes", "Bytes held by this worker's page render cache."))
+
+# Rendered resolutions are snapped to these, so clients cannot fill the cache with one page at every dpi
+PAGE_DPIS = (48, 72, 96, 144, 192)
+MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg"}
+
+
+class PageOutOfRange(ValueError):
+    pass
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def snap_dpi(dpi: int) -> int:
+    return min(PAGE_DPIS, key=lambda d: abs(d - dpi))
+
+
+def render_page_image(pdf_path: str, page_index: int, dpi: int, fmt: str) -> bytes:
+    """Runs in a worker process: one page (0-based) as an image."""
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        if not 0 <= page_index < doc.page_count:
+            raise PageOutOfRange(f"page {page_index + 1} of {doc.page_count}")
+        pix = doc.load_page(page_index).get_pixmap(dpi=dpi, alpha=False)
+        if fmt == "jpeg":
+            return pix.tobytes(output="jpeg", jpg_quality=settings.PAGE_RENDER_JPEG_QUALITY)
+        return pix.tobytes(output="png")
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+class DiskLRUCache:
+    """Files under `directory`, evicted least recently used first once over `max_bytes`.
+    Pinned files (`get_path(name, pin=True)` until `unpin(name)`) are never evicted."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        """Index what earlier runs left behind, oldest access first."""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._bytes += size
+        self._loaded = True
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if name not in self._index:
+                return None
+            self._index.move_to_end(name)
+        try:
+            with open(self.path(name), "rb") as f:
+                data = f.read()
+            # mtime doubles as the access time, which noatime mounts do not keep
+            os.utime(self.path(name))
+            return data
+        except FileNotFoundError:
+            self.forget(name)
+            return None
+
+    def get_path(self, name: str, pin: bool = False) -> Optional[str]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if name not in self._index:
+                return None
+            self._index.move_to_end(name)
+            if pin:
+                self._pins[name] = self._pins.get(name, 0) + 1
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            if pin:
+                self.unpin(name)
+            self.forget(name)
+            return None
+        return path
+
+    def unpin(self, name: str):
+        with self._lock:
+            left = self._pins.pop(name, 0) - 1
+            if left > 0:
+                self._pins[name] = left
+
+    def put(self, name: str, data: bytes) -> str:
+        path = self.path(name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            self._evict()
+            PAGE_CACHE_BYTES.set(self._bytes)
+        return path
+
+    def forget(self, name: str):
+        with self._lock:
+            self._bytes -= self._index.pop(name, 0)
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        # The newest entry (just written) always stays
+        for name in list(self._index)[:-1]:
+            if self._bytes <= self.max_bytes:
+                break
+            if name in self._pins:
+                continue
+            self._bytes -= self._index.pop(name)
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+
+class PageRenderer:
+    def __init__(self):
+        self.cache = DiskLRUCache(settings.PAGE_CACHE_DIR, settings.PAGE_CACHE_MAX_MB * 1024 * 1024)
+        # One render per key at a time; concurrent requests for it share the result
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def _source_path(self, digest: str, load_blob: Callable[[], Awaitable[bytes]]) -> str:
+        """Cached path of the source PDF, pinned for the caller (who unpins it)."""
+        name = f"{digest}.pdf"
+
+        async def load():
+            PAGE_CACHE.inc(kind="source", outcome="miss")
+            await asyncio.to_thread(self.cache.put, name, await load_blob())
+
+        for _ in range(2):
+            path = await asyncio.to_thread(self.cache.get_path, name, True)
+            if path is not None:
+                return path
+            # Renders of other pages of the same note share one load
+            await self._once(name, load)
+        raise FileNotFoundError(f"source PDF {name} evicted right after it was cached")
+
+    async def _with_source(self, digest: str, load_blob: Callable[[], Awaitable[bytes]],
+                           use: Callable[[str], Awaitable[Any]]):
+        """`use(path)` on the source PDF. Another worker may still delete the file
+        (eviction by its own index); then it is written again and `use` retried once."""
+        name = f"{digest}.pdf"
+        for attempt in range(2):
+            path = await self._source_path(digest, load_blob)
+            try:
+                return await use(path)
+            except Exception:
+                if attempt > 0 or os.path.exists(path):
+                    raise
+                PAGE_CACHE.inc(kind="source", outcome="vanished")
+                self.cache.forget(name)
+            finally:
+                self.cache.unpin(name)
+
+    async def _once(self, key: str, produce: Callable[[], Awaitable]):
+        # The work runs as its own task: a client that disconnects does not cancel it for the others
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(produce())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None and not isinstance(task.exception(), PageOutOfRange):
+            logger.warning("⚠️ Page render %s failed: %s", key, task.exception())
+
+    async def page_count(self, digest: str, load_blob: Callable[[], Awaitable[bytes]]) -> int:
+        name = f"{digest}.pages"
+        cached = await asyncio.to_thread(self.cache.get, name)
+        if cached is not None:
+            return int(cached)
+
+        async def produce():
+            count = await self._with_source(digest, load_blob, lambda path: asyncio.to_thread(count_pdf_pages, path))
+            await asyncio.to_thread(self.cache.put, name, str(count).encode())
+            return count
+
+        return await self._once(name, produce)
+
+    async def render(self, digest: str, page: int, dpi: int, load_blob: Callable[[], Awaitable[bytes]],
+                     kind: str = "page") -> Tuple[bytes, str]:
+        """Image bytes and media type of 1-based `page`; raises PageOutOfRange."""
+        fmt = settings.PAGE_RENDER_FORMAT if kind == "page" else "png"
+        name = f"{digest}-p{page}-{dpi}.{fmt}"
+        cached = await asyncio.to_thread(self.cache.get, name)
+        if cached is not None:
+            PAGE_CACHE.inc(kind=kind, outcome="hit")
+            return cached, MEDIA_TYPES[fmt]
+        PAGE_CACHE.inc(kind=kind, outcome="miss")
+
+        async def produce():
+            from app.services.pdf_parse import get_parse_pool
+
+            def rasterize(path: str):
+                return asyncio.get_running_loop().run_in_executor(
+                    get_parse_pool(), render_page_image, path, page - 1, dpi, fmt)
+
+            start = time.perf_counter()
+            image = await self._with_source(digest, load_blob, rasterize)
+            record_stage("page_render", time.perf_counter() - start)
+            await asyncio.to_thread(self.cache.put, name, image)
+            return image
+
+        return await self._once(name, produce), MEDIA_TYPES[fmt]
+
+
+page_renderer = PageRenderer()
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from chromadb.api.models.Collection import Collection
+from sqlalchemy import update
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models.tables import PDFData
+from app.services.chunking import Chunk, Chunker
+from app.services.embeddings import aencode
+from app.services.pdf_parse import Page, parse_pages_parallel, parse_workers
+from app.services.vector_codec import encode_vector
+from app.core.telemetry import span
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@dataclass
+class IngestProgress:
+    pdf_id: int
+    pages_total: int
+    pages_indexed: int = 0
+    chunks_indexed: int = 0
+    status: str = "processing"  # processing | ready | failed
+    error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+# Per-process view of the PDFs this worker is streaming into Chroma. Finished
+# entries expire after INGEST_PROGRESS_TTL; the state itself is persisted on
+# the pdf_data row (save_progress), which is what other workers see.
+ingest_progress: dict[int, IngestProgress] = {}
+
+# Keep references to running ingest tasks so they are not garbage collected.
+_background_tasks: set[asyncio.Task] = set()
+
+def count_pages(pdf_path: str) -> int:
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def iter_pdf_pages(pdf_path: str, start_page: int = 0) -> Iterator[Page]:
+    """Yield pages one at a time so only the current page text is held in memory."""
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        for page_no in range(start_page, doc.page_count):
+            yield page_no + 1, doc.load_page(page_no).get_text()
+
+
+def _next_batch(pages: Iterator[Page], batch_size: int) -> List[Page]:
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) >= batch_size:
+            break
+    return batch
+
+
+async def stream_page_batches(pdf_path: str, batch_size: int, start_page: int = 0,
+                             page_count: Optional[int] = None) -> AsyncIterator[List[Page]]:
+    """Page batches in order; parsing runs off the event loop, in worker
+    processes for large documents (see app/services/pdf_parse.py)."""
+    if page_count is None:
+        page_count = await asyncio.to_thread(count_pages, pdf_path)
+    if page_count - start_page >= settings.PDF_PARSE_MIN_PAGES and parse_workers() > 1:
+        async for batch in parse_pages_parallel(pdf_path, page_count, start_page, batch_size):
+            yield batch
+        return
+
+    pages = iter_pdf_pages(pdf_path, start_page)
+    while True:
+        batch = await asyncio.to_thread(_next_batch, pages, batch_size)
+        if not batch:
+            return
+        yield batch
+
+
+def chunk_pages(pages: List[Page], chunker: Chunker) -> List[Chunk]:
+    """Split a page batch into chunks that remember their page and offsets."""
+    chunks = []
+    for page_no, text in pages:
+        chunks.extend(chunker.split_page(page_no, text))
+    return chunks
+
+
+async def document_embedding(chunks: List[Chunk]) -> bytes:
+    """PDFData.pdf_embedding: the leading text of the first chunks, in vector_codec's layout."""
+    preview = " ".join(chunk.text for chunk in chunks)[:2000]
+    async with span("embedding"):
+        return encode_vector(await aencode(preview), settings.DOC_EMBEDDING_DTYPE)
+
+
+def chunk_id(pdf_id: int, chunk_index: int) -> str:
+    # Deterministic ids make re-ingesting the same PDF an idempotent upsert.
+    return f"pdf-{pdf_id}-{chunk_index}"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+async def upsert_chunks(
+    chunks: List[Chunk],
+    pages_done: int,
+    pdf_id: int,
+    filename: str,
+    collection: Collection,
+    progress: IngestProgress,
+    strategy: str,
+):
+    if chunks:
+        start = progress.chunks_indexed
+        texts = [chunk.text for chunk in chunks]
+        # Embed with our own (possibly ONNX/int8) model instead of Chroma's client-side default
+        async with span("embedding"):
+            embeddings = await aencode(texts)
+        async with span("vector_upsert"):
+            await collection.upsert(
+                ids=[chunk_id(pdf_id, start + i) for i in range(len(chunks))],
+                documents=texts,
+                embeddings=embeddings.tolist(),
+                metadatas=[{
+                    "source_file": filename,
+                    "pdf_id": pdf_id,
+                    "chunk_index": start + i,
+                    "strategy": strategy,
+                    # Lets the reconciler find duplicate chunks without fetching their text
+                    "chunk_hash": text_hash(chunk.text),
+                    **chunk.metadata()
+                } for i, chunk in enumerate(chunks)]
+            )
+    progress.pages_indexed += pages_done
+    progress.chunks_indexed += len(chunks)
+
+
+async def upsert_first_pages(
+    chunks: List[Chunk],
+    pages_done: int,
+    pdf_id: int,
+    filename: str,
+    collection: Collection,
+    progress: IngestProgress,
+    strategy: str,
+):
+    """The inline part of an ingest (upload or restore), before the background task takes over.
+
+    A failure is recorded before it propagates: the PDF is saved as failed and
+    the progress entry expires, so the next chat restores it instead of taking
+    it for an ingest that is still running.
+    """
+    try:
+        await upsert_chunks(chunks, pages_done, pdf_id, filename, collection, progress, strategy)
+    except BaseException as e:
+        progress.status = "failed"
+        progress.error = str(e) or type(e).__name__
+        logger.error("❌ PDF %s: indexing the first pages failed: %s", pdf_id, progress.error)
+        await save_progress(progress)
+        _expire_progress(progress)
+        raise
+
+
+async def save_progress(progress: IngestProgress):
+    """Persist the ingest state, so any worker can report it and repair a failed ingest."""
+    try:
+        async with async_session_maker() as db:
+            await db.execute(
+                update(PDFData).where(PDFData.id == progress.pdf_id).values(
+                    ingest_status=progress.status,
+                    pages_total=progress.pages_total,
+                    pages_indexed=progress.pages_indexed,
+                    chunks_indexed=progress.chunks_indexed,
+                    ingest_updated_at=datetime.utcnow(),
+                )
+            )
+            await db.commit()
+    except Exception as e:
+        logger.error("❌ PDF %s: could not save ingest progress: %s", progress.pdf_id, e)
+
+
+def _expire_progress(progress: IngestProgress):
+    def expire():
+        if ingest_progress.get(progress.pdf_id) is progress:
+            del ingest_progress[progress.pdf_id]
+
+    asyncio.get_running_loop().call_later(settings.INGEST_PROGRESS_TTL, expire)
+
+
+async def upsert_page_batch(
+    pages: List[Page],
+    pdf_id: int,
+    filename: str,
+    collection: Collection,
+    progress: IngestProgress,
+    chunker: Chunker,
+):
+    chunks = await asyncio.to_thread(chunk_pages, pages, chunker)
+    await upsert_chunks(chunks, len(pages), pdf_id, filename, collection, progress, chunker.name)
+
+
+async def ingest_remaining_pages(
+    pdf_path: str,
+    pdf_id: int,
+    filename: str,
+    collection: Collection,
+    progress: IngestProgress,
+    chunker: Chunker,
+    cleanup: bool = True,
+):
+    """Stream every page after the ones already indexed into the collection."""
+    try:
+        async for batch in stream_page_batches(pdf_path, settings.INGEST_PAGE_BATCH, progress.pages_indexed,
+                                               progress.pages_total):
+            await upsert_page_batch(batch, pdf_id, filename, collection, progress, chunker)
+            await save_progress(progress)
+        progress.status = "ready"
+        logger.info("📚 PDF %s: indexed %s chunks from %s pages", pdf_id, progress.chunks_indexed, progress.pages_total)
+    except Exception as e:
+        progress.status = "failed"
+        progress.error = str(e)
+        logger.error("❌ PDF %s: background ingestion failed at page %s: %s", pdf_id, progress.pages_indexed, e)
+    finally:
+        if cleanup and os.path.exists(pdf_path):
+            os.remove(pdf_path)
+    await save_progress(progress)
+    _expire_progress(progress)
+
+
+def start_background_ingest(
+    pdf_path: str,
+    pdf_id: int,
+    filename: str,
+    collection: Collection,
+    progress: IngestProgress,
+    chunker: Chunker,
+) -> None:
+    # Also runs when the first pages were all there is: it records the PDF as ready
+    task = asyncio.create_task(
+        ingest_remaining_pages(pdf_path, pdf_id, filename, collection, progress, chunker)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def read_first_pages(pdf_path: str) -> Tuple[int, List[Page]]:
+    """Parse only the leading pages so the upload can answer quickly."""
+    pages_total = await asyncio.to_thread(count_pages, pdf_path)
+    first_pages = await asyncio.to_thread(
+        _next_batch, iter_pdf_pages(pdf_path), settings.INGEST_FIRST_PAGES
+    )
+    return pages_total, first_pages
+
+
+def get_progress(pdf_id: int) -> Optional[IngestProgress]:
+    return ingest_progress.get(pdf_id)
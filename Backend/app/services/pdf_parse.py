@@ -0,0 +1,95 @@
+"""
+Parallel text extraction for large PDFs.
+
+PyMuPDF holds the GIL while it extracts a page, so threads do not help:
+a 1000-page PDF is parsed on one core however many are idle. Here the
+document is split into page ranges that worker processes extract
+concurrently. Each worker opens the same file read-only (the OS page cache
+shares it between them) and returns its range's pages. Results are yielded
+in page order, with at most two ranges per worker in flight so memory stays
+bounded.
+
+Documents with fewer than PDF_PARSE_MIN_PAGES pages are parsed in a thread,
+since starting workers costs more than it saves. Workers are spawned, not
+forked: the server process runs threads (torch, the event loop's executor)
+that a fork would copy in an undefined state.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Pages are (1-based page number, extracted text)
+Page = Tuple[int, str]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[Page]:
+    """Runs in a worker process: text of pages [start, end) (0-based)."""
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        end = min(end, doc.page_count)
+        return [(page_no + 1, doc.load_page(page_no).get_text()) for page_no in range(start, end)]
+
+
+def parse_workers() -> int:
+    if settings.PDF_PARSE_WORKERS > 0:
+        return settings.PDF_PARSE_WORKERS
+    return max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+def get_parse_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    workers = workers or parse_workers()
+    if _pool is None or _pool_workers != workers:
+        shutdown_parse_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+        logger.info("🧵 Started %s PDF parsing worker process(es)", workers)
+    return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def page_ranges(start_page: int, page_count: int, range_pages: int) -> List[Tuple[int, int]]:
+    range_pages = max(1, range_pages)
+    return [(s, min(s + range_pages, page_count)) for s in range(start_page, page_count, range_pages)]
+
+
+async def parse_pages_parallel(
+    pdf_path: str,
+    page_count: int,
+    start_page: int = 0,
+    range_pages: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> AsyncIterator[List[Page]]:
+    """Yield the pages of [start_page, page_count) in order, one range at a time."""
+    workers = workers or parse_workers()
+    pool = get_parse_pool(workers)
+    loop = asyncio.get_running_loop()
+    pending = deque(page_ranges(start_page, page_count, range_pages or settings.INGEST_PAGE_BATCH))
+    in_flight: deque = deque()
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < workers * 2:
+                start, end = pending.popleft()
+                in_flight.append(loop.run_in_executor(pool, extract_page_range, pdf_path, start, end))
+            yield await in_flight.popleft()
+    finally:
+        # Consumer stopped early (failure, cancellation): drop the ranges not started yet
+        for future in in_flight:
+            future.cancel()
@@ -0,0 +1,139 @@
+"""
+Prompt layout for provider-side prefix caching.
+
+Upstream caches (OpenAI/Groq style) reuse the longest identical *prefix* of a
+request. Messages are therefore ordered from most to least stable:
+
+    1. system prompt            - never changes
+    2. pinned note context      - same for every turn about one note
+    3. earlier turns, verbatim  - only grows at the end
+    4. retrieved docs + question - new every turn, always last
+
+History is trimmed in whole blocks so the prefix only shifts once every few
+turns instead of on every turn once the budget is reached.
+"""
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from app.services.context_builder import ContextReport, prompt_budget, CONTEXT_SHARE, RETRIEVED_SHARE
+from app.services.tokenizer import count_tokens, truncate_to_tokens
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a helpful AI assistant. Answer the user's question based on the "
+    "provided context and retrieved documents."
+)
+
+# Oldest messages are dropped this many at a time when history overflows
+HISTORY_TRIM_BLOCK = 8
+
+
+def _pinned_context_message(context: str) -> dict:
+    return {
+        "role": "system",
+        "content": (
+            "Here is the context/notes you must use:\n"
+            "---------------------\n"
+            f"{context}\n"
+            "---------------------"
+        ),
+    }
+
+
+def _question_message(question: str, retrieved_docs: str) -> dict:
+    content = ""
+    if retrieved_docs:
+        content += (
+            "Here is background information/retrieved documents:\n"
+            "---------------------\n"
+            f"{retrieved_docs}\n"
+            "---------------------\n\n"
+        )
+    content += f"User Question: {question}"
+    return {"role": "user", "content": content}
+
+
+def _trim_history_in_blocks(history: List[dict], budget: int) -> List[dict]:
+    tokens = [count_tokens(m["content"]) for m in history]
+    start, total = 0, sum(tokens)
+    while total > budget and start < len(history):
+        end = min(start + HISTORY_TRIM_BLOCK, len(history))
+        total -= sum(tokens[start:end])
+        start = end
+    return history[start:]
+
+
+def assemble_chat_messages(
+    messages: List[dict],
+    context: Optional[str],
+    retrieved_docs: Optional[str],
+    model: Optional[str] = None,
+) -> Tuple[List[dict], ContextReport]:
+    """Build the upstream message list with a stable prefix and the variable parts last."""
+    budget = prompt_budget(model)
+    report = ContextReport(budget=budget)
+
+    context = truncate_to_tokens(context or "", int(budget * CONTEXT_SHARE))
+    retrieved_docs = truncate_to_tokens(retrieved_docs or "", int(budget * RETRIEVED_SHARE))
+
+    history = [{"role": m["role"], "content": m["content"]} for m in messages]
+    if history and history[-1]["role"] == "user":
+        question = history.pop()["content"]
+    else:
+        question = "Please analyze this."
+
+    prefix = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+    if context:
+        prefix.append(_pinned_context_message(context))
+    latest = _question_message(question, retrieved_docs)
+
+    report.parts["system"] = count_tokens(CHAT_SYSTEM_PROMPT)
+    report.parts["context"] = count_tokens(context)
+    report.parts["retrieved"] = count_tokens(retrieved_docs)
+    report.parts["question"] = count_tokens(question)
+
+    fixed = sum(count_tokens(m["content"]) for m in prefix) + count_tokens(latest["content"])
+    history = _trim_history_in_blocks(history, max(budget - fixed, 0))
+    report.parts["history"] = sum(count_tokens(m["content"]) for m in history)
+
+    return prefix + history + [latest], report
+
+
+@dataclass
+class PromptCacheStats:
+    """Running totals of the prompt-cache usage fields returned upstream."""
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def record(self, usage) -> Tuple[int, int]:
+        """Record one response's usage; returns (prompt_tokens, cached_tokens)."""
+        if usage is None:
+            return 0, 0
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt
+            self.cached_tokens += cached
+        return prompt, cached
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_ratio": round(self.cached_ratio, 4),
+        }
+
+
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,66 @@
+"""
+Turns one request into several short retrieval sub-queries.
+
+Embedding models only see the first few hundred tokens of their input, so
+gluing a whole resume (or note + question) into one query string mostly
+searches on its opening lines. Sub-queries are embedded in one batch and
+sent as one batched vector query (see quiz.search_chunks).
+"""
+import re
+from typing import List
+
+from app.config import settings
+from app.services.chunking import is_heading
+from app.services.tokenizer import count_tokens, truncate_to_tokens
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def split_sections(text: str, max_sections: int) -> List[str]:
+    """Split on heading lines (paragraphs if there are none), merging the
+    shortest neighbours until at most max_sections remain."""
+    sections, current = [], []
+    for line in text.splitlines():
+        if is_heading(line) and any(l.strip() for l in current):
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    sections.append("\n".join(current))
+    sections = [s.strip() for s in sections if s.strip()]
+
+    if len(sections) < 2:
+        sections = [p.strip() for p in _PARAGRAPH_RE.split(text) if p.strip()]
+
+    while len(sections) > max(1, max_sections):
+        sizes = [count_tokens(a) + count_tokens(b) for a, b in zip(sections, sections[1:])]
+        i = sizes.index(min(sizes))
+        sections[i:i + 2] = [sections[i] + "\n" + sections[i + 1]]
+    return sections
+
+
+def _dedupe(queries: List[str]) -> List[str]:
+    seen, out = set(), []
+    for q in queries:
+        key = " ".join(q.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            out.append(q)
+    return out
+
+
+def resume_queries(parsed_doc: str, user_prompt: str) -> List[str]:
+    """The prompt on its own, plus the prompt focused on each resume section."""
+    per_query = settings.SUB_QUERY_TOKENS
+    sections = split_sections(parsed_doc, settings.MAX_SUB_QUERIES - 1)
+    queries = [user_prompt] + [
+        f"{user_prompt} {truncate_to_tokens(section, per_query)}" for section in sections
+    ]
+    return _dedupe(queries)
+
+
+def chat_queries(context: str, question: str) -> List[str]:
+    """The question on its own, and the question anchored to the open note."""
+    queries = [question]
+    if context:
+        queries.append(f"{truncate_to_tokens(context, settings.SUB_QUERY_TOKENS)} {question}")
+    return _dedupe(queries)
@@ -0,0 +1,104 @@
+"""
+Ephemeral vector storage for notes pasted into /quiz/notes and /quiz/ingest.
+
+The text is keyed by its content hash and its owner
+(`quiz-<user_id>-<hash>`), chunked like PDF notes, and upserted under
+deterministic chunk ids. Asking for another quiz on the same notes finds the
+existing chunks and skips embedding altogether. Every chunk carries an
+`expires_at`; a reuse late in that window pushes it out again, and the
+reconciler deletes expired chunks (app/services/reconciler.py).
+
+These chunks have no pdf_id, so the note-routed search used by chat never
+returns them; quiz retrieval filters on the owner and the document hash.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import List
+
+from app.config import settings
+from app.core.telemetry import Counter, registry, span
+from app.services.chunking import get_chunker
+from app.services.embeddings import aencode
+from app.services.pdf_ingest import text_hash
+
+logger = logging.getLogger("uvicorn.error")
+
+QUIZ_NOTES = registry.register(Counter(
+    "prepai_quiz_notes_total", "Quiz notes ingests by outcome (indexed or reused).", ("outcome",)))
+
+KIND = "quiz_notes"
+
+
+@dataclass
+class QuizNotesDoc:
+    doc_id: str
+    doc_hash: str
+    user_id: int
+    chunks: int
+    reused: bool
+
+    def where(self) -> dict:
+        """Filter for searching only this document's chunks."""
+        return {"$and": [{"user_id": self.user_id}, {"doc_hash": self.doc_hash}]}
+
+
+def quiz_doc_id(user_id: int, doc_hash: str) -> str:
+    return f"quiz-{user_id}-{doc_hash[:16]}"
+
+
+def _ttl_seconds() -> float:
+    return settings.QUIZ_NOTES_TTL_HOURS * 3600
+
+
+async def _refresh_expiry(collection, ids: List[str], expires_at: int):
+    page = await collection.get(ids=ids, include=["metadatas"])
+    metadatas = [{**(meta or {}), "expires_at": expires_at} for meta in page.get("metadatas") or []]
+    if metadatas:
+        await collection.update(ids=page["ids"], metadatas=metadatas)
+
+
+async def ingest_quiz_notes(parsed_doc: str, user_id: int, collection) -> QuizNotesDoc:
+    doc_hash = text_hash(parsed_doc)
+    doc_id = quiz_doc_id(user_id, doc_hash)
+    now = time.time()
+    expires_at = int(now + _ttl_seconds())
+
+    # The first chunk says whether (and how many) chunks are already stored
+    first = await collection.get(ids=[f"{doc_id}-0"], include=["metadatas"])
+    if first.get("ids"):
+        meta = (first.get("metadatas") or [{}])[0] or {}
+        count = int(meta.get("chunk_count", 1))
+        if meta.get("expires_at", 0) - now < _ttl_seconds() / 2:
+            await _refresh_expiry(collection, [f"{doc_id}-{i}" for i in range(count)], expires_at)
+        QUIZ_NOTES.inc(outcome="reused")
+        return QuizNotesDoc(doc_id, doc_hash, user_id, count, reused=True)
+
+    chunker = get_chunker()
+    chunks = await asyncio.to_thread(chunker.split_page, 1, parsed_doc)
+    if not chunks:
+        raise ValueError("No text could be extracted from these notes.")
+    texts = [chunk.text for chunk in chunks]
+    async with span("embedding"):
+        embeddings = await aencode(texts)
+    async with span("vector_upsert"):
+        await collection.upsert(
+            ids=[f"{doc_id}-{i}" for i in range(len(chunks))],
+            documents=texts,
+            embeddings=embeddings.tolist(),
+            metadatas=[{
+                "kind": KIND,
+                "user_id": user_id,
+                "doc_hash": doc_hash,
+                "chunk_index": i,
+                "chunk_count": len(chunks),
+                "chunk_hash": text_hash(chunk.text),
+                "strategy": chunker.name,
+                "expires_at": expires_at,
+                **chunk.metadata()
+            } for i, chunk in enumerate(chunks)]
+        )
+    QUIZ_NOTES.inc(outcome="indexed")
+    logger.info("📝 Indexed %s chunks of quiz notes %s for user %s", len(chunks), doc_id, user_id)
+    return QuizNotesDoc(doc_id, doc_hash, user_id, len(chunks), reused=False)
@@ -0,0 +1,258 @@
+"""
+Reconciles the vector store with Postgres and garbage-collects chunks.
+
+One pass pages through the whole collection (RECONCILE_PAGE_SIZE chunks per
+request, metadata only) and, per page, checks in a single query which of the
+referenced pdf_ids still exist. It then removes:
+
+- orphans: chunks of a PDF whose pdf_data row is gone (a delete_note whose
+  Chroma delete failed, or an ingest that finished after the delete)
+- duplicates: chunks of the same PDF with the same text left by older
+  restores that used random ids. Only those random ids are ever removed: a
+  deterministic `pdf-<id>-<n>` chunk (pdf_ingest.chunk_id) is its own position
+  in the document, and repeated text such as a running header is not a duplicate
+- expired quiz notes: chunks written by /quiz/notes past their `expires_at`
+  (app/services/quiz_notes.py)
+- with RECONCILE_DROP_UNOWNED, chunks with neither a pdf_id nor a kind, i.e.
+  documents the old /quiz/notes and /quiz/ingest added under random ids
+
+Deletions are collected during the scan and applied afterwards, so paging by
+offset is not disturbed. PDFs with no chunks at all are only reported: the next
+chat on them restores them (ensure_pdf_in_chroma).
+
+Chroma's HTTP API has no compaction call; it compacts its own segments, and
+fewer stored chunks is what keeps queries fast.
+
+With several workers, only the one holding the Postgres advisory lock runs a
+pass. Run a pass by hand with:
+
+    python -m app.services.reconciler [--dry-run]
+"""
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select, text
+
+from app.config import settings
+from app.core.telemetry import Counter, Gauge, registry
+from app.database import async_session_maker, engine
+from app.models.tables import PDFData
+from app.services.pdf_ingest import chunk_id, text_hash
+from app.services.quiz_notes import KIND as QUIZ_NOTES_KIND
+
+logger = logging.getLogger("uvicorn.error")
+
+RECONCILE_CHUNKS = registry.register(Counter(
+    "prepai_reconcile_chunks_total", "Vector store chunks handled by the reconciler, by action.", ("action",)))
+RECONCILE_LAST_RUN = registry.register(Gauge(
+    "prepai_reconcile_last_run_timestamp", "Unix time of the last completed reconciler pass."))
+RECONCILE_UNINDEXED = registry.register(Gauge(
+    "prepai_reconcile_unindexed_pdfs", "PDFs with no chunks in the vector store at the last pass."))
+
+# Arbitrary key for pg_try_advisory_lock
+ADVISORY_LOCK_KEY = 4_620_461
+DELETE_BATCH = 500
+
+
+def _is_deterministic(doc_id: str, pdf_id: int) -> bool:
+    """Whether `doc_id` is `chunk_id(pdf_id, n)` for some n."""
+    prefix = chunk_id(pdf_id, 0)[:-1]
+    return doc_id.startswith(prefix) and doc_id[len(prefix):].isdigit()
+
+
+@dataclass
+class ReconcileReport:
+    dry_run: bool = False
+    scanned: int = 0
+    pdfs_seen: int = 0
+    orphans: int = 0
+    duplicates: int = 0
+    expired: int = 0
+    unowned: int = 0
+    deleted: int = 0
+    unindexed_pdfs: List[int] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class Reconciler:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Optional[ReconcileReport] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, collection):
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run_forever(collection), name="reconciler")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run_forever(self, collection):
+        while True:
+            await asyncio.sleep(settings.RECONCILE_INTERVAL)
+            try:
+                await self.run_exclusive(collection)
+            except Exception as e:
+                logger.error("❌ Reconciler pass failed: %s", e)
+
+    async def run_exclusive(self, collection, dry_run: bool = False) -> Optional[ReconcileReport]:
+        """Run one pass unless another worker already is."""
+        if engine.dialect.name != "postgresql":
+            return await self.run(collection, dry_run)
+        async with engine.connect() as conn:
+            if not await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}):
+                logger.info("Reconciler pass skipped, another worker holds the lock")
+                return None
+            try:
+                return await self.run(collection, dry_run)
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+    async def run(self, collection, dry_run: bool = False) -> ReconcileReport:
+        start = time.perf_counter()
+        report = ReconcileReport(dry_run=dry_run)
+        to_delete: List[str] = []
+        # (pdf_id, text hash) -> id of a chunk kept for that text, deterministic when there is one
+        kept: Dict[Tuple[int, str], str] = {}
+        existing: Set[int] = set()
+        seen: Set[int] = set()
+        now = time.time()
+
+        offset = 0
+        while True:
+            page = await collection.get(limit=settings.RECONCILE_PAGE_SIZE, offset=offset, include=["metadatas"])
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            offset += len(ids)
+            report.scanned += len(ids)
+            metadatas = page.get("metadatas") or [None] * len(ids)
+
+            page_pdfs = {m["pdf_id"] for m in metadatas if m and isinstance(m.get("pdf_id"), int)}
+            new_pdfs = page_pdfs - seen
+            if new_pdfs:
+                existing |= await self._existing_pdf_ids(new_pdfs)
+                seen |= new_pdfs
+
+            # Chunks written before chunk_hash was stored need their text
+            legacy = [doc_id for doc_id, m in zip(ids, metadatas)
+                      if m and m.get("pdf_id") in existing and not m.get("chunk_hash")]
+            legacy_hashes = await self._hash_documents(collection, legacy) if legacy else {}
+
+            for doc_id, meta in zip(ids, metadatas):
+                meta = meta or {}
+                pdf_id = meta.get("pdf_id")
+                if meta.get("kind") == QUIZ_NOTES_KIND:
+                    if meta.get("expires_at", 0) < now:
+                        report.expired += 1
+                        to_delete.append(doc_id)
+                    continue
+                if not isinstance(pdf_id, int):
+                    report.unowned += 1
+                    if settings.RECONCILE_DROP_UNOWNED and not meta.get("kind"):
+                        to_delete.append(doc_id)
+                    continue
+                if pdf_id not in existing:
+                    report.orphans += 1
+                    to_delete.append(doc_id)
+                    continue
+                digest = meta.get("chunk_hash") or legacy_hashes.get(doc_id)
+                if digest is None:
+                    continue
+                key = (pdf_id, digest)
+                other = kept.get(key)
+                if other is None:
+                    kept[key] = doc_id
+                    continue
+                if not _is_deterministic(doc_id, pdf_id):
+                    report.duplicates += 1
+                    to_delete.append(doc_id)
+                elif not _is_deterministic(other, pdf_id):
+                    # The random copy goes; later restores overwrite the deterministic one in place
+                    report.duplicates += 1
+                    to_delete.append(other)
+                    kept[key] = doc_id
+
+        report.pdfs_seen = len(seen)
+        report.unindexed_pdfs = await self._unindexed_pdf_ids(existing)
+
+        if not dry_run:
+            for i in range(0, len(to_delete), DELETE_BATCH):
+                batch = to_delete[i:i + DELETE_BATCH]
+                await collection.delete(ids=batch)
+                report.deleted += len(batch)
+
+        report.seconds = round(time.perf_counter() - start, 3)
+        self._record(report)
+        return report
+
+    @staticmethod
+    async def _existing_pdf_ids(pdf_ids: Set[int]) -> Set[int]:
+        async with async_session_maker() as db:
+            result = await db.execute(select(PDFData.id).where(PDFData.id.in_(pdf_ids)))
+            return set(result.scalars().all())
+
+    @staticmethod
+    async def _unindexed_pdf_ids(indexed: Set[int]) -> List[int]:
+        async with async_session_maker() as db:
+            total = await db.scalar(select(func.count(PDFData.id)))
+            if total == len(indexed):
+                return []
+            result = await db.execute(select(PDFData.id).order_by(PDFData.id))
+            return [pdf_id for pdf_id in result.scalars().all() if pdf_id not in indexed]
+
+    @staticmethod
+    async def _hash_documents(collection, ids: List[str]) -> Dict[str, str]:
+        page = await collection.get(ids=ids, include=["documents"])
+        return {doc_id: text_hash(doc) for doc_id, doc in zip(page.get("ids") or [], page.get("documents") or [])
+                if doc is not None}
+
+    def _record(self, report: ReconcileReport):
+        self.last_report = report
+        RECONCILE_CHUNKS.inc(report.scanned, action="scanned")
+        RECONCILE_CHUNKS.inc(report.orphans, action="orphan")
+        RECONCILE_CHUNKS.inc(report.duplicates, action="duplicate")
+        RECONCILE_CHUNKS.inc(report.expired, action="expired")
+        RECONCILE_CHUNKS.inc(report.unowned, action="unowned")
+        RECONCILE_CHUNKS.inc(report.deleted, action="deleted")
+        RECONCILE_UNINDEXED.set(len(report.unindexed_pdfs))
+        RECONCILE_LAST_RUN.set(time.time())
+        logger.info(
+            "🧽 Reconciler%s: scanned %s chunks of %s PDFs, %s orphaned, %s duplicate, %s expired, "
+            "%s unowned, %s deleted, %s PDF(s) without chunks (%.1fs)",
+            " (dry run)" if report.dry_run else "", report.scanned, report.pdfs_seen, report.orphans,
+            report.duplicates, report.expired, report.unowned, report.deleted, len(report.unindexed_pdfs),
+            report.seconds,
+        )
+
+
+reconciler = Reconciler()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from app.services.vector_store import vector_store
+
+    parser = argparse.ArgumentParser(description="One reconciler pass over the vector store.")
+    parser.add_argument("--dry-run", action="store_true", help="report only, delete nothing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = asyncio.run(reconciler.run_exclusive(vector_store.collection, dry_run=args.dry_run))
+    print(json.dumps(report.as_dict() if report else {"skipped": "another worker holds the lock"}, indent=2))
@@ -0,0 +1,191 @@
+"""
+Decides per chat turn whether note retrieval is needed, and how much.
+
+Many turns are answered from the conversation alone: "thanks", "make it
+shorter", "explain that again". Searching the notes for them costs a vector
+round trip and puts thousands of tokens of unrelated chunks into the prompt.
+A turn is routed by cheap rules first, then by nearest prototype under the
+embedding model already loaded for search. Only confident matches skip
+retrieval; anything unclear is searched as before.
+
+Turns that refer back to the conversation only skip retrieval when there
+is a conversation to refer to. The question's embedding is kept on the plan,
+so a routed turn that does search does not embed its query twice.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.core.telemetry import Counter, log_sampled, registry, span
+from app.services.embeddings import aencode
+
+logger = logging.getLogger("uvicorn.error")
+
+ROUTES = registry.register(Counter(
+    "prepai_retrieval_route_total", "Chat turns by routed intent and what decided it.", ("intent", "source")))
+
+# social: greetings, thanks, acknowledgements
+# rewrite: reshape the previous answer ("shorter", "as bullet points")
+# clarify: repeat or restate the previous answer (nothing new is needed)
+# followup: expand on or ask about the previous answer, searched narrowly
+# broad: covers a whole note, searched widely
+# knowledge: anything else, searched as usual
+SKIP_INTENTS = ("social", "rewrite", "clarify")
+HISTORY_INTENTS = ("rewrite", "clarify", "followup")
+
+_SOCIAL_WORDS = (
+    r"hi|hello|hey|thanks?|thank you|thx|ty|cheers|ok|okay|k|cool|great|nice|awesome|perfect|"
+    r"got it|understood|makes sense|i see|sure|yes|yeah|yep|no|nope|bye|goodbye|good night|"
+    r"so much|a lot|very much|that helps|that helped|helpful|lol"
+)
+RULES = (
+    ("social", re.compile(rf"^(?:(?:{_SOCIAL_WORDS})\s*)+$")),
+    ("broad", re.compile(
+        r"\b(?:summari[sz]e|overview of|outline|key points of|main points of|list all|all the (?:key|main))\b"
+        r".*\b(?:notes?|document|pdf|chapters?|lecture|file|whole|entire)\b"
+    )),
+    ("rewrite", re.compile(
+        r"^(?:(?:can|could) you |please )*(?:make (?:it|that|this|them) |(?:say|put|write) (?:it|that|this) )?"
+        r"(?:shorter|longer|simpler|more (?:concise|detailed|formal|casual)|less \w+|"
+        r"(?:rephrase|reword|shorten|simplify|summari[sz]e|translate|reformat|condense)(?: (?:it|that|this|the above|your (?:answer|response)))?|"
+        r"(?:in|as|into|use) (?:a )?(?:bullet points?|bullets|a table|table|a list|list|one sentence|simple (?:terms|words)))"
+        r"(?: please)?$"
+    )),
+    ("clarify", re.compile(
+        r"^(?:(?:can|could) you |please )*(?:"
+        r"(?:explain|say|repeat) (?:it|that|this)(?: again| once more)?|"
+        r"what do you mean|i (?:still )?(?:don'?t|do not) (?:get|understand)(?: it| that)?|"
+        r"what|huh|come again"
+        r")(?: please)?$"
+    )),
+    # Going deeper needs material the previous answer did not include
+    ("followup", re.compile(
+        r"^(?:(?:can|could) you |please )*(?:"
+        r"elaborate(?: on (?:it|that|this|your (?:answer|response)))?|go on|continue|keep going|"
+        r"tell me more(?: about (?:it|that|this))?|more|why|why is that|how so"
+        r")(?: please)?$"
+    )),
+)
+
+PROTOTYPES: Dict[str, List[str]] = {
+    "social": ["thank you so much", "hello there", "okay got it", "great, that was helpful", "bye for now"],
+    "rewrite": ["make it shorter", "can you put that in bullet points", "rewrite your answer more simply",
+                "summarize your last answer in one sentence", "translate that into Spanish"],
+    "clarify": ["explain that again", "I don't understand what you said", "can you repeat your answer",
+                "what did you mean by that", "say that in a different way"],
+    "followup": ["can you give me an example of that", "what about the second one",
+                 "how does that relate to the previous point", "and what is the difference between them",
+                 "can you elaborate on your answer", "tell me more about that"],
+    "broad": ["summarize the whole document", "give me an overview of these notes",
+              "what are the main topics covered in this chapter", "list all the key definitions"],
+    "knowledge": ["what is photosynthesis", "how does the TCP handshake work", "define opportunity cost",
+                  "what causes inflation according to the notes", "explain the steps of mitosis",
+                  "who proposed the theory of relativity", "when should I use a hash map"],
+}
+
+
+@dataclass
+class RetrievalPlan:
+    intent: str
+    source: str  # rule | embedding | default
+    top_k: int
+    # Embeddings of the queries, in order, when the router computed them
+    query_embedding: Optional[np.ndarray] = None
+
+    @property
+    def retrieve(self) -> bool:
+        return self.top_k > 0
+
+
+_prototypes: Optional[tuple] = None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+async def _prototype_matrix():
+    """(intent per row, L2-normalized prototype embeddings), embedded on first use."""
+    global _prototypes
+    if _prototypes is None:
+        labels = [intent for intent, examples in PROTOTYPES.items() for _ in examples]
+        texts = [text for examples in PROTOTYPES.values() for text in examples]
+        _prototypes = (labels, _normalize(np.asarray(await aencode(texts), dtype=np.float32)))
+    return _prototypes
+
+
+def _clean(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def match_rules(text: str) -> Optional[str]:
+    cleaned = _clean(text)
+    if not cleaned:
+        return "social"
+    for intent, pattern in RULES:
+        if pattern.search(cleaned):
+            return intent
+    return None
+
+
+def classify(labels: List[str], prototypes: np.ndarray, embedding: np.ndarray) -> Optional[str]:
+    """Nearest intent by best prototype, if it clears ROUTER_MIN_SIMILARITY and
+    beats the best retrieving intent by ROUTER_MARGIN."""
+    scores = prototypes @ _normalize(embedding.astype(np.float32))
+    best: Dict[str, float] = {}
+    for label, score in zip(labels, scores):
+        best[label] = max(best.get(label, -1.0), float(score))
+    intent = max(best, key=best.get)
+    if best[intent] < settings.ROUTER_MIN_SIMILARITY:
+        return None
+    if intent in SKIP_INTENTS:
+        rival = max(score for label, score in best.items() if label not in SKIP_INTENTS)
+        if best[intent] - rival < settings.ROUTER_MARGIN:
+            return None
+    return intent
+
+
+def _top_k(intent: str) -> int:
+    if intent in SKIP_INTENTS:
+        return 0
+    if intent == "followup":
+        return settings.ROUTER_FOLLOWUP_TOP_K
+    if intent == "broad":
+        return settings.ROUTER_BROAD_TOP_K
+    return settings.RETRIEVAL_TOP_K
+
+
+async def plan_retrieval(question: str, has_history: bool, queries: Optional[List[str]] = None) -> RetrievalPlan:
+    """Route one chat turn. `queries` (question first) are embedded in the same
+    batch when the classifier runs, for the search to reuse."""
+    if not settings.ROUTER_ENABLED:
+        return RetrievalPlan("knowledge", "default", settings.RETRIEVAL_TOP_K)
+
+    intent, source, embedding = match_rules(question), "rule", None
+    if intent is None and len(question.split()) <= settings.ROUTER_MAX_WORDS:
+        queries = queries or [question]
+        try:
+            async with span("routing"):
+                labels, prototypes = await _prototype_matrix()
+                embedding = await aencode(queries)
+            intent, source = classify(labels, prototypes, embedding[0]), "embedding"
+        except Exception as e:
+            logger.error("❌ [Router] Classifying the turn failed, retrieving: %s", e)
+            intent = None
+    if intent is None:
+        intent, source = "knowledge", "default"
+    if intent in HISTORY_INTENTS and not has_history:
+        # Nothing earlier to refer to: whatever it asks about is in the notes
+        intent = "knowledge"
+
+    plan = RetrievalPlan(intent, source, _top_k(intent), embedding)
+    ROUTES.inc(intent=intent, source=source)
+    log_sampled(logger, "chat.route", intent=intent, source=source, top_k=plan.top_k,
+                question_chars=len(question))
+    return plan
@@ -0,0 +1,210 @@
+"""
+Interview transcript persistence.
+
+The Vapi webhook only puts events on an in-memory queue; a single background
+task drains it and writes them in batches (one INSERT per flush), so webhook
+latency does not depend on the database or on how many calls are live.
+A batch is flushed when it reaches TRANSCRIPT_BATCH_SIZE events or when
+TRANSCRIPT_FLUSH_INTERVAL seconds have passed since its first event.
+A flush that fails on a lost connection is retried with backoff; one that
+fails on a constraint is written row by row, so one bad event does not cost
+the rest of the batch. Listeners (`add_listener`) are told which events were
+stored, e.g. so the webhook only treats a redelivery as a duplicate once the
+original is in the database.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError, IntegrityError, InterfaceError, OperationalError
+
+from app.config import settings
+from app.core.telemetry import Counter, Gauge, record_stage, registry
+from app.database import async_session_maker, insert_ignore
+from app.models.tables import InterviewTranscriptEvent, User
+
+logger = logging.getLogger("uvicorn.error")
+
+TRANSCRIPT_EVENTS = registry.register(Counter(
+    "prepai_transcript_events_total", "Interview transcript events by outcome.", ("outcome",)))
+TRANSCRIPT_QUEUE_DEPTH = registry.register(Gauge(
+    "prepai_transcript_queue_depth", "Transcript events waiting to be written."))
+
+_STOP = object()
+
+
+@dataclass
+class TranscriptEvent:
+    call_id: str
+    kind: str  # transcript | summary
+    role: str
+    content: str
+    user_id: Optional[int] = None
+    event_key: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, (OperationalError, InterfaceError)):
+        return True
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return isinstance(error, (ConnectionError, asyncio.TimeoutError))
+
+
+async def _null_unknown_users(db, rows: List[dict]):
+    """Store events of users deleted since the call was configured without an owner."""
+    ids = {r["user_id"] for r in rows if r["user_id"] is not None}
+    if not ids:
+        return
+    known = set((await db.execute(select(User.id).where(User.id.in_(ids)))).scalars())
+    unknown = [r for r in rows if r["user_id"] is not None and r["user_id"] not in known]
+    for row in unknown:
+        row["user_id"] = None
+    if unknown:
+        logger.warning("Storing %s transcript event(s) of unknown users without an owner", len(unknown))
+
+
+class TranscriptWriter:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[List[TranscriptEvent]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[TranscriptEvent]], None]):
+        """Called on the event loop with the events of each successful write."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _stored(self, events: List[TranscriptEvent]):
+        for listener in self._listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                logger.error("❌ Transcript listener %s failed: %s", getattr(listener, "__name__", listener), e)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.TRANSCRIPT_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run(), name="transcript-writer")
+
+    def submit(self, event: TranscriptEvent) -> bool:
+        """Never blocks; returns False if the event could not be queued."""
+        if self._queue is None:
+            TRANSCRIPT_EVENTS.inc(outcome="not_running")
+            logger.error("❌ Transcript writer not running, dropping event for call %s", event.call_id)
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            TRANSCRIPT_EVENTS.inc(outcome="dropped")
+            logger.warning("⚠️ Transcript queue full, dropping event for call %s", event.call_id)
+            return False
+        TRANSCRIPT_QUEUE_DEPTH.set(self._queue.qsize())
+        return True
+
+    async def _next_batch(self) -> Tuple[List[TranscriptEvent], bool]:
+        """Collect one batch; the flag is set once the stop sentinel is reached."""
+        item = await self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + settings.TRANSCRIPT_FLUSH_INTERVAL
+        while len(batch) < settings.TRANSCRIPT_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _flush(self, batch: List[TranscriptEvent]):
+        # Stable sort keeps arrival order within a call and writes each call's lines together
+        batch = sorted(batch, key=lambda e: e.call_id)
+        rows = [asdict(e) for e in batch]
+        start = time.perf_counter()
+        for attempt in range(settings.TRANSCRIPT_FLUSH_RETRIES + 1):
+            try:
+                async with async_session_maker() as db:
+                    await _null_unknown_users(db, rows)
+                    # Redelivered webhooks carry an event_key that is already stored
+                    await db.execute(insert_ignore(InterviewTranscriptEvent, ["event_key"]), rows)
+                    await db.commit()
+                TRANSCRIPT_EVENTS.inc(len(rows), outcome="written")
+                self._stored(batch)
+                break
+            except IntegrityError as e:
+                logger.warning("Transcript batch of %s rejected (%s), writing it row by row", len(rows), e)
+                await self._write_each(batch, rows)
+                break
+            except Exception as e:
+                if attempt < settings.TRANSCRIPT_FLUSH_RETRIES and _is_transient(e):
+                    delay = 0.5 * 2 ** attempt
+                    logger.warning("Transcript flush failed (%s), retrying in %.1fs", e, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                TRANSCRIPT_EVENTS.inc(len(rows), outcome="failed")
+                logger.error("❌ Failed to write %s transcript events: %s", len(rows), e)
+                break
+        record_stage("transcript_flush", time.perf_counter() - start)
+
+    async def _write_each(self, batch: List[TranscriptEvent], rows: List[dict]):
+        """Insert each row in its own savepoint and drop only the ones that are rejected."""
+        written = []
+        try:
+            async with async_session_maker() as db:
+                for event, row in zip(batch, rows):
+                    try:
+                        async with db.begin_nested():
+                            await db.execute(insert_ignore(InterviewTranscriptEvent, ["event_key"]), [row])
+                        written.append(event)
+                    except IntegrityError as e:
+                        TRANSCRIPT_EVENTS.inc(outcome="rejected")
+                        logger.error("❌ Dropping transcript event of call %s: %s", row["call_id"], e)
+                await db.commit()
+            TRANSCRIPT_EVENTS.inc(len(written), outcome="written")
+            self._stored(written)
+        except Exception as e:
+            TRANSCRIPT_EVENTS.inc(len(rows), outcome="failed")
+            logger.error("❌ Failed to write %s transcript events: %s", len(rows), e)
+
+    async def _run(self):
+        while True:
+            batch, stopping = await self._next_batch()
+            TRANSCRIPT_QUEUE_DEPTH.set(self._queue.qsize())
+            if batch:
+                await self._flush(batch)
+            if stopping:
+                return
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush everything queued so far, then stop the writer."""
+        if not self.running:
+            return
+        # Queued behind the pending events, so they are all written first
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Transcript writer did not flush within %ss, %s event(s) lost",
+                           timeout, self._queue.qsize())
+        self._task = None
+        self._queue = None
+        TRANSCRIPT_QUEUE_DEPTH.set(0)
+
+
+transcript_writer = TranscriptWriter()
@@ -0,0 +1,60 @@
+from typing import Optional
+from app.config import settings
+
+
+class VapiService:
+    """Thin wrapper around the Vapi server SDK used by the interview endpoints."""
+
+    def __init__(self, token: str):
+        self._token = token
+        self._client = None
+
+    @property
+    def client(self):
+        # The SDK is only imported and built when a call actually needs it
+        if self._client is None:
+            from vapi import Vapi
+            self._client = Vapi(token=self._token)
+        return self._client
+
+    def create_interview_assistant_config(
+        self,
+        candidate_name: str,
+        job_role: str,
+        experience: str,
+        difficulty: str = "Medium",
+    ) -> dict:
+        from app.api.v1.endpoints.prompts import Interviewer_prompt
+
+        system_prompt = Interviewer_prompt.format(
+            name=candidate_name,
+            job_role=job_role,
+            experience=experience,
+            level=difficulty,
+        )
+        return {
+            "name": f"{job_role} Interviewer",
+            "model": {
+                "provider": "openai",
+                "model": "gpt-4o",
+                "messages": [{"role": "system", "content": system_prompt}],
+            },
+            "firstMessage": f"Hi {candidate_name}, thanks for joining. Shall we begin?",
+            "metadata": {"user_name": candidate_name, "job_role": job_role},
+        }
+
+    def get_call_recording(self, call_id: str) -> Optional[dict]:
+        call = self.client.calls.get(id=call_id)
+        if call is None:
+            return None
+        artifact = getattr(call, "artifact", None)
+        return {
+            "call_id": call_id,
+            "status": getattr(call, "status", None),
+            "recording_url": getattr(artifact, "recording_url", None) or getattr(call, "recording_url", None),
+            "transcript": getattr(artifact, "transcript", None) or getattr(call, "transcript", None),
+            "summary": getattr(getattr(call, "analysis", None), "summary", None),
+        }
+
+
+vapi_service = VapiService(token=settings.VAPI_PRIVATE_KEY)
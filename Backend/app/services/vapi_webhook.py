@@ -0,0 +1,437 @@
+"""
+Fast-ack ingestion of Vapi webhook events.
+
+The webhook hands the raw request body to `vapi_ingestor.submit` and returns.
+Behind it:
+
+    submit ──> ingress queue (bounded) ──> dispatcher ──> shard queues ──> consumers
+       └─(queue full)─> spill file ──(replayed by the dispatcher once it catches up)─┘
+
+The dispatcher parses each body and routes it by call_id, so every call is
+handled by one consumer, in arrival order. While a spill file exists, new
+events are spilled as well, which keeps the order intact across the spill;
+spill lines are appended by a single writer task, in the order submit saw them.
+The owner of a call is looked up once per call from the InterviewSession named
+by the session_token in its metadata; ids in the payload are never trusted.
+Consumers drop retried deliveries by idempotency key (in memory here, and by a
+unique column in the transcript table across workers and restarts). A key is
+only remembered once the transcript writer reports its event as stored, so a
+redelivery of an event that was dropped or failed to write is processed again.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from app.config import settings
+from app.core.logs import log_payload
+from app.core.telemetry import Counter, Gauge, record_stage, registry
+from app.database import async_session_maker
+from app.models.tables import InterviewSession
+from app.services.transcript_store import TranscriptEvent, transcript_writer
+from app.services.interview_evaluation import EvaluationJob, evaluation_worker
+
+logger = logging.getLogger("uvicorn.error")
+
+WEBHOOK_EVENTS = registry.register(Counter(
+    "prepai_webhook_events_total", "Vapi webhook events by outcome.", ("outcome",)))
+WEBHOOK_QUEUE_DEPTH = registry.register(Gauge(
+    "prepai_webhook_queue_depth", "Vapi webhook events waiting to be processed."))
+
+_STOP = object()
+# Calls whose owner is kept per consumer; a call's events all go to the same one
+OWNER_CACHE_SIZE = 4096
+
+
+def call_context(payload: dict) -> Tuple[str, dict]:
+    """call_id and assistant metadata; Vapi nests them under "message" in newer payloads."""
+    message = payload.get("message", {})
+    call = payload.get("call") or message.get("call") or {}
+    assistant = payload.get("assistant") or message.get("assistant") or {}
+    metadata = assistant.get("metadata") or (call.get("assistantOverrides") or {}).get("metadata") or {}
+    return call.get("id", "unknown_call"), metadata
+
+
+async def resolve_owner(call_id: str, metadata: dict) -> Optional[int]:
+    """User who configured the call, from the server-side session its token names.
+
+    Binds the session to the first call that presents the token, so the
+    call_id -> user mapping is recorded in the database as well.
+    """
+    token = metadata.get("session_token")
+    if not isinstance(token, str) or not token:
+        return None
+    async with async_session_maker() as db:
+        session = await db.get(InterviewSession, token)
+        if session is None:
+            logger.warning("Webhook event for call %s names an unknown interview session", call_id)
+            return None
+        if session.call_id is None and call_id != "unknown_call":
+            session.call_id = call_id
+            await db.commit()
+        return session.user_id
+
+
+def event_key(call_id: str, message: dict) -> Optional[str]:
+    """Idempotency key of a delivery. Vapi retries resend the same message, so the
+    key is derived from its content and timestamp; one summary per call."""
+    kind = message.get("type")
+    if kind == "end-of-call-report":
+        parts = [call_id, kind]
+    elif message.get("timestamp") is not None:
+        parts = [call_id, kind, message.get("role"), str(message.get("timestamp")), message.get("transcript") or ""]
+    else:
+        # Without a timestamp two identical lines ("Yes.") are indistinguishable from a retry
+        return None
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def handle_event(call_id: str, payload: dict, key: Optional[str], user_id: Optional[int]):
+    """Turn one webhook event into stored transcript rows."""
+    message = payload.get("message", {})
+    _, metadata = call_context(payload)
+
+    if message.get("type") == "transcript" and message.get("transcriptType") == "final":
+        transcript_text = message.get('transcript') or ""
+        role = message.get('role', 'unknown')
+        queued = transcript_writer.submit(TranscriptEvent(
+            call_id=call_id, kind="transcript", role=role, content=transcript_text,
+            user_id=user_id, event_key=key
+        ))
+        if not queued:
+            raise RuntimeError("transcript writer did not accept the event")
+        log_payload(logger, f"🗣️ [Queued] {call_id} {role.upper()}", transcript_text)
+
+    elif message.get("type") == "end-of-call-report":
+        summary = message.get('summary', 'N/A')
+        queued = transcript_writer.submit(TranscriptEvent(
+            call_id=call_id, kind="summary", role="system", content=summary,
+            user_id=user_id, event_key=key
+        ))
+        logger.info("🏁 Call %s ended (user: %s)", call_id, metadata.get('user_name'))
+        log_payload(logger, f"Call {call_id} summary", summary)
+
+        evaluation_worker.enqueue(EvaluationJob(
+            call_id=call_id, user_id=user_id, job_role=metadata.get("job_role"),
+            experience=metadata.get("experience"), level=metadata.get("level"),
+        ))
+        if not queued:
+            raise RuntimeError("transcript writer did not accept the summary")
+
+
+class _RecentKeys:
+    """Bounded LRU set of idempotency keys."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key: str):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+
+
+class VapiIngestor:
+    def __init__(self):
+        self.handlers: List[Callable[[str, dict, Optional[str], Optional[int]], None]] = [handle_event]
+        self._ingress: Optional[asyncio.Queue] = None
+        self._shards: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._recent: List[_RecentKeys] = []
+        self._owners: List["OrderedDict[Tuple[str, str], Optional[int]]"] = []
+        self._spill_lock = threading.Lock()
+        self._spilling = False
+        self._spill_path = ""
+        self._spill_queue: Optional[asyncio.Queue] = None
+        self._spill_task: Optional[asyncio.Task] = None
+        self._spill_pending = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    # --- spill file -------------------------------------------------------
+
+    def _append_spill(self, bodies: List[bytes]):
+        now = time.time()
+        lines = "".join(
+            json.dumps({"received_at": now, "body": body.decode("utf-8", "replace")}) + "\n" for body in bodies
+        )
+        with self._spill_lock:
+            with open(self._spill_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    async def _spill(self, body: bytes):
+        """Hand the event to the spill writer; returns once it is on disk.
+
+        Concurrent to_thread appends could land in any order; one writer task
+        keeps the file in submit order (and batches what queued up meanwhile).
+        """
+        if self._spill_task is None or self._spill_task.done():
+            self._spill_queue = asyncio.Queue()
+            self._spill_task = asyncio.create_task(self._write_spills(), name="vapi-spill-writer")
+        # Set before the write so every later event spills behind this one
+        self._spilling = True
+        self._spill_pending += 1
+        written = asyncio.get_running_loop().create_future()
+        self._spill_queue.put_nowait((body, written))
+        # A client that disconnects must not cancel the write
+        await asyncio.shield(written)
+
+    async def _write_spills(self):
+        while True:
+            item = await self._spill_queue.get()
+            if item is _STOP:
+                return
+            items, stopping = [item], False
+            while not self._spill_queue.empty():
+                item = self._spill_queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                items.append(item)
+            try:
+                await asyncio.to_thread(self._append_spill, [body for body, _ in items])
+                error = None
+            except Exception as e:
+                logger.error("❌ Failed to spill %s webhook event(s): %s", len(items), e)
+                error = e
+            self._spill_pending -= len(items)
+            for _, written in items:
+                if written.done():
+                    continue
+                if error:
+                    written.set_exception(error)
+                else:
+                    written.set_result(None)
+            if stopping:
+                return
+
+    def _claim_spill(self) -> Optional[str]:
+        """Move the spill file aside for replay, or leave spill mode if there is none."""
+        with self._spill_lock:
+            if not os.path.exists(self._spill_path):
+                self._spilling = False
+                return None
+            claimed = f"{self._spill_path}.replay-{time.time_ns()}"
+            os.replace(self._spill_path, claimed)
+            return claimed
+
+    @staticmethod
+    def _read_spill(path: str) -> List[bytes]:
+        bodies = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    bodies.append(json.loads(line)["body"].encode("utf-8"))
+                except (ValueError, KeyError):
+                    WEBHOOK_EVENTS.inc(outcome="invalid")
+        return bodies
+
+    def _orphaned_spills(self) -> List[str]:
+        """Claim spill files left by workers that are no longer running (crash, restart)."""
+        orphans = []
+        paths = glob.glob(os.path.join(settings.WEBHOOK_SPILL_DIR, "webhook_spill.*.jsonl*"))
+        # A file already being replayed is older than a spill file of the same worker
+        for path in sorted(paths, key=lambda p: (".replay-" not in p, p)):
+            try:
+                pid = int(os.path.basename(path).split(".")[1])
+                if pid != os.getpid():
+                    os.kill(pid, 0)
+                    continue
+            except ProcessLookupError:
+                pass
+            except (ValueError, PermissionError):
+                continue
+            # Rename first so two workers starting together cannot both replay it
+            claimed = f"{self._spill_path}.replay-{time.time_ns()}"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            orphans.append(claimed)
+        return orphans
+
+    async def _replay(self, path: str):
+        bodies = await asyncio.to_thread(self._read_spill, path)
+        for body in bodies:
+            await self._route(body)
+        await asyncio.to_thread(os.remove, path)
+        logger.info("♻️ Replayed %s spilled webhook event(s)", len(bodies))
+
+    # --- pipeline ---------------------------------------------------------
+
+    def start(self):
+        if self.running:
+            return
+        os.makedirs(settings.WEBHOOK_SPILL_DIR, exist_ok=True)
+        self._spill_path = os.path.join(settings.WEBHOOK_SPILL_DIR, f"webhook_spill.{os.getpid()}.jsonl")
+        self._ingress = asyncio.Queue(maxsize=settings.WEBHOOK_QUEUE_SIZE)
+        shards = max(1, settings.WEBHOOK_CONSUMERS)
+        self._shards = [asyncio.Queue() for _ in range(shards)]
+        self._recent = [_RecentKeys(settings.WEBHOOK_DEDUPE_WINDOW // shards or 1) for _ in range(shards)]
+        self._owners = [OrderedDict() for _ in range(shards)]
+        self._tasks = [asyncio.create_task(self._dispatch(self._orphaned_spills()), name="vapi-dispatcher")]
+        self._tasks += [
+            asyncio.create_task(self._consume(i), name=f"vapi-consumer-{i}") for i in range(shards)
+        ]
+        transcript_writer.add_listener(self._remember_stored)
+
+    async def submit(self, body: bytes):
+        """Called by the webhook: O(1) unless the queue is full and the event is spilled."""
+        if self._ingress is None:
+            # Not started (e.g. lifespan disabled): keep the event on disk for the next start
+            WEBHOOK_EVENTS.inc(outcome="spilled")
+            self._spill_path = self._spill_path or os.path.join(
+                settings.WEBHOOK_SPILL_DIR, f"webhook_spill.{os.getpid()}.jsonl")
+            os.makedirs(settings.WEBHOOK_SPILL_DIR, exist_ok=True)
+            await self._spill(body)
+            return
+        if not self._spilling:
+            try:
+                self._ingress.put_nowait((time.perf_counter(), body))
+                WEBHOOK_EVENTS.inc(outcome="queued")
+                WEBHOOK_QUEUE_DEPTH.set(self._ingress.qsize())
+                return
+            except asyncio.QueueFull:
+                logger.warning("⚠️ Webhook queue full, spilling events to %s", self._spill_path)
+        WEBHOOK_EVENTS.inc(outcome="spilled")
+        await self._spill(body)
+
+    async def _route(self, body: bytes, received: Optional[float] = None):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            WEBHOOK_EVENTS.inc(outcome="invalid")
+            logger.warning("Ignoring webhook event that is not valid JSON")
+            return
+        call_id, _ = call_context(payload)
+        await self._shards[self._shard_of(call_id)].put((received, call_id, payload))
+
+    def _shard_of(self, call_id: str) -> int:
+        return zlib.crc32(call_id.encode("utf-8")) % len(self._shards)
+
+    async def _dispatch(self, leftovers: List[str]):
+        for path in leftovers:
+            await self._replay(path)
+        while True:
+            try:
+                item = await asyncio.wait_for(self._ingress.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                item = None
+            if item is _STOP:
+                return
+            if item is not None:
+                received, body = item
+                WEBHOOK_QUEUE_DEPTH.set(self._ingress.qsize())
+                await self._route(body, received)
+            # Only once the writer is idle: a claim before a pending line lands would reorder it
+            if self._spilling and self._ingress.empty() and not self._spill_pending:
+                claimed = self._claim_spill()
+                if claimed:
+                    await self._replay(claimed)
+
+    async def _owner(self, shard: int, call_id: str, payload: dict) -> Optional[int]:
+        _, metadata = call_context(payload)
+        owners = self._owners[shard]
+        cache_key = (call_id, str(metadata.get("session_token") or ""))
+        if cache_key in owners:
+            owners.move_to_end(cache_key)
+            return owners[cache_key]
+        try:
+            user_id = await resolve_owner(call_id, metadata)
+        except Exception as e:
+            # Not cached: the next event of the call tries again
+            logger.error("❌ Could not resolve the owner of call %s: %s", call_id, e)
+            return None
+        owners[cache_key] = user_id
+        if len(owners) > OWNER_CACHE_SIZE:
+            owners.popitem(last=False)
+        return user_id
+
+    def _remember_stored(self, events):
+        """Transcript writer listener: a key is a duplicate only once its event is in the database."""
+        if not self.running:
+            return
+        for event in events:
+            if event.event_key:
+                self._recent[self._shard_of(event.call_id)].add(event.event_key)
+
+    async def _consume(self, shard: int):
+        queue, recent = self._shards[shard], self._recent[shard]
+        while True:
+            item = await queue.get()
+            if item is _STOP:
+                return
+            received, call_id, payload = item
+            key = event_key(call_id, payload.get("message", {}))
+            if key and key in recent:
+                WEBHOOK_EVENTS.inc(outcome="duplicate")
+                continue
+            user_id = await self._owner(shard, call_id, payload)
+            failed = False
+            for handler in self.handlers:
+                try:
+                    handler(call_id, payload, key, user_id)
+                except Exception as e:
+                    failed = True
+                    logger.error("❌ Webhook handler %s failed for call %s: %s", handler.__name__, call_id, e)
+            WEBHOOK_EVENTS.inc(outcome="failed" if failed else "processed")
+            if received is not None:
+                record_stage("webhook_queue_wait", time.perf_counter() - received)
+
+    async def stop(self, timeout: float = 10.0):
+        """Process what is queued within the timeout; anything left is spilled for the next start."""
+        if not self.running:
+            return
+        dispatcher, consumers = self._tasks[0], self._tasks[1:]
+        await self._ingress.put(_STOP)
+        try:
+            await asyncio.wait_for(dispatcher, timeout)
+            for q in self._shards:
+                q.put_nowait(_STOP)
+            await asyncio.wait_for(asyncio.gather(*consumers), timeout)
+        except asyncio.TimeoutError:
+            for task in self._tasks:
+                task.cancel()
+            # Routed events are older than the ones still in the ingress queue
+            left = []
+            for q in self._shards:
+                while not q.empty():
+                    item = q.get_nowait()
+                    if item is not _STOP:
+                        left.append(json.dumps(item[2]).encode("utf-8"))
+            while not self._ingress.empty():
+                item = self._ingress.get_nowait()
+                if item is not _STOP:
+                    left.append(item[1])
+            if left:
+                self._append_spill(left)
+            logger.warning("Webhook ingestion stopped with %s event(s) spilled to disk", len(left))
+        if self._spill_task is not None and not self._spill_task.done():
+            self._spill_queue.put_nowait(_STOP)
+            try:
+                await asyncio.wait_for(self._spill_task, timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Webhook spill writer did not finish within %ss", timeout)
+        self._spill_task = None
+        self._tasks = []
+        self._ingress = None
+
+
+vapi_ingestor = VapiIngestor()
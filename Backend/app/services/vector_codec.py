@@ -0,0 +1,65 @@
+"""
+Binary encoding for document-level embeddings (PDFData.pdf_embedding).
+
+Layout: an 8-byte header `<B x H f>` (dtype code, pad, dimension, int8 scale)
+followed by the raw little-endian array. The header keeps the payload 8-byte
+aligned so float32 rows decode with np.frombuffer without copying.
+"""
+import struct
+from typing import Iterable, Optional
+
+import numpy as np
+
+HEADER = struct.Struct("<BxHf")
+
+DTYPES = {
+    "float32": (1, np.dtype("<f4")),
+    "float16": (2, np.dtype("<f2")),
+    "int8": (3, np.dtype("i1")),
+}
+_BY_CODE = {code: (name, dtype) for name, (code, dtype) in DTYPES.items()}
+
+
+def encode_vector(vector, dtype: str = "float32") -> bytes:
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype {dtype!r}, expected one of {list(DTYPES)}")
+    code, np_dtype = DTYPES[dtype]
+    v = np.asarray(vector, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == "int8":
+        # Symmetric per-vector quantization
+        peak = float(np.abs(v).max()) if v.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        v = np.round(v / scale)
+    return HEADER.pack(code, v.size, scale) + v.astype(np_dtype).tobytes()
+
+
+def decode_vector(blob: bytes) -> np.ndarray:
+    """Read-only view over the stored array (zero-copy for float32)."""
+    code, dim, scale = HEADER.unpack_from(blob)
+    _, np_dtype = _BY_CODE[code]
+    raw = np.frombuffer(blob, dtype=np_dtype, count=dim, offset=HEADER.size)
+    if np_dtype == np.float32:
+        return raw
+    out = raw.astype(np.float32)
+    if scale != 1.0:
+        out *= scale
+    return out
+
+
+def vector_dim(blob: bytes) -> int:
+    return HEADER.unpack_from(blob)[1]
+
+
+def decode_matrix(blobs: Iterable[Optional[bytes]], dim: Optional[int] = None) -> np.ndarray:
+    """Stack stored vectors into one (n, dim) float32 matrix; missing rows stay zero."""
+    blobs = list(blobs)
+    if dim is None:
+        dim = next((vector_dim(b) for b in blobs if b), 0)
+    matrix = np.zeros((len(blobs), dim), dtype=np.float32)
+    for row, blob in enumerate(blobs):
+        if blob:
+            vector = decode_vector(blob)
+            if vector.size == dim:
+                matrix[row] = vector
+    return matrix
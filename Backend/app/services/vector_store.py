@@ -0,0 +1,228 @@
+"""
+Managed access to the Chroma collection.
+
+`vector_store.collection` stands in for the chromadb Collection everywhere
+(add, upsert, update, get, query, delete, count). Behind it:
+
+- one AsyncHttpClient per worker, whose HTTP connection pool is shared by
+  every request; it is created on first use and recreated after a
+  connection failure, so a Chroma restart does not need an app restart
+- a timeout on every call (CHROMA_TIMEOUT; CHROMA_WRITE_TIMEOUT for add, upsert,
+  update and delete, which index and can be slow on a healthy server) and on
+  connecting (CHROMA_CONNECT_TIMEOUT)
+- a circuit breaker: after CHROMA_BREAKER_THRESHOLD consecutive failures,
+  calls fail immediately for CHROMA_BREAKER_RESET seconds; then one probe
+  call is let through and closes the breaker again if it succeeds
+
+Connection problems, timeouts and an open breaker all surface as
+VectorStoreUnavailable. Chat degrades to answering without retrieved notes;
+endpoints that cannot work without the store answer 503 (see app/main.py).
+Errors Chroma returns for a bad request pass through unchanged and do not
+count against the breaker, and neither do write timeouts: a slow write is
+load on a store that is up, and tripping the breaker would fail reads too.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from app.config import settings
+from app.core.telemetry import Counter, Gauge, record_stage, registry
+
+logger = logging.getLogger("uvicorn.error")
+
+VECTOR_STORE_CALLS = registry.register(Counter(
+    "prepai_vector_store_calls_total", "Vector store calls by operation and outcome.", ("op", "outcome")))
+VECTOR_STORE_STATE = registry.register(Gauge(
+    "prepai_vector_store_breaker_state", "Vector store circuit breaker: 0 closed, 1 half-open, 2 open."))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Failures that say nothing about the request itself, only about reaching Chroma
+TRANSIENT_ERRORS = (asyncio.TimeoutError, OSError, httpx.TransportError)
+WRITE_OPS = frozenset({"add", "upsert", "update", "delete"})
+
+
+# Set on responses produced without the vector store (e.g. chat answered without notes)
+DEGRADED_HEADERS = {"X-Degraded": "vector-store"}
+
+
+class VectorStoreUnavailable(Exception):
+    """Chroma could not be reached, timed out, or the breaker is open."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = max(1, threshold)
+        self.reset_after = reset_after
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._probing = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def before_call(self):
+        """Raise if the call should not be attempted; otherwise let it through."""
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                raise VectorStoreUnavailable("Vector store circuit open", self.retry_after())
+            self._set(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing:
+                raise VectorStoreUnavailable("Vector store recovering", 1.0)
+            self._probing = True
+
+    def end_probe(self):
+        self._probing = False
+
+    def success(self):
+        self._probing = False
+        self.failures = 0
+        if self.state != CLOSED:
+            logger.info("✅ Vector store reachable again, closing circuit")
+            self._set(CLOSED)
+
+    def failure(self, error: BaseException):
+        self._probing = False
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state != OPEN:
+                logger.error("❌ Vector store failing (%s), opening circuit for %ss", self.last_error, self.reset_after)
+            self.opened_at = time.monotonic()
+            self._set(OPEN)
+
+    def _set(self, state: str):
+        self.state = state
+        VECTOR_STORE_STATE.set(_STATE_VALUES[state])
+
+
+class ManagedCollection:
+    """The subset of the chromadb Collection API the app uses, routed through VectorStore."""
+
+    def __init__(self, store: "VectorStore"):
+        self._store = store
+
+    async def add(self, **kwargs):
+        return await self._store.call("add", **kwargs)
+
+    async def upsert(self, **kwargs):
+        return await self._store.call("upsert", **kwargs)
+
+    async def update(self, **kwargs):
+        return await self._store.call("update", **kwargs)
+
+    async def get(self, **kwargs):
+        return await self._store.call("get", **kwargs)
+
+    async def query(self, **kwargs):
+        return await self._store.call("query", **kwargs)
+
+    async def delete(self, **kwargs):
+        return await self._store.call("delete", **kwargs)
+
+    async def count(self) -> int:
+        return await self._store.call("count")
+
+
+class VectorStore:
+    def __init__(self, connect: Optional[Callable[[], Awaitable[Any]]] = None):
+        self._connect_fn = connect or self._connect_chroma
+        self._client = None
+        self._collection = None
+        self._lock = asyncio.Lock()
+        self.breaker = CircuitBreaker(settings.CHROMA_BREAKER_THRESHOLD, settings.CHROMA_BREAKER_RESET)
+        self.collection = ManagedCollection(self)
+
+    @property
+    def connected(self) -> bool:
+        return self._collection is not None
+
+    async def _connect_chroma(self):
+        import chromadb
+
+        self._client = await chromadb.AsyncHttpClient(host=settings.chroma_host, port=settings.chroma_port)
+        return await self._client.get_or_create_collection(settings.chroma_collection)
+
+    async def _ensure_collection(self):
+        if self._collection is not None:
+            return self._collection
+        async with self._lock:
+            if self._collection is None:
+                self._collection = await asyncio.wait_for(self._connect_fn(), settings.CHROMA_CONNECT_TIMEOUT)
+                logger.info("🔌 Connected to vector store collection '%s'", settings.chroma_collection)
+        return self._collection
+
+    async def client(self):
+        """The raw chromadb client, connecting first if needed (bypasses the breaker)."""
+        await self._ensure_collection()
+        return self._client
+
+    def disconnect(self):
+        self._client = None
+        self._collection = None
+
+    async def connect(self) -> bool:
+        """Eager connect at startup; failing here is fine, calls reconnect lazily."""
+        try:
+            count = await self.collection.count()
+        except Exception as e:
+            logger.error("Vector store not reachable at startup (%s), will reconnect on first use", e)
+            return False
+        logger.info("Successfully loaded collection '%s' with %s documents.", settings.chroma_collection, count)
+        return True
+
+    async def call(self, op: str, **kwargs):
+        self.breaker.before_call()
+        write = op in WRITE_OPS
+        timeout = settings.CHROMA_WRITE_TIMEOUT if write else settings.CHROMA_TIMEOUT
+        start = time.perf_counter()
+        try:
+            try:
+                collection = await self._ensure_collection()
+            except Exception as e:
+                # chromadb reports an unreachable server as ValueError, among others
+                raise ConnectionError(str(e)) from e
+            result = await asyncio.wait_for(getattr(collection, op)(**kwargs), timeout)
+        except TRANSIENT_ERRORS as e:
+            if write and isinstance(e, (asyncio.TimeoutError, httpx.ReadTimeout)):
+                # A slow write on a store that is up: keep the connection, leave the breaker alone
+                self.breaker.end_probe()
+                VECTOR_STORE_CALLS.inc(op=op, outcome="timeout")
+                raise VectorStoreUnavailable(f"Vector store {op} timed out after {timeout}s", 1.0) from e
+            # The client may be holding dead connections: start over on the next call
+            self.disconnect()
+            self.breaker.failure(e)
+            VECTOR_STORE_CALLS.inc(op=op, outcome="unavailable")
+            raise VectorStoreUnavailable(f"Vector store {op} failed: {e}", self.breaker.retry_after() or 1.0) from e
+        except BaseException:
+            # The store answered (or the caller went away): not a health signal
+            self.breaker.end_probe()
+            VECTOR_STORE_CALLS.inc(op=op, outcome="error")
+            raise
+        self.breaker.success()
+        VECTOR_STORE_CALLS.inc(op=op, outcome="ok")
+        record_stage(f"vector_{op}", time.perf_counter() - start)
+        return result
+
+    def health(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "connected": self.connected,
+            "consecutive_failures": self.breaker.failures,
+            "retry_after": round(self.breaker.retry_after(), 1) if self.breaker.state == OPEN else 0,
+            "last_error": self.breaker.last_error,
+        }
+
+
+vector_store = VectorStore()
@@ -0,0 +1,108 @@
+"""
+Checks that an alternative embedding backend stays in the reference vector space.
+
+    python -m benchmarks.embedding_parity --backends onnx onnx-int8
+    python -m benchmarks.embedding_parity --pdf notes.pdf --min-cosine 0.99
+
+Every backend embeds the same chunks as the torch reference. The report shows
+the cosine similarity between matching vectors and how much the top-k
+neighbours of each query agree with the reference. The exit status is 1 if any
+backend is under --min-cosine or --min-overlap. Such a backend cannot serve a
+collection indexed with the reference model; the collection must be
+re-indexed first.
+"""
+import argparse
+import sys
+from typing import List
+
+import numpy as np
+
+from app.config import settings
+from app.services.embeddings import load_model
+
+SAMPLE_CHUNKS = [
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "The mitochondria is the site of aerobic respiration and ATP production.",
+    "A binary search tree keeps keys ordered so lookups take logarithmic time.",
+    "Dynamic programming solves problems by caching the answers to overlapping subproblems.",
+    "Newton's second law states that force equals mass times acceleration.",
+    "The French Revolution began in 1789 and abolished the absolute monarchy.",
+    "Supply and demand curves intersect at the market equilibrium price.",
+    "TCP guarantees ordered delivery using sequence numbers and acknowledgements.",
+    "An enzyme lowers the activation energy of a reaction without being consumed.",
+    "Gradient descent updates parameters in the direction of the negative gradient.",
+    "The Treaty of Versailles formally ended the First World War in 1919.",
+    "Ohm's law relates voltage, current and resistance in an electrical circuit.",
+]
+
+SAMPLE_QUERIES = [
+    "how do plants make energy",
+    "what does ATP have to do with cells",
+    "fast lookup in sorted data",
+    "memoization technique",
+    "force and acceleration",
+    "causes of the french revolution",
+    "market price equilibrium",
+    "reliable network transport",
+]
+
+
+def pdf_chunks(path: str, limit: int) -> List[str]:
+    from app.services.chunking import get_chunker
+    from app.services.pdf_ingest import chunk_pages, iter_pdf_pages
+
+    chunks = chunk_pages(list(iter_pdf_pages(path)), get_chunker())
+    return [c.text for c in chunks][:limit]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(queries: np.ndarray, docs: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"])
+    parser.add_argument("--pdf", help="use chunks of this PDF instead of the built-in sample")
+    parser.add_argument("--limit", type=int, default=500, help="max PDF chunks to embed")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    args = parser.parse_args()
+
+    chunks = pdf_chunks(args.pdf, args.limit) if args.pdf else SAMPLE_CHUNKS
+    queries = SAMPLE_QUERIES
+    k = min(args.k, len(chunks))
+
+    reference = load_model("torch")
+    ref_docs = normalize(reference.encode(chunks))
+    ref_queries = normalize(reference.encode(queries))
+    ref_top = top_k(ref_queries, ref_docs, k)
+    print(f"{len(chunks)} chunks, {len(queries)} queries, model {settings.EMBEDDING_MODEL}")
+
+    failed = False
+    for backend in args.backends:
+        model = load_model(backend)
+        docs = normalize(model.encode(chunks))
+        cand_queries = normalize(model.encode(queries))
+        cosine = np.sum(docs * ref_docs, axis=1)
+        # Candidate query against reference index: the mixed case while re-indexing
+        overlap = np.mean([
+            len(set(a) & set(b)) / k
+            for a, b in zip(top_k(cand_queries, ref_docs, k), ref_top)
+        ])
+        ok = cosine.min() >= args.min_cosine and overlap >= args.min_overlap
+        failed |= not ok
+        print(f"{backend:>10}: cosine mean {cosine.mean():.4f} min {cosine.min():.4f}  "
+              f"top-{k} overlap {overlap:.2%}  {'OK' if ok else 'FAIL (re-index before switching)'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
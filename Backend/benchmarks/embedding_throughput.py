@@ -0,0 +1,75 @@
+"""
+Embedding throughput by backend and batch size.
+
+    python -m benchmarks.embedding_throughput --backends torch onnx onnx-int8
+    python -m benchmarks.embedding_throughput --threads 1 --batch-sizes 16 32 64
+
+Chunks are CHUNK_SIZE characters of prose, like the ones ingestion produces.
+The output is chunks/sec, plus chunks/sec per core with --threads pinning the
+torch / ONNX Runtime thread pools. The fastest batch size per backend is
+marked and printed as the EMBEDDING_BATCH_SIZE to set for this machine type
+(a larger size has to be 5% faster to win, as in embeddings.autotune_batch_size).
+"""
+import argparse
+import os
+import time
+
+from app.config import settings
+from app.services.embeddings import BATCH_CANDIDATES, load_model
+
+SENTENCE = ("Cellular respiration breaks glucose down into carbon dioxide and water, "
+            "releasing energy that the cell stores as ATP. ")
+
+
+def pin_threads(threads: int):
+    # Both runtimes read these when their thread pools are created
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+
+def chunks_per_sec(model, chunks, batch_size: int, repeats: int) -> float:
+    model.encode(chunks[:batch_size], batch_size=batch_size)  # warm up this shape
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.encode(chunks, batch_size=batch_size)
+        best = max(best, len(chunks) / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_CANDIDATES))
+    parser.add_argument("--chunks", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None, help="threads per runtime (default: all cores)")
+    args = parser.parse_args()
+
+    if args.threads:
+        pin_threads(args.threads)
+    cores = args.threads or os.cpu_count() or 1
+
+    text = (SENTENCE * (settings.CHUNK_SIZE // len(SENTENCE) + 1))[:settings.CHUNK_SIZE]
+    chunks = [f"{i}. {text}" for i in range(args.chunks)]
+
+    print(f"{args.chunks} chunks of {settings.CHUNK_SIZE} chars, {cores} core(s), model {settings.EMBEDDING_MODEL}")
+    print(f"{'backend':>10}  {'batch':>5}  {'chunks/s':>9}  {'per core':>9}")
+    for backend in args.backends:
+        model = load_model(backend)
+        rates = {batch_size: chunks_per_sec(model, chunks, batch_size, args.repeats)
+                 for batch_size in sorted(args.batch_sizes)}
+        best, best_rate = None, 0.0
+        for batch_size, rate in rates.items():
+            if rate > best_rate * 1.05:
+                best, best_rate = batch_size, rate
+        for batch_size, rate in rates.items():
+            marker = "  <- best" if batch_size == best else ""
+            print(f"{backend:>10}  {batch_size:>5}  {rate:>9.1f}  {rate / cores:>9.1f}{marker}")
+        print(f"{backend:>10}  EMBEDDING_BATCH_SIZE={best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Throughput of the post-interview evaluation worker against the mock LLM.
+
+    python -m benchmarks.evaluation --calls 100 --concurrency 8 --rpm 600
+    python -m benchmarks.evaluation --calls 40 --ttft-ms 2000 --rpm 60
+
+Seeds --calls finished interview transcripts into a throwaway SQLite database,
+queues them all, and runs app.services.interview_evaluation with the given
+throughput controls until every call has an evaluation. Reports evaluations/sec,
+per-call latency, and how many ended in each status.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from benchmarks.harness import configure_environment, free_port, start_mock_llm
+
+LINES = [
+    ("assistant", "Give me a brief overview of your background."),
+    ("user", "I have four years of backend work, mostly Python services and data pipelines."),
+    ("assistant", "Pick one project you're proud of and walk me through it."),
+    ("user", "I rebuilt our ingestion pipeline with async workers, which cut processing time by 60 percent."),
+    ("assistant", "How would you debug a memory leak in a long-running service?"),
+    ("user", "Take heap snapshots over time, diff them, and look for objects that only ever grow."),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4, help="EVALUATION_CONCURRENCY")
+    parser.add_argument("--rpm", type=int, default=600, help="EVALUATION_RPM")
+    parser.add_argument("--batch-size", type=int, default=8, help="EVALUATION_BATCH_SIZE")
+    parser.add_argument("--batch-wait", type=float, default=0.2, help="EVALUATION_BATCH_WAIT")
+    parser.add_argument("--ttft-ms", type=float, default=500)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--output-tokens", type=int, default=150)
+    args = parser.parse_args()
+
+    llm_port = free_port()
+    configure_environment(None, llm_port)
+    os.environ.update({
+        "EVALUATION_CONCURRENCY": str(args.concurrency),
+        "EVALUATION_RPM": str(args.rpm),
+        "EVALUATION_BATCH_SIZE": str(args.batch_size),
+        "EVALUATION_BATCH_WAIT": str(args.batch_wait),
+        "EVALUATION_SWEEP_INTERVAL": "3600",
+    })
+    llm_proc = start_mock_llm(llm_port, args.ttft_ms, args.tokens_per_sec, args.output_tokens)
+
+    from sqlalchemy import func, insert, select
+
+    from app.database import Base, async_session_maker, engine
+    from app.models.tables import InterviewEvaluation, InterviewTranscriptEvent
+    from app.services.interview_evaluation import EvaluationJob, EvaluationWorker
+
+    async def run():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        call_ids = [f"bench-call-{i}" for i in range(args.calls)]
+        async with async_session_maker() as db:
+            await db.execute(insert(InterviewTranscriptEvent), [
+                {"call_id": c, "kind": "transcript", "role": role, "content": text}
+                for c in call_ids for role, text in LINES
+            ])
+            await db.commit()
+
+        worker = EvaluationWorker()
+        worker.start()
+        start = time.perf_counter()
+        for call_id in call_ids:
+            worker.enqueue(EvaluationJob(call_id=call_id, job_role="Backend Engineer", experience="4", level="Medium"))
+
+        while True:
+            async with async_session_maker() as db:
+                pending = await db.scalar(
+                    select(func.count(InterviewEvaluation.id)).where(InterviewEvaluation.status == "pending"))
+                total = await db.scalar(select(func.count(InterviewEvaluation.id)))
+            if total == args.calls and not pending:
+                break
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - start
+        await worker.stop()
+
+        async with async_session_maker() as db:
+            rows = (await db.execute(
+                select(InterviewEvaluation.status, InterviewEvaluation.created_at, InterviewEvaluation.completed_at)
+            )).all()
+        latencies = [(done - created).total_seconds() for _, created, done in rows if done]
+        statuses = {}
+        for status, _, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+
+        print(f"{args.calls} calls in {elapsed:.2f}s -> {args.calls / elapsed:.2f} evaluations/s "
+              f"(concurrency {args.concurrency}, {args.rpm} rpm)")
+        if latencies:
+            print(f"claim-to-done latency: p50 {np.percentile(latencies, 50):.2f}s  "
+                  f"p95 {np.percentile(latencies, 95):.2f}s  max {max(latencies):.2f}s")
+        print("statuses:", statuses)
+
+    try:
+        asyncio.run(run())
+    finally:
+        llm_proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Boots the backend in-process against local fakes and collects latency stats.
+
+The app runs under a real uvicorn server in its own thread (so streaming and
+time-to-first-token are measured over HTTP), the mock LLM runs as a subprocess,
+the database is SQLite unless --database-url says otherwise, and Chroma is
+replaced by benchmarks.vector_store.InProcessCollection.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def configure_environment(database_url: Optional[str], llm_port: int):
+    """Must run before anything imports app.config."""
+    workdir = tempfile.mkdtemp(prefix="prepai-bench-")
+    # Never fall through to a DATABASE_URL from the shell: that is usually the dev database
+    os.environ["DATABASE_URL"] = database_url or f"sqlite+aiosqlite:///{workdir}/bench.db"
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{llm_port}/v1"
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("GROQ_API_KEY", "bench-key")
+    os.environ.setdefault("VAPI_PRIVATE_KEY", "bench")
+    os.environ.setdefault("VAPI_PUBLIC_KEY", "bench")
+    os.environ.setdefault("VAPI_WEBHOOK_SECRET", "bench-webhook")
+    os.environ.setdefault("chroma_host", "127.0.0.1")
+    os.environ.setdefault("chroma_port", "1")
+    os.environ.setdefault("chroma_collection", "bench")
+    # Every scenario runs as one user, which per-user admission control would throttle;
+    # run with ADMISSION_ENABLED=true to measure admission itself
+    os.environ.setdefault("ADMISSION_ENABLED", "false")
+    return workdir
+
+
+def start_mock_llm(port: int, ttft_ms: float, tokens_per_sec: float, output_tokens: int) -> subprocess.Popen:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.mock_llm",
+            "--port", str(port),
+            "--ttft-ms", str(ttft_ms),
+            "--tokens-per-sec", str(tokens_per_sec),
+            "--output-tokens", str(output_tokens),
+        ],
+        cwd=backend_dir,
+    )
+    wait_for_port(port)
+    return proc
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    ok: bool
+    latency: float
+    ttft: Optional[float] = None
+
+
+@dataclass
+class Recorder:
+    samples: List[Sample] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    def add(self, endpoint: str, ok: bool, latency: float, ttft: Optional[float] = None):
+        self.samples.append(Sample(endpoint, ok, latency, ttft))
+
+    def summary(self, loop_lag: List[float]) -> Dict[str, dict]:
+        elapsed = time.perf_counter() - self.started
+        by_endpoint: Dict[str, List[Sample]] = {}
+        for s in self.samples:
+            by_endpoint.setdefault(s.endpoint, []).append(s)
+
+        def pct(values, q):
+            return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+        out = {}
+        for endpoint, samples in by_endpoint.items():
+            lat = [s.latency for s in samples if s.ok]
+            ttft = [s.ttft for s in samples if s.ok and s.ttft is not None]
+            out[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(not s.ok for s in samples),
+                "throughput_rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": pct(lat, 50),
+                "p95_ms": pct(lat, 95),
+                "p99_ms": pct(lat, 99),
+                "ttft_p50_ms": pct(ttft, 50),
+                "ttft_p95_ms": pct(ttft, 95),
+                "ttft_p99_ms": pct(ttft, 99),
+            }
+        out["event_loop_lag"] = {
+            "p50_ms": pct(loop_lag, 50),
+            "p99_ms": pct(loop_lag, 99),
+            "max_ms": round(max(loop_lag) * 1000, 1) if loop_lag else None,
+        }
+        return out
+
+
+class AppServer:
+    """Runs the FastAPI app under uvicorn in a background thread with its own loop."""
+
+    def __init__(self, app, port: int, lag_interval: float = 0.01):
+        self.app = app
+        self.port = port
+        self.lag_interval = lag_interval
+        self.loop_lag: List[float] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def _monitor_loop_lag(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - start - self.lag_interval))
+
+    def _run(self, setup):
+        import uvicorn
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, lifespan="off", log_level="warning")
+        self._server = uvicorn.Server(config)
+        self.loop.run_until_complete(setup())
+        self.loop.create_task(self._monitor_loop_lag())
+        self.loop.run_until_complete(self._server.serve())
+
+    def start(self, setup):
+        self._thread = threading.Thread(target=self._run, args=(setup,), daemon=True)
+        self._thread.start()
+        wait_for_port(self.port)
+
+    def reset_lag(self):
+        self.loop_lag = []
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
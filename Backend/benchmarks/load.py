@@ -0,0 +1,313 @@
+"""
+Offline load scenarios for the backend.
+
+    python -m benchmarks.load --scenario all --requests 40 --concurrency 8
+    python -m benchmarks.load --scenario chat --ttft-ms 500 --json results.json
+    python -m benchmarks.load --scenario session --vector-latency-ms 20 --baseline before.json
+
+Scenarios:
+    upload  - burst of concurrent /notes/upload_notes with generated PDFs
+    chat    - concurrent /notes/stream_chat streams
+    session - concurrent /notes/chat/{session_id} streams (with history)
+    quiz    - quiz storm on /quiz/resume and /quiz/notes
+    mixed   - quiz storm and chat streams at the same time (LLM scheduling)
+    webhook - bursts of Vapi transcript events (with retried duplicates)
+
+Reports p50/p95/p99 latency, time-to-first-token, throughput and event-loop lag
+of the app server per scenario. Needs the extra packages in
+benchmarks/requirements.txt and a locally cached embedding model.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict
+
+import httpx
+
+from benchmarks.harness import (
+    AppServer, Recorder, configure_environment, free_port, start_mock_llm
+)
+
+API = "/api/v1"
+
+NOTE_TEXT = (
+    "Photosynthesis converts light energy into chemical energy. The light reactions "
+    "take place in the thylakoid membranes and produce ATP and NADPH. The Calvin cycle "
+    "uses that energy to fix carbon dioxide into sugars in the stroma. "
+)
+
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), f"Chapter {i + 1}\n" + NOTE_TEXT * 12, fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def timed(rec: Recorder, name: str, coro_factory: Callable):
+    start = time.perf_counter()
+    try:
+        resp = await coro_factory()
+        ok = resp.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    rec.add(name, ok, time.perf_counter() - start)
+
+
+async def timed_stream(rec: Recorder, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    ttft, ok = None, False
+    try:
+        async with client.stream(method, url, **kwargs) as resp:
+            async for chunk in resp.aiter_bytes():
+                if ttft is None and chunk:
+                    ttft = time.perf_counter() - start
+            ok = resp.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    rec.add(name, ok, time.perf_counter() - start, ttft)
+
+
+async def run_concurrently(n: int, concurrency: int, job: Callable):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await job(i)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def login(client: httpx.AsyncClient) -> Dict[str, str]:
+    name = f"bench{uuid.uuid4().hex[:8]}"
+    email = f"{name}@example.com"
+    await client.post(f"{API}/auth/register", json={"username": name, "email": email, "password": "benchpass"})
+    resp = await client.post(f"{API}/auth/login", json={"email": email, "password": "benchpass"})
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def upload_one(client, headers, pages: int) -> int:
+    files = {"file": (f"notes-{uuid.uuid4().hex[:6]}.pdf", make_pdf(pages), "application/pdf")}
+    resp = await client.post(f"{API}/notes/upload_notes", files=files, headers=headers)
+    resp.raise_for_status()
+    return resp.json()["doc_id"]
+
+
+async def scenario_upload(client, headers, args, rec: Recorder):
+    pdf = make_pdf(args.pages)
+
+    async def job(i):
+        files = {"file": (f"burst-{i}.pdf", pdf, "application/pdf")}
+        await timed(rec, "POST /notes/upload_notes",
+                    lambda: client.post(f"{API}/notes/upload_notes", files=files, headers=headers))
+
+    await run_concurrently(args.requests, args.concurrency, job)
+
+
+async def scenario_chat(client, headers, args, rec: Recorder):
+    async def job(i):
+        body = {
+            "messages": [{"role": "user", "content": f"Explain the Calvin cycle ({i})"}],
+            "context": NOTE_TEXT * 20,
+        }
+        await timed_stream(rec, client, "POST /notes/stream_chat", "POST",
+                           f"{API}/notes/stream_chat", json=body, headers=headers)
+
+    await run_concurrently(args.requests, args.concurrency, job)
+
+
+async def scenario_session(client, headers, args, rec: Recorder):
+    pdf_id = await upload_one(client, headers, args.pages)
+    sessions = []
+    for _ in range(args.concurrency):
+        resp = await client.post(f"{API}/notes/sessions", json={"pdf_id": pdf_id, "name": "bench"}, headers=headers)
+        resp.raise_for_status()
+        sessions.append(resp.json()["id"])
+
+    async def job(i):
+        session_id = sessions[i % len(sessions)]
+        await timed_stream(rec, client, "POST /notes/chat/{session_id}", "POST",
+                           f"{API}/notes/chat/{session_id}",
+                           params={"user_prompt": f"What happens in the stroma? ({i})"}, headers=headers)
+
+    await run_concurrently(args.requests, args.concurrency, job)
+
+
+async def scenario_quiz(client, headers, args, rec: Recorder):
+    await upload_one(client, headers, args.pages)
+    resume = "Skills: Python, FastAPI, PostgreSQL, Docker. Experience: built RAG pipelines. " * 10
+
+    async def job(i):
+        if i % 2:
+            body = {"parsed_doc": resume, "user_prompt": "Quiz me on my backend skills"}
+            await timed(rec, "POST /quiz/resume",
+                        lambda: client.post(f"{API}/quiz/resume", json=body, headers=headers))
+        else:
+            body = {"parsed_doc": NOTE_TEXT * 10, "user_prompt": "Quiz me on photosynthesis"}
+            await timed(rec, "POST /quiz/notes",
+                        lambda: client.post(f"{API}/quiz/notes", json=body, headers=headers))
+
+    await run_concurrently(args.requests, args.concurrency, job)
+
+
+async def scenario_mixed(client, headers, args, rec: Recorder):
+    # A quiz storm running while users chat: chat TTFT should hold while quizzes queue
+    await upload_one(client, headers, args.pages)
+    resume = "Skills: Python, FastAPI, PostgreSQL, Docker. Experience: built RAG pipelines. " * 10
+
+    async def quiz(i):
+        body = {"parsed_doc": resume, "user_prompt": "Quiz me on my backend skills"}
+        await timed(rec, "POST /quiz/resume",
+                    lambda: client.post(f"{API}/quiz/resume", json=body, headers=headers))
+
+    async def chat(i):
+        body = {
+            "messages": [{"role": "user", "content": f"Explain the Calvin cycle ({i})"}],
+            "context": NOTE_TEXT * 20,
+        }
+        await timed_stream(rec, client, "POST /notes/stream_chat", "POST",
+                           f"{API}/notes/stream_chat", json=body, headers=headers)
+
+    await asyncio.gather(
+        run_concurrently(args.requests * 2, args.concurrency * 2, quiz),
+        run_concurrently(args.requests, args.concurrency, chat),
+    )
+
+
+async def scenario_webhook(client, headers, args, rec: Recorder):
+    # Many interviews talking at once, each event delivered twice (Vapi retries)
+    calls = [f"bench-call-{uuid.uuid4().hex[:8]}" for _ in range(max(1, args.concurrency))]
+    vapi_headers = {"X-Vapi-Secret": os.environ["VAPI_WEBHOOK_SECRET"]}
+
+    async def job(i):
+        call_id = calls[i % len(calls)]
+        body = {
+            "message": {
+                "type": "transcript", "transcriptType": "final", "role": "user" if i % 2 else "assistant",
+                "transcript": f"Line {i} of the interview about distributed systems.", "timestamp": i,
+                "call": {"id": call_id},
+            }
+        }
+        for _ in range(2):
+            await timed(rec, "POST /interview/api/webhook",
+                        lambda: client.post(f"{API}/interview/api/webhook", json=body, headers=vapi_headers))
+
+    await run_concurrently(args.requests * 10, args.concurrency * 4, job)
+
+
+SCENARIOS = {
+    "upload": scenario_upload,
+    "chat": scenario_chat,
+    "session": scenario_session,
+    "quiz": scenario_quiz,
+    "mixed": scenario_mixed,
+    "webhook": scenario_webhook,
+}
+
+
+def print_report(name: str, summary: dict):
+    print(f"\n=== {name} ===")
+    header = f"{'endpoint':34} {'n':>5} {'err':>4} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft50':>8} {'ttft99':>8}"
+    print(header)
+    for endpoint, s in summary.items():
+        if endpoint == "event_loop_lag":
+            continue
+        print(f"{endpoint:34} {s['requests']:>5} {s['errors']:>4} {s['throughput_rps']:>7} "
+              f"{s['p50_ms'] or '-':>8} {s['p95_ms'] or '-':>8} {s['p99_ms'] or '-':>8} "
+              f"{s['ttft_p50_ms'] or '-':>8} {s['ttft_p99_ms'] or '-':>8}")
+    lag = summary["event_loop_lag"]
+    print(f"event loop lag (ms): p50={lag['p50_ms']} p99={lag['p99_ms']} max={lag['max_ms']}")
+
+
+def print_comparison(name: str, summary: dict, baseline: dict):
+    """Latency / TTFT deltas against a previous --json run of the same scenario."""
+    print(f"--- {name} vs baseline ---")
+    for endpoint, s in summary.items():
+        before = baseline.get(endpoint)
+        if endpoint == "event_loop_lag" or not before:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p99_ms", "ttft_p50_ms", "ttft_p99_ms"):
+            if s.get(key) is not None and before.get(key):
+                deltas.append(f"{key[:-3]} {before[key]} -> {s[key]} ({(s[key] - before[key]) / before[key]:+.0%})")
+        print(f"{endpoint:34} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=20, help="pages per generated PDF")
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--output-tokens", type=int, default=120)
+    parser.add_argument("--vector-latency-ms", type=float, default=2.0)
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway SQLite file")
+    parser.add_argument("--json", default=None, help="write the summaries to this file")
+    parser.add_argument("--baseline", default=None, help="--json output of an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    llm_port, app_port = free_port(), free_port()
+    configure_environment(args.database_url, llm_port)
+    llm_proc = start_mock_llm(llm_port, args.ttft_ms, args.tokens_per_sec, args.output_tokens)
+
+    # Only import the app once the environment points at the fakes
+    from app.main import app
+    from app.database import engine, Base
+    from benchmarks.vector_store import InProcessCollection
+    from app.services.transcript_store import transcript_writer
+    from app.services.vapi_webhook import vapi_ingestor
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        app.state.chroma_collection = InProcessCollection(latency_ms=args.vector_latency_ms)
+        # Background workers normally started by the (disabled) lifespan
+        transcript_writer.start()
+        vapi_ingestor.start()
+
+    server = AppServer(app, app_port)
+    server.start(setup)
+
+    async def run() -> dict:
+        results = {}
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=120) as client:
+            headers = await login(client)
+            names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+            for name in names:
+                rec = Recorder()
+                server.reset_lag()
+                await SCENARIOS[name](client, headers, args, rec)
+                results[name] = rec.summary(list(server.loop_lag))
+                print_report(name, results[name])
+                if baseline.get(name):
+                    print_comparison(name, results[name], baseline[name])
+        return results
+
+    try:
+        results = asyncio.run(run())
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        server.stop()
+        llm_proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
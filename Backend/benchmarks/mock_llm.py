@@ -0,0 +1,167 @@
+"""
+Fake OpenAI-compatible chat completions server for offline benchmarks.
+
+    python -m benchmarks.mock_llm --port 9100 --ttft-ms 300 --tokens-per-sec 80
+
+Point the backend at it with LLM_BASE_URL=http://127.0.0.1:9100/v1.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.tokenizer import count_tokens
+
+WORDS = (
+    "the model answers using the retrieved notes and keeps the explanation short "
+    "so the student can revise the key concept quickly before the next quiz"
+).split()
+
+
+class MockLLMConfig:
+    def __init__(self, ttft_ms: float, tokens_per_sec: float, output_tokens: int, jitter: float):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.jitter = jitter
+        # Message-prefix hashes seen so far, to fake provider prefix caching
+        self.seen_prefixes: set[str] = set()
+
+    def delay(self, base_seconds: float) -> float:
+        return max(0.0, base_seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+def _usage(config: MockLLMConfig, messages: list, completion_tokens: int) -> dict:
+    """Count prompt tokens and report the longest previously seen message prefix as cached."""
+    prompt_tokens, cached_tokens = 0, 0
+    digest = hashlib.sha1()
+    for message in messages:
+        tokens = count_tokens(str(message.get("content", "")))
+        digest.update(json.dumps(message, sort_keys=True).encode())
+        key = digest.hexdigest()
+        if key in config.seen_prefixes and cached_tokens == prompt_tokens:
+            cached_tokens += tokens
+        config.seen_prefixes.add(key)
+        prompt_tokens += tokens
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+def _quiz_json(n: int = 10) -> str:
+    return json.dumps([
+        {
+            "question": f"Mock question {i + 1}?",
+            "options": ["alpha", "beta", "gamma", "delta"],
+            "answer": "a",
+            "explanation": "Mock explanation.",
+            "User_response": "",
+        }
+        for i in range(n)
+    ])
+
+
+def _evaluation_json() -> str:
+    criteria = ["background", "technical_depth", "core_skills", "practical_scenario", "communication"]
+    return json.dumps({
+        "overall_score": round(random.uniform(3, 9), 1),
+        "criteria": [{"name": c, "score": random.randint(2, 10), "evidence": "Mock evidence."} for c in criteria],
+        "strengths": ["Mock strength."],
+        "improvements": ["Mock improvement."],
+        "recommendation": random.choice(["hire", "lean_hire", "lean_no_hire"]),
+    })
+
+
+def create_app(config: MockLLMConfig) -> FastAPI:
+    app = FastAPI(title="mock-llm")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "mock")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.delay(config.ttft_ms / 1000 + config.output_tokens / config.tokens_per_sec))
+            if (body.get("response_format") or {}).get("type") == "json_object":
+                system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+                # Interview evaluation requests carry a rubric; everything else is a quiz
+                content = _evaluation_json() if "rubric" in system else _quiz_json()
+            else:
+                content = " ".join(random.choice(WORDS) for _ in range(config.output_tokens))
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(config, messages, count_tokens(content)),
+            })
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: dict, finish_reason=None, usage=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def event_stream():
+            await asyncio.sleep(config.delay(config.ttft_ms / 1000))
+            yield chunk({"role": "assistant", "content": ""})
+            per_token = 1 / config.tokens_per_sec
+            for i in range(config.output_tokens):
+                yield chunk({"content": (" " if i else "") + random.choice(WORDS)})
+                await asyncio.sleep(config.delay(per_token))
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk({}, usage=_usage(config, messages, config.output_tokens))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=300, help="delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=80, help="streaming token rate")
+    parser.add_argument("--output-tokens", type=int, default=120, help="tokens per completion")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative +/- jitter on every delay")
+    args = parser.parse_args()
+
+    config = MockLLMConfig(args.ttft_ms, args.tokens_per_sec, args.output_tokens, args.jitter)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
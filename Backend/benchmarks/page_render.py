@@ -0,0 +1,74 @@
+"""
+Notes viewer first paint: whole PDF vs one rendered page, cold and cached.
+
+    python -m benchmarks.page_render --pages 300 --sample 20
+
+Renders --sample pages of a generated PDF through app.services.page_render
+into a throwaway cache directory: once cold (worker pool warm, cache empty),
+then again from the disk cache. Reports latency and bytes per page next to
+the size of the PDF the viewer used to download up front.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from benchmarks.harness import configure_environment, free_port
+from benchmarks.pdf_parse import make_pdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=None, help="render this file instead of a generated one")
+    parser.add_argument("--pages", type=int, default=300, help="pages of the generated PDF")
+    parser.add_argument("--sample", type=int, default=20, help="pages rendered per pass")
+    parser.add_argument("--dpi", type=int, default=96)
+    args = parser.parse_args()
+
+    workdir = configure_environment(None, free_port())
+    os.environ["PAGE_CACHE_DIR"] = os.path.join(workdir, "page_cache")
+    from app.services.page_render import content_hash, page_renderer, snap_dpi
+    from app.services.pdf_parse import shutdown_parse_pool
+
+    path = args.pdf
+    if path is None:
+        path = os.path.join(workdir, "big.pdf")
+        make_pdf(path, args.pages)
+    with open(path, "rb") as f:
+        blob = f.read()
+    digest = content_hash(blob)
+    dpi = snap_dpi(args.dpi)
+
+    async def load_blob() -> bytes:
+        return blob
+
+    async def run():
+        page_count = await page_renderer.page_count(digest, load_blob)
+        # Workers import PyMuPDF on first use: warm them up on a render outside the sample
+        await page_renderer.render(digest, page_count, 48, load_blob)
+
+        pages = np.linspace(1, page_count, min(args.sample, page_count), dtype=int)
+        rows = []
+        for label in ("cold", "cached"):
+            samples, sizes = [], []
+            for page in pages:
+                start = time.perf_counter()
+                image, _ = await page_renderer.render(digest, int(page), dpi, load_blob)
+                samples.append(time.perf_counter() - start)
+                sizes.append(len(image))
+            rows.append((label, samples, sizes))
+
+        print(f"{page_count} pages, PDF {len(blob) / 1024:.0f} KiB, {dpi} dpi, {len(pages)} pages sampled")
+        print(f"{'pass':>8} {'p50 ms':>8} {'p95 ms':>8} {'KiB/page':>9}")
+        for label, samples, sizes in rows:
+            print(f"{label:>8} {np.percentile(samples, 50) * 1000:>8.2f} {np.percentile(samples, 95) * 1000:>8.2f} "
+                  f"{np.mean(sizes) / 1024:>9.1f}")
+
+    asyncio.run(run())
+    shutdown_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
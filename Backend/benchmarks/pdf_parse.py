@@ -0,0 +1,88 @@
+"""
+PDF text extraction throughput: pages/sec by worker process count.
+
+    python -m benchmarks.pdf_parse --pages 1000 --workers 1 2 4 8
+    python -m benchmarks.pdf_parse --pdf big.pdf --range-pages 50
+
+"sequential" is the single-threaded page walk (iter_pdf_pages) used below
+PDF_PARSE_MIN_PAGES; the other rows run app.services.pdf_parse with that many
+worker processes, pool start-up excluded. Every parallel run is checked
+against the sequential output, page for page.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.harness import configure_environment, free_port
+
+PARAGRAPH = ("Enzymes lower the activation energy of reactions without being consumed. "
+             "Their activity depends on temperature, pH and substrate concentration. ")
+
+
+def make_pdf(path: str, pages: int):
+    import fitz
+
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), f"Chapter {i + 1}\n" + PARAGRAPH * 25, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=None, help="parse this file instead of a generated one")
+    parser.add_argument("--pages", type=int, default=1000, help="pages of the generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--range-pages", type=int, default=25, help="pages per worker task")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    configure_environment(None, free_port())
+    from app.services.pdf_ingest import count_pages, iter_pdf_pages
+    from app.services.pdf_parse import get_parse_pool, parse_pages_parallel, shutdown_parse_pool
+
+    path = args.pdf
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="prepai-bench-"), "big.pdf")
+        make_pdf(path, args.pages)
+    page_count = count_pages(path)
+
+    def best_of(run) -> float:
+        best = float("inf")
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    reference = list(iter_pdf_pages(path))
+    seconds = best_of(lambda: list(iter_pdf_pages(path)))
+    print(f"{page_count} pages, {args.range_pages} pages per task")
+    print(f"{'workers':>10} {'seconds':>8} {'pages/s':>9} {'speedup':>8}")
+    print(f"{'sequential':>10} {seconds:>8.2f} {page_count / seconds:>9.0f} {1.0:>8.2f}")
+    baseline = seconds
+
+    for workers in args.workers:
+        async def collect():
+            pages = []
+            async for batch in parse_pages_parallel(path, page_count, 0, args.range_pages, workers):
+                pages.extend(batch)
+            return pages
+
+        get_parse_pool(workers)
+        # Workers import PyMuPDF on first use: warm them up outside the timing
+        pages = asyncio.run(collect())
+        if pages != reference:
+            raise SystemExit(f"{workers} workers: output differs from the sequential parse")
+        seconds = best_of(lambda: asyncio.run(collect()))
+        print(f"{workers:>10} {seconds:>8.2f} {page_count / seconds:>9.0f} {baseline / seconds:>8.2f}")
+
+    shutdown_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Reconciler pass over a polluted collection, and query latency before/after.
+
+    python -m benchmarks.reconcile --pdfs 200 --chunks 50 --orphan-share 0.3 --dup-share 0.2
+
+Seeds --pdfs PDFs (rows in a throwaway SQLite database, chunks in the in-process
+vector store), then deletes --orphan-share of the rows without touching their
+chunks and adds --dup-share random-id copies of the remaining chunks. Reports
+the reconciler's pass time and what it removed, plus the latency of a filtered
+query before and after.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.harness import configure_environment, free_port
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=50, help="chunks per PDF")
+    parser.add_argument("--orphan-share", type=float, default=0.3)
+    parser.add_argument("--dup-share", type=float, default=0.2)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    configure_environment(None, free_port())
+
+    from sqlalchemy import delete, insert
+
+    from app.database import Base, async_session_maker, engine
+    from app.models.tables import PDFData, User
+    from app.services.pdf_ingest import chunk_id, text_hash
+    from app.services.reconciler import Reconciler
+    from benchmarks.vector_store import InProcessCollection, hash_embed
+
+    rng = np.random.default_rng(0)
+
+    async def query_latency(collection, pdf_ids) -> float:
+        samples = []
+        for i in range(args.queries):
+            q = hash_embed([f"question {i} about chapter {i % 7}"])
+            start = time.perf_counter()
+            await collection.query(query_embeddings=q.tolist(), n_results=8,
+                                   where={"pdf_id": {"$in": pdf_ids}})
+            samples.append(time.perf_counter() - start)
+        return float(np.percentile(samples, 50) * 1000)
+
+    async def run():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        collection = InProcessCollection()
+        async with async_session_maker() as db:
+            await db.execute(insert(User), [{"username": "bench", "email": "bench@example.com", "hashed_password": "x"}])
+            await db.execute(insert(PDFData), [
+                {"id": i + 1, "filename": f"notes-{i}.pdf", "pdf_blob": b"", "user_id": 1} for i in range(args.pdfs)
+            ])
+            await db.commit()
+
+        for pdf_id in range(1, args.pdfs + 1):
+            texts = [f"PDF {pdf_id} chunk {n}: chapter {n % 7} notes." for n in range(args.chunks)]
+            metas = [{"pdf_id": pdf_id, "chunk_index": n, "chunk_hash": text_hash(t)} for n, t in enumerate(texts)]
+            await collection.upsert(ids=[chunk_id(pdf_id, n) for n in range(args.chunks)], documents=texts,
+                                    metadatas=metas, embeddings=hash_embed(texts).tolist())
+
+        orphaned = rng.choice(args.pdfs, int(args.pdfs * args.orphan_share), replace=False) + 1
+        async with async_session_maker() as db:
+            await db.execute(delete(PDFData).where(PDFData.id.in_([int(i) for i in orphaned])))
+            await db.commit()
+        live = sorted(set(range(1, args.pdfs + 1)) - {int(i) for i in orphaned})
+
+        # Copies under random ids, the way restores used to write them (without a stored hash)
+        dup_ids = rng.choice(live, int(len(live) * args.dup_share), replace=False)
+        for pdf_id in dup_ids:
+            texts = [f"PDF {pdf_id} chunk {n}: chapter {n % 7} notes." for n in range(args.chunks)]
+            await collection.add(ids=[str(uuid.uuid4()) for _ in texts], documents=texts,
+                                 metadatas=[{"pdf_id": int(pdf_id)} for _ in texts],
+                                 embeddings=hash_embed(texts).tolist())
+
+        before_count = await collection.count()
+        before = await query_latency(collection, live[:20])
+        report = await Reconciler().run(collection)
+        after = await query_latency(collection, live[:20])
+
+        print(f"chunks: {before_count} -> {await collection.count()}")
+        print(f"pass: {report.seconds:.2f}s for {report.scanned} chunks "
+              f"({report.scanned / max(report.seconds, 1e-9):.0f} chunks/s)")
+        print(f"removed: {report.orphans} orphaned, {report.duplicates} duplicate; "
+              f"{len(report.unindexed_pdfs)} PDF(s) without chunks")
+        print(f"filtered query p50: {before:.2f}ms -> {after:.2f}ms")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cold-start benchmark.
+
+    python -m benchmarks.startup --runs 5
+
+For each run a fresh interpreter is started and three things are timed:
+    import   - `import app.main`
+    first_ok - process start until GET / answers 200 (lifespan off, no model)
+    model    - loading the embedding model afterwards (skip with --no-model)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.harness import configure_environment, free_port, wait_for_port
+
+CHILD = r"""
+import sys, time, json
+t0 = time.perf_counter()
+import app.main
+t_import = time.perf_counter() - t0
+print(json.dumps({"import": t_import}), flush=True)
+import uvicorn
+uvicorn.run(app.main.app, host="127.0.0.1", port=int(sys.argv[1]), lifespan="off", log_level="warning")
+"""
+
+MODEL_CHILD = r"""
+import time, json
+from app.services.embeddings import preload_models
+t0 = time.perf_counter()
+preload_models()
+print(json.dumps({"model": time.perf_counter() - t0}), flush=True)
+"""
+
+
+def run_once(backend_dir: str, with_model: bool) -> dict:
+    import httpx
+
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", CHILD, str(port)], cwd=backend_dir,
+                            stdout=subprocess.PIPE, text=True)
+    try:
+        result = json.loads(proc.stdout.readline())
+        wait_for_port(port, timeout=120)
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        result["first_ok"] = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    if with_model:
+        out = subprocess.run([sys.executable, "-c", MODEL_CHILD], cwd=backend_dir,
+                             capture_output=True, text=True, check=True)
+        result.update(json.loads(out.stdout.strip().splitlines()[-1]))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-model", action="store_true", help="skip timing the embedding model load")
+    args = parser.parse_args()
+
+    configure_environment(None, free_port())
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    runs = [run_once(backend_dir, not args.no_model) for _ in range(args.runs)]
+    for key in runs[0]:
+        values = [r[key] for r in runs]
+        print(f"{key:>9}: median {np.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+In-process stand-in for a Chroma collection.
+
+Implements the async subset of the Collection API the backend uses (add, upsert,
+update, get, query, delete, count) on top of NumPy, with a hashing embedder so no model
+download or Chroma server is needed. Scores are meaningless; costs and result
+shapes are what matter for benchmarks.
+"""
+import asyncio
+import hashlib
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DIM = 384
+_WORD_RE = re.compile(r"\w+")
+
+
+def hash_embed(texts: List[str], dim: int = DIM) -> np.ndarray:
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in _WORD_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            out[row, h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+
+def _match(meta: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_match(meta, c) for c in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(_match(meta, c) for c in cond):
+                return False
+            continue
+        value = meta.get(key)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, target in cond.items():
+            ok = {
+                "$eq": lambda: value == target,
+                "$ne": lambda: value != target,
+                "$in": lambda: value in target,
+                "$nin": lambda: value not in target,
+                "$gt": lambda: value is not None and value > target,
+                "$gte": lambda: value is not None and value >= target,
+                "$lt": lambda: value is not None and value < target,
+                "$lte": lambda: value is not None and value <= target,
+            }[op]()
+            if not ok:
+                return False
+    return True
+
+
+class InProcessCollection:
+    def __init__(self, name: str = "bench", latency_ms: float = 0.0):
+        self.name = name
+        self.latency = latency_ms / 1000
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._docs: List[Optional[str]] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._vectors = np.zeros((0, DIM), dtype=np.float32)
+
+    async def _io(self):
+        # Simulated network round trip to the vector store
+        await asyncio.sleep(self.latency)
+
+    @staticmethod
+    def _validate(ids, documents, metadatas, embeddings):
+        # Checked before anything is written, like Chroma, which rejects the whole batch
+        if len(set(ids)) != len(ids):
+            duplicates = sorted({i for i in ids if ids.count(i) > 1})
+            raise ValueError(f"Expected IDs to be unique, found duplicates of: {', '.join(duplicates)}")
+        for name, values in (("documents", documents), ("metadatas", metadatas), ("embeddings", embeddings)):
+            if values is not None and len(values) != len(ids):
+                raise ValueError(f"Got {len(ids)} ids but {len(values)} {name}")
+        if documents is None and embeddings is None:
+            raise ValueError("Either documents or embeddings must be given")
+
+    def _write(self, ids, documents, metadatas, embeddings, overwrite: bool):
+        self._validate(ids, documents, metadatas, embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        vectors = np.asarray(embeddings, dtype=np.float32) if embeddings is not None else hash_embed(documents)
+        new_rows = []
+        for i, doc_id in enumerate(ids):
+            if doc_id in self._index:
+                if overwrite:
+                    row = self._index[doc_id]
+                    self._docs[row] = documents[i] if documents else None
+                    self._metas[row] = dict(metadatas[i] or {})
+                    self._vectors[row] = vectors[i]
+                continue
+            self._index[doc_id] = len(self._ids) + len(new_rows)
+            new_rows.append(i)
+        for i in new_rows:
+            self._ids.append(ids[i])
+            self._docs.append(documents[i] if documents else None)
+            self._metas.append(dict(metadatas[i] or {}))
+        if new_rows:
+            self._vectors = np.vstack([self._vectors, vectors[new_rows]])
+
+    async def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        await self._io()
+        self._write(ids, documents, metadatas, embeddings, overwrite=False)
+
+    async def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        await self._io()
+        self._write(ids, documents, metadatas, embeddings, overwrite=True)
+
+    async def update(self, ids, metadatas=None):
+        await self._io()
+        for doc_id, meta in zip(ids, metadatas or []):
+            if doc_id in self._index:
+                self._metas[self._index[doc_id]].update(meta or {})
+
+    def _rows(self, ids=None, where=None) -> List[int]:
+        rows = [self._index[i] for i in ids if i in self._index] if ids is not None else range(len(self._ids))
+        return [r for r in rows if _match(self._metas[r], where)]
+
+    async def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        await self._io()
+        rows = self._rows(ids, where)[offset or 0:]
+        if limit is not None:
+            rows = rows[:limit]
+        return {
+            "ids": [self._ids[r] for r in rows],
+            "documents": [self._docs[r] for r in rows],
+            "metadatas": [self._metas[r] for r in rows],
+        }
+
+    async def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None, include=None):
+        await self._io()
+        queries = np.asarray(query_embeddings, dtype=np.float32) if query_embeddings is not None else hash_embed(query_texts)
+        rows = np.asarray(self._rows(where=where), dtype=np.int64)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q in queries:
+            if rows.size == 0:
+                top = []
+                dist = np.zeros(0)
+            else:
+                dist = 1.0 - self._vectors[rows] @ q
+                top = np.argsort(dist)[:n_results]
+            result["ids"].append([self._ids[rows[t]] for t in top])
+            result["documents"].append([self._docs[rows[t]] for t in top])
+            result["metadatas"].append([self._metas[rows[t]] for t in top])
+            result["distances"].append([float(dist[t]) for t in top])
+        return result
+
+    async def delete(self, ids=None, where=None):
+        await self._io()
+        drop = set(self._rows(ids, where))
+        if not drop:
+            return
+        keep = [r for r in range(len(self._ids)) if r not in drop]
+        self._ids = [self._ids[r] for r in keep]
+        self._docs = [self._docs[r] for r in keep]
+        self._metas = [self._metas[r] for r in keep]
+        self._vectors = self._vectors[keep]
+        self._index = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+    async def count(self):
+        await self._io()
+        return len(self._ids)
@@ -0,0 +1,101 @@
+"""
+Throughput of the production server (`run.py --prod`) by worker count.
+
+    python -m benchmarks.worker_scaling --workers 1 2 4 --requests 400 --concurrency 32
+
+For each worker count a fresh gunicorn master is started against a SQLite
+database, one user is registered, and then two endpoints are hammered:
+    login - CPU-bound (argon2 password check), shows how work spreads over workers
+    live  - /health/live, the per-request floor of the stack
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+from benchmarks.harness import configure_environment, free_port, wait_for_port
+
+API = "/api/v1"
+
+
+async def hammer(base_url: str, method: str, path: str, n: int, concurrency: int, **kwargs) -> dict:
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def one():
+            nonlocal errors
+            async with sem:
+                start = time.perf_counter()
+                resp = await client.request(method, path, **kwargs)
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(n)))
+        wall = time.perf_counter() - start
+
+    return {
+        "rps": n / wall,
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "errors": errors,
+    }
+
+
+async def measure(base_url: str, requests: int, concurrency: int) -> dict:
+    name = f"bench{uuid.uuid4().hex[:8]}"
+    creds = {"email": f"{name}@example.com", "password": "benchpass"}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await client.post(f"{API}/auth/register", json={"username": name, **creds})
+
+    return {
+        "login": await hammer(base_url, "POST", f"{API}/auth/login", requests, concurrency, json=creds),
+        "live": await hammer(base_url, "GET", "/health/live", requests * 5, concurrency),
+    }
+
+
+def run_workers(backend_dir: str, workers: int, requests: int, concurrency: int) -> dict:
+    # Fresh database per run so table creation races do not carry over
+    configure_environment(None, free_port())
+    port = free_port()
+    env = dict(os.environ, PRELOAD_MODELS="false", EMBEDDING_WARMUP="false", LOG_LEVEL="WARNING")
+    proc = subprocess.Popen(
+        [sys.executable, "run.py", "--prod", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=backend_dir, env=env,
+    )
+    try:
+        wait_for_port(port, timeout=120)
+        # The port opens as soon as the master binds; give every worker time to boot
+        time.sleep(1 + 0.5 * workers)
+        return asyncio.run(measure(f"http://127.0.0.1:{port}", requests, concurrency))
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{'workers':>7}  {'endpoint':>8}  {'req/s':>8}  {'p50':>8}  {'p95':>8}  errors")
+    for workers in args.workers:
+        for endpoint, r in run_workers(backend_dir, workers, args.requests, args.concurrency).items():
+            print(f"{workers:>7}  {endpoint:>8}  {r['rps']:>8.1f}  {r['p50'] * 1000:>6.1f}ms  "
+                  f"{r['p95'] * 1000:>6.1f}ms  {r['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,71 @@
+import argparse
+import os
+
 import uvicorn
-from app.main import app
+from app.config import settings
+
+
+def worker_count() -> int:
+    return settings.WEB_CONCURRENCY or os.cpu_count() or 1
+
+
+def run_production(host: str, port: int, workers: int):
+    """Gunicorn master + uvicorn workers.
+
+    The app and the embedding model (unless PRELOAD_MODELS=false) are imported
+    once in the master before forking, so workers share those pages
+    copy-on-write instead of each loading its own copy.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    # Read by per-process limits that split a deployment-wide budget between workers
+    settings.WEB_CONCURRENCY = workers
+
+    if settings.PRELOAD_MODELS is not False:
+        from app.services.embeddings import preload_models
+        preload_models()
+
+    from app.main import app
+
+    def post_fork(server, worker):
+        # Split the cores between workers instead of every worker's torch pool using all of them
+        import sys
+        if "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            # Time the workers get after SIGTERM to drain (see lifecycle.install_drain_on_sigterm)
+            # and then run the lifespan shutdown
+            self.cfg.set("graceful_timeout", settings.SHUTDOWN_GRACE_SECONDS + 15)
+            self.cfg.set("timeout", 120)
+            self.cfg.set("post_fork", post_fork)
+
+        def load(self):
+            return app
+
+    ProductionServer().run()
+
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
-    )
+    parser = argparse.ArgumentParser(description="Run the prepAI backend")
+    parser.add_argument("--prod", action="store_true",
+                        help="multi-worker server without auto-reload (also APP_ENV=production)")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to WEB_CONCURRENCY or the CPU count")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.prod or os.getenv("APP_ENV") == "production":
+        run_production(args.host, args.port, args.workers or worker_count())
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True
+        )
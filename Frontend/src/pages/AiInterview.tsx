@@ -75,7 +75,13 @@ function AIInterview() {
         `${BACKEND_URL}/api/v1/interview/api/get-vapi-config`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: {
+            "Content-Type": "application/json",
+            // Lets the backend store this interview's transcript under the user
+            ...(localStorage.getItem("token")
+              ? { Authorization: `Bearer ${localStorage.getItem("token")}` }
+              : {}),
+          },
           body: JSON.stringify({
             name,
             job_role: role,